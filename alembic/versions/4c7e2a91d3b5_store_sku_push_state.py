@@ -0,0 +1,73 @@
+"""store_sku: 记录最近一次推送的库存数；inventory_events: 替换 sku_id 单列索引
+
+Revision ID: 4c7e2a91d3b5
+Revises:
+Create Date: 2026-10-17 10:00:00.000000
+
+应用启动时的 create_all 只创建缺少的表和索引，不会给已有的表加列，也不会删除旧索引。
+新库由 create_all 建表后再执行本迁移时，已存在的列和索引会跳过。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "4c7e2a91d3b5"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _columns(table: str) -> set[str] | None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {column["name"] for column in inspector.get_columns(table)}
+
+
+def _indexes(table: str) -> set[str] | None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {index["name"] for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    # 表不存在时由应用启动时的 create_all 按模型创建
+    indexes = _indexes("inventory_events")
+    if indexes is not None:
+        if "idx_events_sku_created_event" not in indexes:
+            op.create_index(
+                "idx_events_sku_created_event",
+                "inventory_events",
+                ["sku_id", "created_at", "event_id"],
+            )
+        # 新索引以 sku_id 开头，旧的单列索引是多余的
+        if "idx_events_sku_id" in indexes:
+            op.drop_index("idx_events_sku_id", table_name="inventory_events")
+
+    columns = _columns("store_sku")
+    if columns is None:
+        return
+    if "last_pushed_quantity" not in columns:
+        op.add_column("store_sku", sa.Column("last_pushed_quantity", sa.Integer(), nullable=True))
+    if "last_pushed_at" not in columns:
+        op.add_column(
+            "store_sku", sa.Column("last_pushed_at", sa.DateTime(timezone=True), nullable=True)
+        )
+
+
+def downgrade() -> None:
+    columns = _columns("store_sku") or set()
+    with op.batch_alter_table("store_sku") as batch_op:
+        for name in ("last_pushed_at", "last_pushed_quantity"):
+            if name in columns:
+                batch_op.drop_column(name)
+
+    indexes = _indexes("inventory_events")
+    if indexes is not None:
+        if "idx_events_sku_id" not in indexes:
+            op.create_index("idx_events_sku_id", "inventory_events", ["sku_id"])
+        if "idx_events_sku_created_event" in indexes:
+            op.drop_index("idx_events_sku_created_event", table_name="inventory_events")
@@ -1,8 +1,9 @@
 import logging
+from datetime import datetime
 from typing import Any
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, File
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -13,13 +14,16 @@ from app.db.schemas import (
     StoreCreate, StoreResponse, StoreUpdate,
     SkuMasterCreate, SkuMasterResponse, SkuMasterUpdate,
     StoreSkuResponse,
+    SyncRunResponse,
     InventorySnapshotResponse,
     ManualEventCreate,
     InventoryEventResponse,
     ImportPreviewRequest, ImportPreviewResponse,
     ImportConfirmRequest,
     SyncStatusResponse,
+    ApiErrorLogResponse,
     AuditLogResponse,
+    InventoryAsOfResponse,
     OversellResponse,
     RakutenAuthTestResponse,
     TaskResponse,
@@ -33,6 +37,13 @@ from app.services import sku_sync as sku_sync_service
 from app.services import csv_import as csv_import_service
 from app.services import inventory_sync as inventory_sync_service
 from app.services import rakuten_api as rakuten_api_service
+from app.services import snapshot_rebuild as snapshot_rebuild_service
+from app.services import event_archive as event_archive_service
+from app.services import inventory_checkpoint as inventory_checkpoint_service
+from app.services import sync_runs as sync_runs_service
+from app.services.push_queue import push_queue
+from app.services.sku_cache import sku_cache
+from app.services.write_lanes import sku_write_lanes
 from app.utils.helpers import normalize_sku
 
 logger = logging.getLogger(__name__)
@@ -91,10 +102,14 @@ async def update_store(
         raise HTTPException(status_code=404, detail="Store not found")
 
     update_data = store_update.model_dump(exclude_unset=True)
+    previous_api_config = store.api_config
     for field, value in update_data.items():
         setattr(store, field, value)
 
     await session.commit()
+    # 凭证变更后关闭旧凭证的连接池
+    if "api_config" in update_data and update_data["api_config"] != previous_api_config:
+        await rakuten_api_service.rakuten_clients.invalidate(previous_api_config)
     await session.refresh(store)
     return store
 
@@ -111,8 +126,10 @@ async def delete_store(
     if not store:
         raise HTTPException(status_code=404, detail="Store not found")
 
+    api_config = store.api_config
     await session.delete(store)
     await session.commit()
+    await rakuten_api_service.rakuten_clients.invalidate(api_config)
     return {"message": "Store deleted", "store_id": store_id}
 
 
@@ -125,6 +142,17 @@ async def list_store_skus(
     return await inv_service.get_store_skus(store_id)
 
 
+@router.get("/stores/{store_id}/inventory", response_model=list[InventoryAsOfResponse])
+async def get_store_inventory_as_of(
+    store_id: str,
+    as_of: datetime,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """店铺下所有 SKU 在 as_of 时刻的库存"""
+    checkpoint_service = inventory_checkpoint_service.InventoryCheckpointService(session)
+    return await checkpoint_service.get_store_quantities_at(store_id, as_of)
+
+
 @router.post("/stores/{store_id}/sync-skus", response_model=TaskResponse)
 async def trigger_sku_sync(
     store_id: str,
@@ -188,6 +216,7 @@ async def create_sku(
     )
     session.add(db_sku)
     await session.commit()
+    sku_cache.invalidate(sku_id)
     await session.refresh(db_sku)
     return db_sku
 
@@ -226,6 +255,7 @@ async def update_sku(
         setattr(sku, field, value)
 
     await session.commit()
+    sku_cache.invalidate(sku_id)
     await session.refresh(sku)
     return sku
 
@@ -268,6 +298,7 @@ async def delete_sku(
     sku.original_sku = sku_id
 
     await session.commit()
+    sku_cache.invalidate(sku_id)
     await session.refresh(sku)
 
     return {"message": "SKU deleted and reset to initial state", "sku_id": sku_id}
@@ -276,11 +307,31 @@ async def delete_sku(
 @router.get("/inventory/{sku_id}", response_model=InventorySnapshotResponse)
 async def get_inventory(
     sku_id: str,
+    as_of: datetime | None = None,
     session: AsyncSession = Depends(get_async_session),
 ):
+    """当前库存；传入 as_of 时返回该时刻的库存（从最近的检查点回放事件）"""
     sku_id = normalize_sku(sku_id)
     inv_service = inventory_service.InventoryService(session)
 
+    if as_of is not None:
+        checkpoint_service = inventory_checkpoint_service.InventoryCheckpointService(session)
+        if not await inv_service.get_sku_info(sku_id):
+            raise HTTPException(status_code=404, detail="SKU not found")
+        point = await checkpoint_service.get_quantity_at(sku_id, as_of)
+        if point["internal_available"] is None:
+            raise HTTPException(
+                status_code=409,
+                detail="as_of 之后的回放区间包含已归档事件，且没有更近的检查点",
+            )
+        return InventorySnapshotResponse(
+            sku_id=sku_id,
+            internal_available=point["internal_available"],
+            last_event_id=point["last_event_id"],
+            updated_at=point["as_of"],
+            registered_stores=await inv_service.get_registered_stores(sku_id),
+        )
+
     snapshot = await inv_service.get_snapshot(sku_id)
     if not snapshot:
         raise HTTPException(status_code=404, detail="SKU not found or no inventory")
@@ -296,6 +347,16 @@ async def get_inventory(
     )
 
 
+@router.post("/inventory/checkpoints")
+async def create_inventory_checkpoints(
+    as_of: datetime | None = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """为所有 SKU 记录库存检查点（默认时刻为当前时间减去结算延迟）"""
+    checkpoint_service = inventory_checkpoint_service.InventoryCheckpointService(session)
+    return await checkpoint_service.create_checkpoints(as_of=as_of)
+
+
 @router.post("/events/manual", response_model=InventoryEventResponse)
 async def create_manual_event(
     event: ManualEventCreate,
@@ -303,21 +364,22 @@ async def create_manual_event(
 ):
     inv_service = inventory_service.InventoryService(session)
 
-    existing_sku = await inv_service.get_sku(event.sku_id)
+    existing_sku = await inv_service.get_sku_info(event.sku_id)
     if not existing_sku:
         raise HTTPException(status_code=404, detail="SKU not found")
 
-    db_event = await inv_service.create_event(
-        event_type=EventTypeEnumSchema.ADJUSTMENT,
-        sku_id=event.sku_id,
-        quantity=event.quantity,
-        operator=event.operator,
-        source=SourceEnumSchema.MANUAL,
-        reason=event.reason,
-        token=event.token,
-    )
+    async with sku_write_lanes.acquire(session, [event.sku_id]):
+        db_event = await inv_service.create_event(
+            event_type=EventTypeEnumSchema.ADJUSTMENT,
+            sku_id=event.sku_id,
+            quantity=event.quantity,
+            operator=event.operator,
+            source=SourceEnumSchema.MANUAL,
+            reason=event.reason,
+            token=event.token,
+        )
 
-    await session.commit()
+        await session.commit()
     await session.refresh(db_event)
     return db_event
 
@@ -325,11 +387,18 @@ async def create_manual_event(
 @router.get("/events/{sku_id}", response_model=list[InventoryEventResponse])
 async def get_sku_events(
     sku_id: str,
+    response: Response,
     limit: int = 50,
     offset: int = 0,
+    cursor: str | None = None,
     event_type: str | None = None,
+    include_archived: bool = False,
     session: AsyncSession = Depends(get_async_session),
 ):
+    """事件时间线；下一页游标通过 X-Next-Cursor 响应头返回（offset 仍然兼容）
+
+    include_archived=true 时合并冷归档中的事件（此时忽略 offset）
+    """
     inv_service = inventory_service.InventoryService(session)
     evt_type = None
     if event_type:
@@ -338,7 +407,16 @@ async def get_sku_events(
         except (ValueError, KeyError):
             pass
 
-    return await inv_service.get_events(sku_id, limit, offset, evt_type)
+    try:
+        events, next_cursor = await inv_service.get_events_page(
+            sku_id, limit, cursor, evt_type, offset, include_archived
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return events
 
 
 @router.post("/import/preview", response_model=ImportPreviewResponse)
@@ -411,10 +489,50 @@ async def confirm_import(
 @router.post("/sync/{store_id}")
 async def trigger_sync(
     store_id: str,
+    full: bool = False,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """推送店铺库存；默认只推送与上次推送值不同的 SKU，full=true 时推送全部 SKU"""
+    sync_service = inventory_sync_service.InventorySyncService(session)
+    return await sync_service.sync_all_to_store(store_id, full=full)
+
+
+@router.post("/sync/{store_id}/verify")
+async def verify_sync(
+    store_id: str,
+    repair: bool = True,
     session: AsyncSession = Depends(get_async_session),
 ):
+    """用 bulk-get 读取平台库存生成漂移报告；repair=true 时只推送不一致的 SKU"""
     sync_service = inventory_sync_service.InventorySyncService(session)
-    return await sync_service.sync_all_to_store(store_id)
+    result = await sync_service.verify_store(store_id, repair=repair)
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return result
+
+
+@router.get("/sync/{store_id}/runs", response_model=list[SyncRunResponse])
+async def get_sync_runs(
+    store_id: str,
+    kind: str | None = None,
+    limit: int = 50,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """店铺同步运行历史（kind: inventory / sku），按开始时间倒序"""
+    run_service = sync_runs_service.SyncRunService(session)
+    return await run_service.get_runs(store_id, kind=kind, limit=min(limit, 500))
+
+
+@router.get("/sync/push-queue/stats")
+async def get_push_queue_stats():
+    """合并推送队列的积压深度、合并比例和推送延迟"""
+    return push_queue.stats()
+
+
+@router.get("/cache/skus/stats")
+async def get_sku_cache_stats():
+    """SKU 主数据缓存命中统计，用于调整缓存容量"""
+    return sku_cache.stats()
 
 
 @router.get("/audit/logs", response_model=list[AuditLogResponse])
@@ -438,6 +556,28 @@ async def get_audit_logs(
     return result.scalars().all()
 
 
+@router.get("/audit/api-errors", response_model=list[ApiErrorLogResponse])
+async def get_api_errors(
+    store_id: str | None = None,
+    operation: str | None = None,
+    limit: int = 50,
+    offset: int = 0,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """乐天 API 错误日志（按 store/operation/error_code 聚合的计数桶）"""
+    query = select(models.ApiErrorLog)
+
+    if store_id:
+        query = query.where(models.ApiErrorLog.store_id == store_id)
+    if operation:
+        query = query.where(models.ApiErrorLog.operation == operation)
+
+    query = query.order_by(models.ApiErrorLog.last_seen_at.desc()).limit(limit).offset(offset)
+
+    result = await session.execute(query)
+    return result.scalars().all()
+
+
 @router.get("/audit/oversell", response_model=list[OversellResponse])
 async def get_oversell(
     session: AsyncSession = Depends(get_async_session),
@@ -459,6 +599,32 @@ async def get_oversell(
     ]
 
 
+@router.post("/audit/snapshot-rebuild")
+async def rebuild_snapshots(
+    repair: bool = False,
+    run_id: UUID | None = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """从事件流重新计算库存快照并报告漂移；repair=true 时修复，传入 run_id 可从检查点继续"""
+    rebuild_service = snapshot_rebuild_service.SnapshotRebuildService(session)
+    result = await rebuild_service.rebuild(repair=repair, run_id=run_id)
+
+    if "error" in result:
+        raise HTTPException(status_code=404, detail=result["error"])
+
+    return result
+
+
+@router.post("/events/archive")
+async def archive_events(
+    hot_months: int | None = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """将热数据保留期之前的库存事件按月归档到压缩文件"""
+    archive_service = event_archive_service.EventArchiveService(session)
+    return await archive_service.archive_closed_months(hot_months=hot_months)
+
+
 @router.get("/rakuten/auth-test", response_model=list[RakutenAuthTestResponse])
 async def test_rakuten_auth(
     session: AsyncSession = Depends(get_async_session),
@@ -488,12 +654,14 @@ async def test_rakuten_auth(
                 valid=valid,
                 license_key_days_remaining=days,
                 store_id=store.store_id,
+                circuits=rakuten_api_service.store_circuits(store.api_config),
             ))
         except Exception as e:
             responses.append(RakutenAuthTestResponse(
                 valid=False,
                 license_key_days_remaining=None,
                 store_id=store.store_id,
+                circuits=rakuten_api_service.store_circuits(store.api_config),
             ))
 
     return responses
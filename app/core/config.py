@@ -28,6 +28,58 @@ class Settings(BaseSettings):
     RAKUTEN_DEFAULT_SERVICE_SECRET: str = Field(default="")
     RAKUTEN_DEFAULT_LICENSE_KEY: str = Field("")
     RAKUTEN_PROXY: Optional[str] = Field(default=None)
+    # 乐天 RMS API 地址；压测/集成测试时指向本地模拟器（python -m app.simulator）
+    RAKUTEN_API_BASE_URL: str = Field(default="https://api.rms.rakuten.co.jp")
+
+    # 乐天 API 长连接池（按店铺凭证各一个；HTTP/2 需要安装 h2）
+    RAKUTEN_HTTP2: bool = Field(default=True)
+    RAKUTEN_HTTP_MAX_CONNECTIONS: int = Field(default=10)
+    RAKUTEN_HTTP_MAX_KEEPALIVE: int = Field(default=5)
+    RAKUTEN_HTTP_KEEPALIVE_SECONDS: float = Field(default=30.0)
+
+    # 乐天 API 重试：指数退避（full jitter）的基数与上限秒数，每个接口每分钟的重试预算
+    RAKUTEN_RETRY_MAX: int = Field(default=3)
+    RAKUTEN_RETRY_BASE_SECONDS: float = Field(default=0.5)
+    RAKUTEN_RETRY_MAX_SECONDS: float = Field(default=30.0)
+    RAKUTEN_RETRY_BUDGET_PER_MINUTE: int = Field(default=30)
+
+    # 乐天 API 按 (凭证, 接口) 的令牌桶限速: local / sqlite / redis / off
+    # 多 worker 部署时使用 sqlite（同一台机器）或 redis（使用 REDIS_URL）共享额度
+    RAKUTEN_RATE_LIMIT_BACKEND: str = Field(default="local")
+    RAKUTEN_RATE_LIMIT_SQLITE_PATH: str = Field(default="rakuten_rate_limits.db")
+
+    # 乐天 API 载荷日志：完整载荷只在 DEBUG 级别输出并截断；按采样率把完整请求/响应写入目录
+    RAKUTEN_LOG_PAYLOAD_MAX_CHARS: int = Field(default=2000)
+    RAKUTEN_PAYLOAD_DUMP_DIR: Optional[str] = Field(default=None)
+    RAKUTEN_PAYLOAD_DUMP_SAMPLE_RATE: float = Field(default=0.0)
+
+    # 乐天 API 熔断：同一店铺同一类接口连续失败次数达到阈值后暂停请求（0 关闭），冷却后放行一次探测
+    RAKUTEN_CIRCUIT_FAILURE_THRESHOLD: int = Field(default=5)
+    RAKUTEN_CIRCUIT_COOLDOWN_SECONDS: float = Field(default=60.0)
+
+    # SKU 主数据进程内缓存
+    SKU_CACHE_MAX_SIZE: int = Field(default=10000)
+    SKU_CACHE_TTL_SECONDS: float = Field(default=60.0)
+
+    # SKU 写入通道的数据库锁模式: local / advisory / row（多 worker 部署时使用后两者）
+    SKU_WRITE_LOCK_MODE: str = Field(default="local")
+
+    # API 错误日志批量写入：累计条数或间隔秒数任一达到即刷新
+    ERROR_LOG_BATCH_SIZE: int = Field(default=100)
+    ERROR_LOG_FLUSH_SECONDS: float = Field(default=5.0)
+
+    # 库存事件冷归档：热表保留最近 N 个自然月（需远大于订单轮询窗口），更早的月份压缩归档
+    EVENT_ARCHIVE_DIR: str = Field(default="archive/events")
+    EVENT_HOT_MONTHS: int = Field(default=3)
+
+    # 库存检查点记录间隔（小时），0 表示不在应用内定时记录
+    CHECKPOINT_INTERVAL_HOURS: float = Field(default=24.0)
+
+    # 库存推送并发 worker 数（同一店铺的 bulk-upsert 仍按每秒 1 次限速）
+    SYNC_WORKERS: int = Field(default=4)
+
+    # 库存变更合并推送窗口（秒），0 表示不自动推送
+    PUSH_COALESCE_SECONDS: float = Field(default=2.0)
 
     API_HOST: str = Field(default="0.0.0.0")
     API_PORT: int = Field(default=8000)
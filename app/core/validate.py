@@ -79,6 +79,85 @@ def validate_environment() -> None:
                 "example": "http://127.0.0.1:10808"
             })
 
+    base_url = settings.RAKUTEN_API_BASE_URL
+    if not (base_url.startswith("http://") or base_url.startswith("https://")):
+        errors.append({
+            "var": "RAKUTEN_API_BASE_URL",
+            "reason": "乐天 API 地址格式不正确",
+            "current": base_url,
+            "format": "http://[host]:[port] 或 https://[host]",
+            "example": "https://api.rms.rakuten.co.jp"
+        })
+
+    if settings.RAKUTEN_HTTP_MAX_CONNECTIONS < 1:
+        errors.append({
+            "var": "RAKUTEN_HTTP_MAX_CONNECTIONS",
+            "reason": "乐天 API 连接池至少需要 1 个连接",
+            "current": settings.RAKUTEN_HTTP_MAX_CONNECTIONS,
+            "expected": "正整数，例如 10"
+        })
+
+    if settings.RAKUTEN_RETRY_MAX < 0 or settings.RAKUTEN_RETRY_BASE_SECONDS <= 0:
+        errors.append({
+            "var": "RAKUTEN_RETRY_MAX / RAKUTEN_RETRY_BASE_SECONDS",
+            "reason": "重试次数不能为负，退避基数必须大于 0",
+            "current": f"{settings.RAKUTEN_RETRY_MAX} / {settings.RAKUTEN_RETRY_BASE_SECONDS}",
+            "expected": "例如 3 / 0.5"
+        })
+
+    limiter_mode = settings.RAKUTEN_RATE_LIMIT_BACKEND
+    if limiter_mode not in ["local", "sqlite", "redis", "off"]:
+        errors.append({
+            "var": "RAKUTEN_RATE_LIMIT_BACKEND",
+            "reason": "乐天 API 限速存储类型不正确",
+            "current": limiter_mode,
+            "allowed": "local, sqlite, redis, off"
+        })
+
+    if not 0 <= settings.RAKUTEN_PAYLOAD_DUMP_SAMPLE_RATE <= 1:
+        errors.append({
+            "var": "RAKUTEN_PAYLOAD_DUMP_SAMPLE_RATE",
+            "reason": "载荷采样率必须在 0 到 1 之间",
+            "current": settings.RAKUTEN_PAYLOAD_DUMP_SAMPLE_RATE,
+            "expected": "例如 0.01（1% 的请求）"
+        })
+
+    if settings.RAKUTEN_CIRCUIT_FAILURE_THRESHOLD < 0 or settings.RAKUTEN_CIRCUIT_COOLDOWN_SECONDS <= 0:
+        errors.append({
+            "var": "RAKUTEN_CIRCUIT_FAILURE_THRESHOLD / RAKUTEN_CIRCUIT_COOLDOWN_SECONDS",
+            "reason": "熔断阈值不能为负（0 表示关闭），冷却时间必须大于 0",
+            "current": f"{settings.RAKUTEN_CIRCUIT_FAILURE_THRESHOLD} / {settings.RAKUTEN_CIRCUIT_COOLDOWN_SECONDS}",
+            "expected": "例如 5 / 60"
+        })
+
+    # ===== SKU 写入通道锁模式 =====
+    lock_mode = settings.SKU_WRITE_LOCK_MODE
+    if lock_mode not in ["local", "advisory", "row"]:
+        errors.append({
+            "var": "SKU_WRITE_LOCK_MODE",
+            "reason": "SKU 写入锁模式不正确",
+            "current": lock_mode,
+            "allowed": "local, advisory, row"
+        })
+
+    # ===== 事件归档 =====
+    if settings.EVENT_HOT_MONTHS < 1:
+        errors.append({
+            "var": "EVENT_HOT_MONTHS",
+            "reason": "热表至少保留 1 个已结束月份（需覆盖订单轮询的回看窗口）",
+            "current": settings.EVENT_HOT_MONTHS,
+            "expected": "正整数，例如 3"
+        })
+
+    # ===== 库存推送 =====
+    if settings.SYNC_WORKERS < 1:
+        errors.append({
+            "var": "SYNC_WORKERS",
+            "reason": "库存推送至少需要 1 个 worker",
+            "current": settings.SYNC_WORKERS,
+            "expected": "正整数，例如 4"
+        })
+
     # ===== 环境类型 =====
     environment = settings.ENVIRONMENT
     if environment not in ["prod", "test", "dev"]:
@@ -128,6 +207,7 @@ def print_env_info() -> None:
     print(f"  DATABASE_URL: {settings.DATABASE_URL[:30]}...")
     print(f"  REDIS_URL: {settings.REDIS_URL}")
     print(f"  RAKUTEN_PROXY: {settings.RAKUTEN_PROXY or '未使用代理'}")
+    print(f"  RAKUTEN_API_BASE_URL: {settings.RAKUTEN_API_BASE_URL}")
     print(f"  API_HOST: {settings.API_HOST}")
     print(f"  API_PORT: {settings.API_PORT}")
     print(f"  RAKUTEN_DEFAULT_SERVICE_SECRET: {'已设置' if settings.RAKUTEN_DEFAULT_SERVICE_SECRET else '未设置'}")
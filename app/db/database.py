@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
 
 from app.core.config import settings
 
@@ -44,3 +45,10 @@ async def get_async_session() -> AsyncSession:
 def get_sync_session() -> Session:
     with SyncSessionFactory() as session:
         yield session
+
+
+def dialect_insert(session: AsyncSession | Session, table):
+    """按当前数据库方言返回支持 ON CONFLICT 的 INSERT 构造 (PostgreSQL / SQLite)"""
+    if session.bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
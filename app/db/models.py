@@ -1,11 +1,11 @@
 import uuid
 from datetime import datetime
 from enum import Enum as PyEnum
-import json
 
 from sqlalchemy import (
     Boolean,
     DateTime,
+    Float,
     Index,
     Integer,
     String,
@@ -21,6 +21,7 @@ from sqlalchemy import ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.database import Base
+from app.utils import json_codec
 
 
 class JSONType(TypeDecorator):
@@ -33,12 +34,12 @@ class JSONType(TypeDecorator):
 
     def process_bind_param(self, value, dialect):
         if value is not None:
-            return json.dumps(value)
+            return json_codec.dumps(value)
         return None
 
     def process_result_value(self, value, dialect):
         if value is not None:
-            return json.loads(value)
+            return json_codec.loads(value)
         return None
 
 
@@ -149,6 +150,11 @@ class StoreSku(Base):
     registered_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, server_default=func.now()
     )
+    # 最近一次成功推送到平台的库存数，与快照不同时才需要再次推送
+    last_pushed_quantity: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    last_pushed_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
 
     store: Mapped["Store"] = relationship("Store", back_populates="store_skus")
     sku: Mapped["SkuMaster"] = relationship("SkuMaster", back_populates="store_skus")
@@ -193,7 +199,8 @@ class InventoryEvent(Base):
     )
 
     __table_args__ = (
-        Index("idx_events_sku_id", "sku_id"),
+        # 覆盖按 SKU 查询以及时间线的 keyset 分页 (sku_id, created_at, event_id)
+        Index("idx_events_sku_created_event", "sku_id", "created_at", "event_id"),
         Index("idx_events_created_at", "created_at"),
     )
 
@@ -299,6 +306,160 @@ class OrderConfirmRetry(Base):
     )
 
 
+class ApiErrorLog(Base):
+    """乐天 API 错误日志（按 store/operation/error_code 聚合计数，与库存事件流分离）"""
+    __tablename__ = "api_error_logs"
+
+    log_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    store_id: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    operation: Mapped[str] = mapped_column(String(50), nullable=False)
+    error_code: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    sku_id: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    last_message: Mapped[str] = mapped_column(Text, nullable=False)
+    last_details: Mapped[dict] = mapped_column(JSONType, nullable=False, default=dict)
+    first_seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("idx_api_error_logs_last_seen", "last_seen_at"),
+        Index("idx_api_error_logs_store_op", "store_id", "operation", "last_seen_at"),
+    )
+
+
+class InventoryCheckpoint(Base):
+    """库存检查点：某一时刻的库存值，时点查询从最近的检查点开始回放事件"""
+    __tablename__ = "inventory_checkpoints"
+
+    checkpoint_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    sku_id: Mapped[str] = mapped_column(String(50), nullable=False)
+    internal_available: Mapped[int] = mapped_column(Integer, nullable=False)
+    as_of: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    # 不加外键：被引用的事件可能已归档
+    last_event_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        Index("idx_checkpoints_sku_as_of", "sku_id", "as_of"),
+    )
+
+
+class SnapshotRebuildRun(Base):
+    """库存快照重建/校验运行记录（按 SKU 分块推进的可恢复检查点）"""
+    __tablename__ = "snapshot_rebuild_runs"
+
+    run_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    repair: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    status: Mapped[str] = mapped_column(
+        String(20), nullable=False, default="running"
+    )
+    last_sku_id: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    skus_checked: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    drift_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    repaired_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    started_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now()
+    )
+    finished_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+
+class SyncRun(Base):
+    """店铺同步运行记录：耗时、SKU 数量与 HTTP 调用统计
+
+    kind 为 inventory（库存推送）时 skus_pushed 为成功推送的 SKU 数；
+    kind 为 sku（SKU 主数据同步）时为写入的 SKU 数。
+    """
+    __tablename__ = "sync_runs"
+
+    run_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    store_id: Mapped[str] = mapped_column(String(50), nullable=False)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)
+    mode: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    status: Mapped[str] = mapped_column(String(20), nullable=False)
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    finished_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    duration_ms: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    skus_considered: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    skus_pushed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    skus_failed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    http_calls: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    retries: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rate_limited: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    latency_p50_ms: Mapped[float | None] = mapped_column(Float, nullable=True)
+    latency_p95_ms: Mapped[float | None] = mapped_column(Float, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("idx_sync_runs_store_started", "store_id", "started_at"),
+    )
+
+
+class EventArchive(Base):
+    """库存事件冷归档清单：每行对应一个已压缩归档的月度事件文件"""
+    __tablename__ = "event_archives"
+
+    archive_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    period: Mapped[str] = mapped_column(String(7), nullable=False)  # YYYY-MM
+    path: Mapped[str] = mapped_column(String(500), nullable=False, unique=True)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    sku_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    min_created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    max_created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    checksum: Mapped[str] = mapped_column(String(64), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        Index("idx_event_archives_period", "period"),
+    )
+
+
+class EventArchiveSku(Base):
+    """归档文件中包含的 SKU 索引，时间线查询据此只打开相关文件"""
+    __tablename__ = "event_archive_skus"
+
+    archive_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("event_archives.archive_id"), primary_key=True
+    )
+    sku_id: Mapped[str] = mapped_column(String(50), primary_key=True)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    min_created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    max_created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("idx_event_archive_skus_sku", "sku_id", "max_created_at"),
+    )
+
+
+class EventArchiveBaseline(Base):
+    """已归档事件折算出的每个 SKU 库存基线（快照重建从这里继续累加热表事件）"""
+    __tablename__ = "event_archive_baselines"
+
+    sku_id: Mapped[str] = mapped_column(String(50), primary_key=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now()
+    )
+
+
 # 添加 SkuMaster 的关系定义
 # 这些必须在所有类定义之后添加
 from sqlalchemy import event
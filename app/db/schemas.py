@@ -104,6 +104,8 @@ class StoreSkuResponse(BaseModel):
     registered_at: datetime
     sku_name: str | None = None
     original_sku: str | None = None
+    last_pushed_quantity: int | None = None
+    last_pushed_at: datetime | None = None
 
     model_config = {"from_attributes": True}
 
@@ -143,6 +145,15 @@ class InventorySnapshotResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class InventoryAsOfResponse(BaseModel):
+    sku_id: str
+    as_of: datetime
+    internal_available: int | None
+    last_event_id: UUID | None
+    checkpoint_as_of: datetime | None
+    replayed_events: int
+
+
 class ManualEventCreate(BaseModel):
     sku_id: str
     quantity: int
@@ -213,6 +224,43 @@ class AuditLogResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class ApiErrorLogResponse(BaseModel):
+    log_id: UUID
+    store_id: str | None
+    operation: str
+    error_code: str | None
+    sku_id: str | None
+    count: int
+    last_message: str
+    last_details: dict[str, Any]
+    first_seen_at: datetime
+    last_seen_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class SyncRunResponse(BaseModel):
+    run_id: UUID
+    store_id: str
+    kind: str
+    mode: str | None
+    status: str
+    started_at: datetime
+    finished_at: datetime
+    duration_ms: int
+    skus_considered: int
+    skus_pushed: int
+    skus_failed: int
+    http_calls: int
+    retries: int
+    rate_limited: int
+    latency_p50_ms: float | None
+    latency_p95_ms: float | None
+    error: str | None
+
+    model_config = {"from_attributes": True}
+
+
 class OversellResponse(BaseModel):
     sku_id: str
     original_sku: str | None
@@ -224,6 +272,8 @@ class RakutenAuthTestResponse(BaseModel):
     valid: bool
     license_key_days_remaining: int | None
     store_id: str
+    # 各接口类别的熔断状态 {"orders": {"state", "failures", "retry_in_seconds", "last_error"}, ...}
+    circuits: dict[str, dict[str, Any]] = {}
 
 
 class TaskResponse(BaseModel):
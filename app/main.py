@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -10,6 +11,10 @@ from app.api.routes import router
 from app.core.config import settings
 from app.core.validate import validate_environment
 from app.db.database import async_engine, Base
+from app.services.error_log import api_error_log
+from app.services.inventory_checkpoint import run_periodic_checkpoints
+from app.services.push_queue import push_queue
+from app.services.rakuten_api import rakuten_clients, rakuten_rate_limiter
 
 logging.basicConfig(
     level=logging.INFO,
@@ -35,9 +40,27 @@ async def lifespan(app: FastAPI):
         await conn.run_sync(Base.metadata.create_all)
     logger.info("Database tables created/verified")
 
+    api_error_log.start()
+    rakuten_clients.open()
+    if settings.PUSH_COALESCE_SECONDS > 0:
+        push_queue.start()
+
+    checkpoint_task = None
+    if settings.CHECKPOINT_INTERVAL_HOURS > 0:
+        checkpoint_task = asyncio.create_task(
+            run_periodic_checkpoints(settings.CHECKPOINT_INTERVAL_HOURS * 3600)
+        )
+
     yield
 
     logger.info("Shutting down application...")
+    if checkpoint_task:
+        checkpoint_task.cancel()
+    await push_queue.stop()
+    await rakuten_clients.close()
+    if rakuten_rate_limiter is not None:
+        await rakuten_rate_limiter.close()
+    await api_error_log.stop()
     await async_engine.dispose()
 
 
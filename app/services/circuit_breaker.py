@@ -0,0 +1,149 @@
+import logging
+import time
+from collections.abc import Callable
+from typing import Any
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class _Circuit:
+    def __init__(self):
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error: str | None = None
+        # 半开状态下是否已有一个探测请求在进行
+        self.probing = False
+
+
+class CircuitBreaker:
+    """按 (店铺, 接口类别) 的熔断器（进程内）
+
+    - closed：正常放行，连续失败 failure_threshold 次后打开
+    - open：cooldown 秒内直接拒绝，不发送请求
+    - half_open：冷却结束后放行一个探测请求，成功则关闭，失败则重新打开
+
+    认证失败（401/403）不会因重试恢复，调用 record_failure(trip=True) 立即打开。
+    failure_threshold 为 0 时不熔断。
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        cooldown: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self._circuits: dict[tuple[str, str], _Circuit] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    def _circuit(self, key: str, name: str) -> _Circuit:
+        circuit = self._circuits.get((key, name))
+        if circuit is None:
+            circuit = self._circuits[(key, name)] = _Circuit()
+        return circuit
+
+    def _cooled_down(self, circuit: _Circuit) -> bool:
+        return self.clock() - circuit.opened_at >= self.cooldown
+
+    def is_open(self, key: str, name: str) -> bool:
+        """是否会拒绝请求（不占用半开状态的探测名额），调用方据此跳过店铺"""
+        circuit = self._circuits.get((key, name))
+        if circuit is None or circuit.state == CIRCUIT_CLOSED:
+            return False
+        if circuit.state == CIRCUIT_OPEN:
+            return not self._cooled_down(circuit)
+        return circuit.probing
+
+    def allow(self, key: str, name: str) -> bool:
+        """发送请求前调用；返回 True 时调用方必须以 record_success / record_failure / release 结束"""
+        if not self.enabled:
+            return True
+        circuit = self._circuits.get((key, name))
+        if circuit is None or circuit.state == CIRCUIT_CLOSED:
+            return True
+        if circuit.state == CIRCUIT_OPEN:
+            if not self._cooled_down(circuit):
+                return False
+            circuit.state = CIRCUIT_HALF_OPEN
+            circuit.probing = False
+        if circuit.probing:
+            return False
+        circuit.probing = True
+        return True
+
+    def record_success(self, key: str, name: str) -> None:
+        circuit = self._circuits.get((key, name))
+        if circuit is None:
+            return
+        if circuit.state != CIRCUIT_CLOSED:
+            logger.info(f"熔断器关闭: {name} ({key})")
+        del self._circuits[(key, name)]
+
+    def record_failure(self, key: str, name: str, error: str, trip: bool = False) -> None:
+        if not self.enabled:
+            return
+        circuit = self._circuit(key, name)
+        circuit.failures += 1
+        circuit.last_error = error
+        circuit.probing = False
+        if (
+            trip
+            or circuit.state == CIRCUIT_HALF_OPEN
+            or circuit.failures >= self.failure_threshold
+        ):
+            if circuit.state != CIRCUIT_OPEN:
+                logger.warning(
+                    f"熔断器打开: {name} ({key})，连续失败 {circuit.failures} 次，"
+                    f"{self.cooldown:.0f} 秒后探测: {error}"
+                )
+            circuit.state = CIRCUIT_OPEN
+            circuit.opened_at = self.clock()
+
+    def release(self, key: str, name: str) -> None:
+        """请求结果既不算成功也不算失败（429、被取消），只归还半开状态的探测名额"""
+        circuit = self._circuits.get((key, name))
+        if circuit is not None:
+            circuit.probing = False
+
+    def snapshot(self, key: str, names: list[str]) -> dict[str, dict[str, Any]]:
+        """各接口类别的熔断状态（接口 /api/rakuten/auth-test 展示）"""
+        result = {}
+        for name in names:
+            circuit = self._circuits.get((key, name))
+            if circuit is None:
+                result[name] = {"state": CIRCUIT_CLOSED, "failures": 0}
+                continue
+            state = circuit.state
+            retry_in = None
+            if state == CIRCUIT_OPEN:
+                retry_in = max(0.0, self.cooldown - (self.clock() - circuit.opened_at))
+                if retry_in == 0:
+                    state = CIRCUIT_HALF_OPEN
+            result[name] = {
+                "state": state,
+                "failures": circuit.failures,
+                "retry_in_seconds": round(retry_in, 1) if retry_in is not None else None,
+                "last_error": circuit.last_error,
+            }
+        return result
+
+    def reset(self) -> None:
+        self._circuits.clear()
+
+
+rakuten_circuits = CircuitBreaker(
+    failure_threshold=settings.RAKUTEN_CIRCUIT_FAILURE_THRESHOLD,
+    cooldown=settings.RAKUTEN_CIRCUIT_COOLDOWN_SECONDS,
+)
@@ -10,7 +10,6 @@ from sqlalchemy import select
 from app.db.models import (
     EventTypeEnum,
     ImportModeEnum,
-    InventoryEvent,
     InventorySnapshot,
     SkuMaster,
     SourceEnum,
@@ -19,6 +18,9 @@ from app.db.models import (
     ZeroHandlingEnum,
 )
 from app.db.schemas import EventTypeEnumSchema, ImportModeEnumSchema, InventoryModeEnumSchema, SourceEnumSchema, ZeroHandlingEnumSchema
+from app.services.inventory import BULK_INSERT_CHUNK_SIZE, InventoryService
+from app.services.sku_cache import sku_cache
+from app.services.write_lanes import sku_write_lanes
 from app.utils.helpers import generate_file_token, generate_token, normalize_sku, utcnow
 
 logger = logging.getLogger(__name__)
@@ -586,6 +588,7 @@ class CsvImportService:
             self.session.add(sku)
             await self.session.flush()
         else:
+            sku_cache.invalidate_after_commit(self.session, sku_id)
             # 更新现有 SKU 的 extra_data 标记
             sku.extra_data["is_new"] = False
             if "source" not in sku.extra_data:
@@ -634,104 +637,83 @@ class CsvImportService:
         skipped = 0
         skipped_no_sku = 0
         errors = []
+        # 待写入库存的行 [(sku_id, 数量)]，保持文件顺序
+        stock_rows: list[tuple[str, int]] = []
+
+        # 变更库存的导入持有所有相关 SKU 的写入通道直到提交，其他写入方不会读到旧快照
+        stock_skus = []
+        if import_mode == ImportModeEnumSchema.RESET_STOCK:
+            stock_skus = [
+                normalize_sku(sku_value)
+                for row in rows
+                if (sku_value := self.find_column(row, self.SKU_COLUMN_NAMES))
+            ]
+
+        async with sku_write_lanes.acquire(self.session, stock_skus):
+            for i, row in enumerate(rows, start=1):
+                try:
+                    # 查找 SKU
+                    sku_value = self.find_column(row, self.SKU_COLUMN_NAMES)
+                    if not sku_value:
+                        if skip_no_sku:
+                            skipped_no_sku += 1
+                            continue
+                        else:
+                            errors.append({"row": i, "error": "SKU not found in row"})
+                            continue
 
-        for i, row in enumerate(rows, start=1):
-            try:
-                # 查找 SKU
-                sku_value = self.find_column(row, self.SKU_COLUMN_NAMES)
-                if not sku_value:
-                    if skip_no_sku:
-                        skipped_no_sku += 1
-                        continue
-                    else:
-                        errors.append({"row": i, "error": "SKU not found in row"})
-                        continue
+                    sku_id = normalize_sku(sku_value)
+                    quantity_value = self.find_column(row, self.QUANTITY_COLUMN_NAMES)
+                    quantity = int(quantity_value) if quantity_value and quantity_value.isdigit() else 0
 
-                sku_id = normalize_sku(sku_value)
-                quantity_value = self.find_column(row, self.QUANTITY_COLUMN_NAMES)
-                quantity = int(quantity_value) if quantity_value and quantity_value.isdigit() else 0
+                    # 处理数量为0的情况
+                    if quantity == 0:
+                        if zero_handling == ZeroHandlingEnumSchema.IGNORE:
+                            skipped += 1
+                            continue
+                        elif zero_handling == ZeroHandlingEnumSchema.ZERO_NEGATIVE:
+                            quantity = 0
+
+                    # 获取或创建 SKU
+                    sku = await self._get_or_create_sku_standard(
+                        sku_id=sku_id,
+                        original_sku=sku_value,
+                        row=row,
+                        import_mode=import_mode,
+                    )
 
-                # 处理数量为0的情况
-                if quantity == 0:
-                    if zero_handling == ZeroHandlingEnumSchema.IGNORE:
-                        skipped += 1
-                        continue
-                    elif zero_handling == ZeroHandlingEnumSchema.ZERO_NEGATIVE:
-                        quantity = 0
+                    if sku.extra_data.get("is_new"):
+                        imported += 1
+                    else:
+                        updated += 1
 
-                # 获取或创建 SKU
-                sku = await self._get_or_create_sku_standard(
-                    sku_id=sku_id,
-                    original_sku=sku_value,
-                    row=row,
-                    import_mode=import_mode,
-                )
+                    # 库存行在解析完成后一次批量写入（仅导入元数据模式不变更库存）
+                    if import_mode == ImportModeEnumSchema.RESET_STOCK:
+                        stock_rows.append((sku_id, quantity))
 
-                if sku.extra_data.get("is_new"):
-                    imported += 1
-                else:
-                    updated += 1
+                    # 注册到店铺
+                    if store_id:
+                        await self._register_sku_to_store(sku_id, store_id)
 
-                # 创建库存事件
-                if import_mode == ImportModeEnumSchema.RESET_STOCK:
-                    if inventory_mode == InventoryModeEnumSchema.SKIP_ZERO:
-                        # 跳过零库存模式：数量为0且当前库存为0或负数时跳过
-                        # 获取当前库存
-                        result = await self.session.execute(
-                            select(InventorySnapshot).where(InventorySnapshot.sku_id == sku_id)
-                        )
-                        snapshot = result.scalar_one_or_none()
-                        current_inventory = snapshot.internal_available if snapshot else 0
-                        # 只有当前库存 <= 0 时才跳过
-                        if current_inventory > 0:
-                            await self._reset_stock(sku_id, quantity, operator)
-                        else:
-                            skipped += 1
-                    elif inventory_mode == InventoryModeEnumSchema.ADD:
-                        # 累加库存模式
-                        # 获取当前库存
-                        result = await self.session.execute(
-                            select(InventorySnapshot).where(InventorySnapshot.sku_id == sku_id)
-                        )
-                        snapshot = result.scalar_one_or_none()
-                        current_inventory = snapshot.internal_available if snapshot else 0
-                        # 创建累加事件
-                        event = InventoryEvent(
-                            event_type=EventTypeEnum.STOCK_IN,
-                            sku_id=sku_id,
-                            quantity=quantity,
-                            operator=operator,
-                            source=SourceEnum.IMPORT,
-                            event_metadata={"import_mode": "add"},
-                        )
-                        self.session.add(event)
-                        await self.session.flush()
-                        # 更新快照
-                        new_inventory = current_inventory + quantity
-                        if snapshot is None:
-                            snapshot = InventorySnapshot(
-                                sku_id=sku_id,
-                                internal_available=new_inventory,
-                                last_event_id=event.event_id,
-                            )
-                            self.session.add(snapshot)
-                        else:
-                            snapshot.internal_available = new_inventory
-                            snapshot.last_event_id = event.event_id
-                        await self.session.flush()
-                    else:
-                        # 替换库存模式（默认）
-                        await self._reset_stock(sku_id, quantity, operator)
-                else:
-                    # 仅导入元数据模式
-                    pass
+                except Exception as e:
+                    errors.append({"row": i, "error": str(e), "sku_id": sku_value if 'sku_value' in locals() else "unknown"})
 
-                # 注册到店铺
-                if store_id:
-                    await self._register_sku_to_store(sku_id, store_id)
+            if stock_rows:
+                stock_events, stock_skipped = await self._build_stock_events(
+                    stock_rows, inventory_mode, operator
+                )
+                skipped += stock_skipped
+                try:
+                    # 入库和重置不做超卖检查
+                    await InventoryService(self.session).create_events_bulk(
+                        stock_events, allow_oversell_check=False
+                    )
+                except Exception as e:
+                    await self.session.rollback()
+                    logger.error(f"CSV 导入写入库存失败: {e}")
+                    return {"error": f"Failed to write stock: {e}", "imported": 0}
 
-            except Exception as e:
-                errors.append({"row": i, "error": str(e), "sku_id": sku_value if 'sku_value' in locals() else "unknown"})
+            await self.session.commit()
 
         return {
             "imported": imported,
@@ -784,6 +766,7 @@ class CsvImportService:
             self.session.add(sku)
             await self.session.flush()
         else:
+            sku_cache.invalidate_after_commit(self.session, sku_id)
             sku.extra_data["is_new"] = False
             if import_mode == ImportModeEnumSchema.METADATA_ONLY:
                 # 仅导入元数据模式，更新商品名
@@ -798,38 +781,60 @@ class CsvImportService:
 
         return sku
 
-    async def _reset_stock(self, sku_id: str, quantity: int, operator: str) -> None:
-        """重置库存"""
-        # 创建重置事件
-        event = InventoryEvent(
-            event_type=EventTypeEnum.INIT_RESET,
-            sku_id=sku_id,
-            quantity=quantity,
-            operator=operator,
-            source=SourceEnum.IMPORT,
-            event_metadata={"reset_type": "csv_import"},
-        )
-        self.session.add(event)
-        await self.session.flush()
+    async def _build_stock_events(
+        self,
+        stock_rows: list[tuple[str, int]],
+        inventory_mode: InventoryModeEnumSchema,
+        operator: str,
+    ) -> tuple[list[dict[str, Any]], int]:
+        """按库存导入模式生成库存事件（交给 create_events_bulk 一次写入）
 
-        # 更新快照
-        result = await self.session.execute(
-            select(InventorySnapshot).where(InventorySnapshot.sku_id == sku_id)
-        )
-        snapshot = result.scalar_one_or_none()
+        Returns:
+            (事件列表, 跳过的行数)
+        """
+        current: dict[str, int] = {}
+        if inventory_mode == InventoryModeEnumSchema.SKIP_ZERO:
+            sku_ids = list(dict.fromkeys(sku_id for sku_id, _ in stock_rows))
+            for i in range(0, len(sku_ids), BULK_INSERT_CHUNK_SIZE):
+                result = await self.session.execute(
+                    select(InventorySnapshot.sku_id, InventorySnapshot.internal_available).where(
+                        InventorySnapshot.sku_id.in_(sku_ids[i:i + BULK_INSERT_CHUNK_SIZE])
+                    )
+                )
+                current.update(result.all())
 
-        if snapshot is None:
-            snapshot = InventorySnapshot(
-                sku_id=sku_id,
-                internal_available=quantity,
-                last_event_id=event.event_id,
-            )
-            self.session.add(snapshot)
-        else:
-            snapshot.internal_available = quantity
-            snapshot.last_event_id = event.event_id
+        events = []
+        skipped = 0
+        for sku_id, quantity in stock_rows:
+            if inventory_mode == InventoryModeEnumSchema.ADD:
+                # 累加库存模式：按 SKU 合计后在数据库内原子累加
+                events.append({
+                    "event_type": EventTypeEnum.STOCK_IN,
+                    "sku_id": sku_id,
+                    "quantity": quantity,
+                    "operator": operator,
+                    "source": SourceEnum.IMPORT,
+                    "metadata": {"import_mode": "add"},
+                })
+                continue
 
-        await self.session.flush()
+            if inventory_mode == InventoryModeEnumSchema.SKIP_ZERO:
+                # 跳过零库存模式：只有当前库存 > 0 时才重置（文件中前面的行视为已生效）
+                if current.get(sku_id, 0) <= 0:
+                    skipped += 1
+                    continue
+                current[sku_id] = quantity
+
+            # 替换库存模式（默认）：INIT_RESET 直接设置快照
+            events.append({
+                "event_type": EventTypeEnum.INIT_RESET,
+                "sku_id": sku_id,
+                "quantity": quantity,
+                "operator": operator,
+                "source": SourceEnum.IMPORT,
+                "metadata": {"reset_type": "csv_import"},
+            })
+        return events, skipped
 
     async def _register_sku_to_store(self, sku_id: str, store_id: str) -> None:
         """注册 SKU 到店铺"""
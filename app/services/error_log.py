@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import async_session_factory
+from app.db.models import ApiErrorLog
+from app.utils.helpers import normalize_sku, utcnow
+
+logger = logging.getLogger(__name__)
+
+# 聚合键：(store_id, operation, error_code)
+BucketKey = tuple[str | None, str, str | None]
+
+
+class ApiErrorLogWriter:
+    """乐天 API 错误日志的异步批量写入器
+
+    错误先在内存中按 (store_id, operation, error_code) 聚合为计数桶，
+    累计条数达到 batch_size 或距上次刷新超过 flush_seconds 时，用独立会话一次写入。
+    调用方不需要也不应该为记录错误单独提交事务。
+
+    每次刷新中每个桶写入一行，count 为该桶在本次刷新周期内的次数。
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = async_session_factory,
+        batch_size: int = 100,
+        flush_seconds: float = 5.0,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._buckets: dict[BucketKey, dict[str, Any]] = {}
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def record(
+        self,
+        error_message: str,
+        store_id: str | None = None,
+        operation: str | None = None,
+        error_details: dict[str, Any] | None = None,
+        sku_id: str | None = None,
+    ) -> None:
+        """记录一次 API 错误（不阻塞、不访问数据库）
+
+        Args:
+            error_message: Error message or exception description
+            store_id: Store ID if applicable
+            operation: Operation being performed (e.g., "search_order", "confirm_order")
+            error_details: Additional error details; ``error_code`` is used for bucketing
+            sku_id: SKU ID if applicable
+        """
+        error_details = error_details or {}
+        error_code = error_details.get("error_code")
+        key = (store_id, operation or "unknown", str(error_code) if error_code is not None else None)
+        now = utcnow()
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = {"count": 0, "first_seen_at": now}
+        bucket["count"] += 1
+        bucket["last_seen_at"] = now
+        bucket["last_message"] = error_message
+        bucket["last_details"] = error_details
+        bucket["sku_id"] = normalize_sku(sku_id) if sku_id else None
+        self._pending += 1
+
+        logger.error(f"API Error logged: {error_message} | Operation: {operation} | Store: {store_id}")
+
+        if self._pending >= self.batch_size or (
+            time.monotonic() - self._last_flush >= self.flush_seconds
+        ):
+            self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        try:
+            task = asyncio.get_running_loop().create_task(self.flush())
+        except RuntimeError:
+            # 没有事件循环（同步上下文）：留给下一次刷新
+            return
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self) -> int:
+        """将缓冲中的错误桶写入数据库，返回写入的行数"""
+        async with self._flush_lock:
+            self._last_flush = time.monotonic()
+            if not self._buckets:
+                return 0
+
+            buckets, self._buckets = self._buckets, {}
+            pending, self._pending = self._pending, 0
+            rows = [
+                {
+                    "store_id": store_id,
+                    "operation": operation,
+                    "error_code": error_code,
+                    **bucket,
+                }
+                for (store_id, operation, error_code), bucket in buckets.items()
+            ]
+
+            try:
+                async with self.session_factory() as session:
+                    await session.execute(insert(ApiErrorLog), rows)
+                    await session.commit()
+            except Exception as e:
+                # 错误日志本身写入失败时不影响业务流程，只记录丢弃的数量
+                logger.error(f"写入 API 错误日志失败，丢弃 {pending} 条: {e}")
+                return 0
+
+            return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    def start(self) -> None:
+        """启动后台定时刷新（在应用 lifespan 中调用）"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台刷新并写出剩余的错误"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.flush()
+
+    def pending(self) -> int:
+        """尚未写入数据库的错误条数"""
+        return self._pending
+
+
+api_error_log = ApiErrorLogWriter(
+    batch_size=settings.ERROR_LOG_BATCH_SIZE,
+    flush_seconds=settings.ERROR_LOG_FLUSH_SECONDS,
+)
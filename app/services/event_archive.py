@@ -0,0 +1,322 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+from uuid import UUID, uuid4
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import dialect_insert
+from app.db.models import (
+    EventArchive,
+    EventArchiveBaseline,
+    EventArchiveSku,
+    EventTypeEnum,
+    InventoryEvent,
+    InventorySnapshot,
+    SourceEnum,
+)
+from app.services.inventory import NON_STOCK_EVENT_TYPES
+from app.utils.helpers import ensure_utc, format_datetime, normalize_sku, utcnow
+
+logger = logging.getLogger(__name__)
+
+# 归档时每批从热表读取并删除的事件行数
+ARCHIVE_BATCH_SIZE = 5000
+
+
+def _month_start(dt: datetime, months_back: int = 0) -> datetime:
+    index = dt.year * 12 + dt.month - 1 - months_back
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def event_sort_key(event: InventoryEvent) -> tuple[datetime, UUID]:
+    """时间线排序键 (created_at, event_id)，兼容 naive datetime"""
+    return ensure_utc(event.created_at), event.event_id
+
+
+def _event_to_record(event: InventoryEvent) -> dict[str, Any]:
+    return {
+        "event_id": event.event_id.hex,
+        "event_type": event.event_type.name,
+        "sku_id": event.sku_id,
+        "quantity": event.quantity,
+        "store_id": event.store_id,
+        "platform_status": event.platform_status,
+        "order_id": event.order_id,
+        "operator": event.operator,
+        "reason": event.reason,
+        "source": event.source.name,
+        "token": event.token,
+        "event_metadata": event.event_metadata,
+        "created_at": format_datetime(event.created_at),
+    }
+
+
+def _file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _record_to_event(record: dict[str, Any]) -> InventoryEvent:
+    """还原为不属于任何会话的 InventoryEvent（只读）"""
+    return InventoryEvent(
+        event_id=UUID(record["event_id"]),
+        event_type=EventTypeEnum[record["event_type"]],
+        sku_id=record["sku_id"],
+        quantity=record["quantity"],
+        store_id=record["store_id"],
+        platform_status=record["platform_status"],
+        order_id=record["order_id"],
+        operator=record["operator"],
+        reason=record["reason"],
+        source=SourceEnum[record["source"]],
+        token=record["token"],
+        event_metadata=record["event_metadata"],
+        created_at=datetime.fromisoformat(record["created_at"]),
+    )
+
+
+class EventArchiveService:
+    """库存事件冷归档服务
+
+    inventory_events 只保留最近 EVENT_HOT_MONTHS 个已结束的自然月（加上当月）作为热数据，
+    更早的月份按月导出为 gzip JSONL 文件后从热表删除：
+
+    - event_archives：每个归档文件一行（月份、行数、时间范围、sha256）
+    - event_archive_skus：文件内包含哪些 SKU，时间线查询只打开相关文件
+    - event_archive_baselines：已归档事件折算出的每个 SKU 库存基线，
+      快照重建在基线上累加热表事件
+
+    被 inventory_snapshots.last_event_id 引用的事件留在热表中。归档后 token 的唯一约束
+    不再覆盖已归档事件，因此热表保留期必须远大于订单轮询的回看窗口。
+    """
+
+    def __init__(self, session: AsyncSession, archive_dir: str | Path | None = None):
+        self.session = session
+        self.archive_dir = Path(archive_dir or settings.EVENT_ARCHIVE_DIR)
+
+    def _movable_events(self):
+        pinned = select(InventorySnapshot.last_event_id).where(
+            InventorySnapshot.last_event_id.is_not(None)
+        )
+        return InventoryEvent.event_id.not_in(pinned)
+
+    async def archive_closed_months(
+        self,
+        hot_months: int | None = None,
+        now: datetime | None = None,
+    ) -> dict[str, Any]:
+        """将热数据保留期之前的事件按月归档
+
+        Args:
+            hot_months: 热表保留的已结束月份数，默认 EVENT_HOT_MONTHS
+            now: 当前时间（测试用）
+
+        Returns:
+            归档摘要：截止时间和每个归档文件的信息
+        """
+        hot_months = settings.EVENT_HOT_MONTHS if hot_months is None else hot_months
+        cutoff = _month_start(now or utcnow(), hot_months)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+
+        archives: list[dict[str, Any]] = []
+        while True:
+            oldest = await self.session.scalar(
+                select(InventoryEvent.created_at)
+                .where(InventoryEvent.created_at < cutoff, self._movable_events())
+                .order_by(InventoryEvent.created_at)
+                .limit(1)
+            )
+            if oldest is None:
+                break
+
+            period_start = _month_start(ensure_utc(oldest))
+            period_end = min(_month_start(period_start, -1), cutoff)
+            archives.append(await self._archive_period(period_start, period_end))
+
+        if archives:
+            logger.info(
+                f"事件归档完成: {len(archives)} 个文件, "
+                f"{sum(a['row_count'] for a in archives)} 条事件"
+            )
+
+        return {"cutoff": cutoff, "archives": archives}
+
+    async def _archive_period(self, start: datetime, end: datetime) -> dict[str, Any]:
+        """归档 [start, end) 内的可移动事件，整月在一个事务中提交"""
+        archive_id = uuid4()
+        period = start.strftime("%Y-%m")
+        filename = f"events-{start:%Y%m}-{archive_id.hex[:8]}.jsonl.gz"
+        final_path = self.archive_dir / filename
+        tmp_path = final_path.with_suffix(".tmp")
+
+        # sku_id -> [行数, 最早时间, 最晚时间, 是否含 INIT_RESET, 折算值]
+        per_sku: dict[str, list[Any]] = {}
+        row_count = 0
+
+        # gzip 压缩和文件读写放到线程中执行，不阻塞事件循环
+        fh = await asyncio.to_thread(gzip.open, tmp_path, "wt", encoding="utf-8")
+        try:
+            while True:
+                # 已处理的批次会从热表删除，每次取剩余的前 N 条即可
+                query = (
+                    select(InventoryEvent)
+                    .where(
+                        InventoryEvent.created_at >= start,
+                        InventoryEvent.created_at < end,
+                        self._movable_events(),
+                    )
+                    .order_by(InventoryEvent.sku_id, InventoryEvent.created_at, InventoryEvent.event_id)
+                    .limit(ARCHIVE_BATCH_SIZE)
+                )
+                events = list((await self.session.execute(query)).scalars())
+                if not events:
+                    break
+
+                lines = []
+                for event in events:
+                    lines.append(json.dumps(_event_to_record(event), ensure_ascii=False) + "\n")
+                    created_at = ensure_utc(event.created_at)
+                    stats = per_sku.setdefault(event.sku_id, [0, created_at, created_at, False, 0])
+                    stats[0] += 1
+                    stats[1] = min(stats[1], created_at)
+                    stats[2] = max(stats[2], created_at)
+                    if event.event_type in NON_STOCK_EVENT_TYPES:
+                        continue
+                    if event.event_type == EventTypeEnum.INIT_RESET:
+                        stats[3] = True
+                        stats[4] = event.quantity
+                    else:
+                        stats[4] += event.quantity
+
+                await asyncio.to_thread(fh.writelines, lines)
+                row_count += len(events)
+                await self.session.execute(
+                    delete(InventoryEvent).where(
+                        InventoryEvent.event_id.in_([e.event_id for e in events])
+                    )
+                )
+                # 已删除的对象不再留在会话中
+                for event in events:
+                    self.session.expunge(event)
+        finally:
+            await asyncio.to_thread(fh.close)
+
+        checksum = await asyncio.to_thread(_file_sha256, tmp_path)
+        await asyncio.to_thread(os.replace, tmp_path, final_path)
+
+        self.session.add(EventArchive(
+            archive_id=archive_id,
+            period=period,
+            path=filename,
+            row_count=row_count,
+            sku_count=len(per_sku),
+            min_created_at=min(s[1] for s in per_sku.values()),
+            max_created_at=max(s[2] for s in per_sku.values()),
+            checksum=checksum,
+        ))
+        await self.session.flush()
+        self.session.add_all(
+            EventArchiveSku(
+                archive_id=archive_id,
+                sku_id=sku_id,
+                row_count=stats[0],
+                min_created_at=stats[1],
+                max_created_at=stats[2],
+            )
+            for sku_id, stats in per_sku.items()
+        )
+        for sku_id, stats in per_sku.items():
+            await self._fold_baseline(sku_id, reset=stats[3], quantity=stats[4])
+
+        await self.session.commit()
+        logger.info(f"已归档 {period}: {row_count} 条事件 -> {final_path}")
+
+        return {
+            "archive_id": archive_id,
+            "period": period,
+            "path": str(final_path),
+            "row_count": row_count,
+            "sku_count": len(per_sku),
+        }
+
+    async def _fold_baseline(self, sku_id: str, reset: bool, quantity: int) -> None:
+        """将一个月的折算结果并入基线：含 INIT_RESET 时覆盖，否则累加"""
+        table = EventArchiveBaseline.__table__
+        stmt = dialect_insert(self.session, table).values(sku_id=sku_id, quantity=quantity)
+        new_quantity = (
+            stmt.excluded.quantity if reset else table.c.quantity + stmt.excluded.quantity
+        )
+        await self.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[table.c.sku_id],
+                set_={"quantity": new_quantity, "updated_at": utcnow()},
+            )
+        )
+
+    async def get_archived_events(
+        self,
+        sku_id: str,
+        limit: int,
+        before: tuple[datetime, UUID] | None = None,
+        event_type: EventTypeEnum | None = None,
+    ) -> list[InventoryEvent]:
+        """读取某个 SKU 的已归档事件（按 created_at, event_id 倒序，最多 limit 条）
+
+        Args:
+            sku_id: SKU identifier
+            limit: Maximum number of events
+            before: Only return events strictly older than this (created_at, event_id)
+            event_type: Optional event type filter
+        """
+        sku_id = normalize_sku(sku_id)
+        query = (
+            select(EventArchive.path, EventArchiveSku.min_created_at, EventArchiveSku.max_created_at)
+            .join(EventArchiveSku, EventArchiveSku.archive_id == EventArchive.archive_id)
+            .where(EventArchiveSku.sku_id == sku_id)
+            .order_by(EventArchiveSku.max_created_at.desc())
+        )
+        if before is not None:
+            query = query.where(EventArchiveSku.min_created_at <= before[0])
+        files = (await self.session.execute(query)).all()
+
+        if before is not None:
+            before = (ensure_utc(before[0]), before[1])
+
+        events: list[InventoryEvent] = []
+        for path, _min_created_at, max_created_at in files:
+            # 文件按最晚时间倒序；已凑够且剩余文件都更旧时停止
+            if len(events) >= limit and ensure_utc(max_created_at) < event_sort_key(events[limit - 1])[0]:
+                break
+            archived = await asyncio.to_thread(self._read_file, path, sku_id)
+            for event in archived:
+                if event_type is not None and event.event_type != event_type:
+                    continue
+                if before is not None and event_sort_key(event) >= before:
+                    continue
+                events.append(event)
+            events.sort(key=event_sort_key, reverse=True)
+            del events[limit:]
+
+        return events
+
+    def _read_file(self, path: str, sku_id: str) -> list[InventoryEvent]:
+        """读取归档文件中某个 SKU 的事件（同步，在线程中调用）"""
+        events: list[InventoryEvent] = []
+        with gzip.open(self.archive_dir / path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                record = json.loads(line)
+                if record["sku_id"] != sku_id:
+                    # 文件内按 sku_id 排序，越过目标 SKU 后即可停止
+                    if events:
+                        break
+                    continue
+                events.append(_record_to_event(record))
+        return events
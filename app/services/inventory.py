@@ -1,12 +1,16 @@
 import logging
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from enum import Enum as PyEnum
 from typing import Any
-from uuid import UUID
+from uuid import UUID, uuid4
 
-from sqlalchemy import select, update
+from sqlalchemy import exists, or_, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import make_transient_to_detached, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 
+from app.db.database import dialect_insert
 from app.db.models import (
     EventTypeEnum,
     InventoryEvent,
@@ -17,10 +21,33 @@ from app.db.models import (
     StoreSku,
 )
 from app.db.schemas import EventTypeEnumSchema, SourceEnumSchema
-from app.utils.helpers import generate_token, normalize_sku, utcnow
+from app.services.push_queue import push_queue
+from app.services.sku_cache import SkuInfo, sku_cache
+from app.utils.helpers import (
+    decode_event_cursor,
+    encode_event_cursor,
+    generate_token,
+    normalize_sku,
+    utcnow,
+)
 
 logger = logging.getLogger(__name__)
 
+# 批量写入事件时每条 INSERT 的最大行数（受 SQLite/asyncpg 绑定参数上限约束）
+BULK_INSERT_CHUNK_SIZE = 1000
+
+# 不影响库存快照的事件类型（快照重建时忽略）
+NON_STOCK_EVENT_TYPES = (EventTypeEnum.API_ERROR, EventTypeEnum.SYNC_FAILURE)
+
+
+def _to_model_enum(enum_cls: type[PyEnum], value: Any) -> PyEnum:
+    """Convert schema enums / raw strings to the ORM enum stored in the database."""
+    if isinstance(value, enum_cls):
+        return value
+    if isinstance(value, PyEnum):
+        value = value.value
+    return enum_cls(value)
+
 
 class InventoryService:
     def __init__(self, session: AsyncSession):
@@ -35,12 +62,54 @@ class InventoryService:
         return result.scalar_one_or_none()
 
     async def get_sku(self, sku_id: str) -> SkuMaster | None:
-        """Get SKU master record."""
+        """Get SKU master record (served from sku_cache when possible)."""
         sku_id = normalize_sku(sku_id)
+        key = identity_key(SkuMaster, sku_id)
+        if key in self.session.identity_map:
+            # 本会话已加载（可能有未提交的修改），不能用缓存覆盖
+            return await self.session.get(SkuMaster, sku_id)
+
+        columns = sku_cache.get_columns(sku_id)
+        if columns is not None:
+            # 由缓存的列值重建对象并挂到会话上，不查询数据库
+            sku = SkuMaster(**columns)
+            make_transient_to_detached(sku)
+            return await self.session.merge(sku, load=False)
+
         result = await self.session.execute(
             select(SkuMaster).where(SkuMaster.sku_id == sku_id)
         )
-        return result.scalar_one_or_none()
+        sku = result.scalar_one_or_none()
+        if sku is not None:
+            columns = {
+                attr.key: getattr(sku, attr.key) for attr in SkuMaster.__mapper__.column_attrs
+            }
+            sku_cache.put(SkuInfo(*(columns[field] for field in SkuInfo._fields)), columns)
+        return sku
+
+    async def get_sku_info(self, sku_id: str) -> SkuInfo | None:
+        """Get a cached read-only view of a SKU master record."""
+        sku_id = normalize_sku(sku_id)
+        info = sku_cache.get(sku_id)
+        if info:
+            return info
+
+        result = await self.session.execute(
+            select(
+                SkuMaster.sku_id,
+                SkuMaster.original_sku,
+                SkuMaster.aliases,
+                SkuMaster.allow_oversell,
+                SkuMaster.status,
+            ).where(SkuMaster.sku_id == sku_id)
+        )
+        row = result.one_or_none()
+        if not row:
+            return None
+
+        info = SkuInfo(*row)
+        sku_cache.put(info)
+        return info
 
     async def get_or_create_sku(
         self,
@@ -69,6 +138,7 @@ class InventoryService:
         )
         self.session.add(sku)
         await self.session.flush()
+        sku_cache.invalidate_after_commit(self.session, sku_id)
         return sku
 
     async def create_event(
@@ -85,6 +155,7 @@ class InventoryService:
         metadata: dict[str, Any] | None = None,
         token: str | None = None,
         update_snapshot: bool = True,
+        allow_oversell_check: bool = True,
     ) -> InventoryEvent:
         """Create an inventory event and optionally update snapshot."""
         sku_id = normalize_sku(sku_id)
@@ -93,7 +164,7 @@ class InventoryService:
             token = generate_token()
 
         event = InventoryEvent(
-            event_type=event_type.value if isinstance(event_type, EventTypeEnumSchema) else event_type,
+            event_type=_to_model_enum(EventTypeEnum, event_type),
             sku_id=sku_id,
             quantity=quantity,
             store_id=store_id,
@@ -101,26 +172,128 @@ class InventoryService:
             order_id=order_id,
             operator=operator,
             reason=reason,
-            source=source.value if isinstance(source, SourceEnumSchema) else source,
+            source=_to_model_enum(SourceEnum, source),
             token=token,
             event_metadata=metadata or {},
+            # 应用侧时间戳（微秒精度），同一事务内的事件也能按写入顺序排序
+            created_at=utcnow(),
         )
         self.session.add(event)
         await self.session.flush()
 
         if update_snapshot:
-            await self._update_snapshot(sku_id, quantity, event.event_id)
+            await self._update_snapshot(sku_id, quantity, event.event_id, allow_oversell_check)
 
         return event
 
+    async def create_events_bulk(
+        self,
+        events: list[dict[str, Any]],
+        update_snapshot: bool = True,
+        allow_oversell_check: bool = True,
+    ) -> dict[str, Any]:
+        """Create many inventory events with multi-row INSERTs.
+
+        Each item takes the same keyword arguments as ``create_event``
+        (event_type, sku_id, quantity, operator, source, token, ...).
+
+        - Events are inserted ``BULK_INSERT_CHUNK_SIZE`` rows per statement with
+          ON CONFLICT (token) DO NOTHING, so tokens already in the database or
+          repeated inside the batch are skipped and replays stay idempotent.
+        - Snapshot changes are aggregated per SKU and applied with one statement
+          per SKU: INIT_RESET sets the value (later events in the batch add to it),
+          other events are summed and go through the same oversell guard as
+          ``create_event`` (checked against the net delta) unless
+          ``allow_oversell_check`` is False.
+
+        Returns:
+            {"inserted": int, "skipped_tokens": list[str], "snapshots": {sku_id: quantity}}
+
+        Raises:
+            ValueError: If a SKU's net change would oversell it
+        """
+        rows = []
+        seen_tokens: set[str] = set()
+        skipped_tokens: list[str] = []
+        # 逐行递增 1 微秒，使同批事件的 created_at 保持输入顺序
+        created_base = utcnow()
+
+        for spec in events:
+            token = spec.get("token") or generate_token()
+            if token in seen_tokens:
+                skipped_tokens.append(token)
+                continue
+            seen_tokens.add(token)
+
+            rows.append({
+                "event_id": uuid4(),
+                "event_type": _to_model_enum(EventTypeEnum, spec["event_type"]),
+                "sku_id": normalize_sku(spec["sku_id"]),
+                "quantity": spec["quantity"],
+                "store_id": spec.get("store_id"),
+                "platform_status": spec.get("platform_status"),
+                "order_id": spec.get("order_id"),
+                "operator": spec["operator"],
+                "reason": spec.get("reason"),
+                "source": _to_model_enum(SourceEnum, spec["source"]),
+                "token": token,
+                "event_metadata": spec.get("metadata") or {},
+                "created_at": created_base + timedelta(microseconds=len(rows)),
+            })
+
+        inserted_ids: set[UUID] = set()
+        for i in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+            stmt = (
+                dialect_insert(self.session, InventoryEvent)
+                .values(rows[i:i + BULK_INSERT_CHUNK_SIZE])
+                .on_conflict_do_nothing(index_elements=[InventoryEvent.token])
+                .returning(InventoryEvent.event_id)
+            )
+            result = await self.session.execute(stmt)
+            inserted_ids.update(result.scalars().all())
+
+        skipped_tokens.extend(r["token"] for r in rows if r["event_id"] not in inserted_ids)
+
+        snapshots: dict[str, int] = {}
+        if update_snapshot:
+            # 按 SKU 聚合：{sku_id: [是否包含重置, 数量, 最后事件ID]}，保持输入顺序
+            changes: dict[str, list] = {}
+            for row in rows:
+                if row["event_id"] not in inserted_ids:
+                    continue
+                change = changes.setdefault(row["sku_id"], [False, 0, None])
+                if row["event_type"] == EventTypeEnum.INIT_RESET:
+                    change[0] = True
+                    change[1] = row["quantity"]
+                else:
+                    change[1] += row["quantity"]
+                change[2] = row["event_id"]
+
+            for sku_id, (is_reset, quantity, last_event_id) in changes.items():
+                if is_reset:
+                    snapshots[sku_id] = await self.set_snapshot(sku_id, quantity, last_event_id)
+                else:
+                    snapshots[sku_id] = await self._update_snapshot(
+                        sku_id, quantity, last_event_id, allow_oversell_check
+                    )
+
+        return {
+            "inserted": len(inserted_ids),
+            "skipped_tokens": skipped_tokens,
+            "snapshots": snapshots,
+        }
+
     async def _update_snapshot(
         self,
         sku_id: str,
         quantity: int,
         event_id: UUID,
         allow_oversell_check: bool = True,
-    ) -> None:
-        """Update inventory snapshot after an event.
+    ) -> int:
+        """Update inventory snapshot after an event in a single statement.
+
+        Uses INSERT ... ON CONFLICT DO UPDATE ... WHERE <oversell guard> RETURNING,
+        so the read-check-write happens atomically inside the database.
 
         Args:
             sku_id: SKU identifier
@@ -128,45 +301,93 @@ class InventoryService:
             event_id: Event ID for traceability
             allow_oversell_check: If True, check oversell constraint
 
+        Returns:
+            The new internal_available value
+
         Raises:
             ValueError: If allow_oversell=False and new quantity would be negative
         """
-        existing = await self.get_snapshot(sku_id)
+        stmt = dialect_insert(self.session, InventorySnapshot).values(
+            sku_id=sku_id,
+            internal_available=quantity,
+            last_event_id=event_id,
+            updated_at=utcnow(),
+        )
 
-        if existing:
-            new_quantity = existing.internal_available + quantity
-
-            # 检查是否允许超卖
-            if allow_oversell_check:
-                sku = await self.get_sku(sku_id)
-                if sku and not sku.allow_oversell and new_quantity < 0:
-                    logger.warning(
-                        f"SKU {sku_id}不允许超卖，当前库存: {existing.internal_available}, "
-                        f"变更量: {quantity}, 新库存: {new_quantity}"
-                    )
-                    raise ValueError(
-                        f"不允许超卖：SKU {sku_id} 库存不足 "
-                        f"(当前: {existing.internal_available}, 需要: {-quantity})"
-                    )
+        # 首次出现的 SKU 直接插入；已存在则在数据库内原子累加，
+        # 超卖检查作为 DO UPDATE 的 WHERE 条件，避免并发订单读到同一旧值
+        guard = None
+        if allow_oversell_check:
+            guard = or_(
+                InventorySnapshot.internal_available + stmt.excluded.internal_available >= 0,
+                ~exists().where(
+                    SkuMaster.sku_id == sku_id,
+                    SkuMaster.allow_oversell.is_(False),
+                ),
+            )
 
-            await self.session.execute(
-                update(InventorySnapshot)
-                .where(InventorySnapshot.sku_id == sku_id)
-                .values(
-                    internal_available=new_quantity,
-                    last_event_id=event_id,
-                    updated_at=utcnow(),
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[InventorySnapshot.sku_id],
+            set_={
+                "internal_available": (
+                    InventorySnapshot.internal_available + stmt.excluded.internal_available
+                ),
+                "last_event_id": stmt.excluded.last_event_id,
+                "updated_at": stmt.excluded.updated_at,
+            },
+            where=guard,
+        ).returning(InventorySnapshot.internal_available)
+
+        result = await self.session.execute(stmt)
+        new_quantity = result.scalar_one_or_none()
+
+        if new_quantity is None:
+            # 仅在拒绝时额外读取一次当前库存用于错误信息
+            current = await self.session.scalar(
+                select(InventorySnapshot.internal_available).where(
+                    InventorySnapshot.sku_id == sku_id
                 )
             )
-        else:
-            snapshot = InventorySnapshot(
-                sku_id=sku_id,
-                internal_available=quantity,
-                last_event_id=event_id,
+            logger.warning(
+                f"SKU {sku_id}不允许超卖，当前库存: {current}, "
+                f"变更量: {quantity}, 新库存: {(current or 0) + quantity}"
+            )
+            raise ValueError(
+                f"不允许超卖：SKU {sku_id} 库存不足 "
+                f"(当前: {current}, 需要: {-quantity})"
             )
-            self.session.add(snapshot)
 
-        await self.session.flush()
+        self._refresh_loaded_snapshot(sku_id, new_quantity, event_id)
+        push_queue.notify_after_commit(self.session, sku_id)
+        return new_quantity
+
+    async def set_snapshot(self, sku_id: str, quantity: int, event_id: UUID | None) -> int:
+        """Overwrite the snapshot with an absolute value (INIT_RESET semantics)."""
+        stmt = dialect_insert(self.session, InventorySnapshot).values(
+            sku_id=sku_id,
+            internal_available=quantity,
+            last_event_id=event_id,
+            updated_at=utcnow(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[InventorySnapshot.sku_id],
+            set_={
+                "internal_available": stmt.excluded.internal_available,
+                "last_event_id": stmt.excluded.last_event_id,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        await self.session.execute(stmt)
+        self._refresh_loaded_snapshot(sku_id, quantity, event_id)
+        push_queue.notify_after_commit(self.session, sku_id)
+        return quantity
+
+    def _refresh_loaded_snapshot(self, sku_id: str, quantity: int, event_id: UUID) -> None:
+        """同步会话中已加载的快照对象，避免后续读取到旧值"""
+        snapshot = self.session.identity_map.get(identity_key(InventorySnapshot, sku_id))
+        if snapshot is not None:
+            set_committed_value(snapshot, "internal_available", quantity)
+            set_committed_value(snapshot, "last_event_id", event_id)
 
     async def register_sku_to_store(
         self,
@@ -224,10 +445,19 @@ class InventoryService:
                 "sku_name": sku.sku_name,
                 "original_sku": sku.original_sku,
                 "registered_at": store_sku.registered_at,
+                "last_pushed_quantity": store_sku.last_pushed_quantity,
+                "last_pushed_at": store_sku.last_pushed_at,
             }
             for store_sku, sku in result.all()
         ]
 
+    def _events_query(self, sku_id: str, event_type: EventTypeEnum | None = None):
+        query = select(InventoryEvent).where(InventoryEvent.sku_id == normalize_sku(sku_id))
+        if event_type:
+            query = query.where(InventoryEvent.event_type == event_type)
+        # event_id 作为次级排序，保证 created_at 相同时顺序稳定
+        return query.order_by(InventoryEvent.created_at.desc(), InventoryEvent.event_id.desc())
+
     async def get_events(
         self,
         sku_id: str,
@@ -235,23 +465,67 @@ class InventoryService:
         offset: int = 0,
         event_type: EventTypeEnum | None = None,
     ) -> list[InventoryEvent]:
-        """Get events for a SKU."""
-        sku_id = normalize_sku(sku_id)
+        """Get events for a SKU (offset pagination)."""
+        query = self._events_query(sku_id, event_type).limit(limit).offset(offset)
 
-        query = select(InventoryEvent).where(InventoryEvent.sku_id == sku_id)
+        result = await self.session.execute(query)
+        return list(result.scalars().all())
 
-        if event_type:
-            query = query.where(InventoryEvent.event_type == event_type)
+    async def get_events_page(
+        self,
+        sku_id: str,
+        limit: int = 50,
+        cursor: str | None = None,
+        event_type: EventTypeEnum | None = None,
+        offset: int = 0,
+        include_archived: bool = False,
+    ) -> tuple[list[InventoryEvent], str | None]:
+        """Get events for a SKU using keyset pagination on (created_at, event_id).
 
-        query = (
-            query
-            .order_by(InventoryEvent.created_at.desc())
-            .limit(limit)
-            .offset(offset)
-        )
+        Args:
+            sku_id: SKU identifier
+            limit: Page size
+            cursor: Opaque cursor from a previous page; takes precedence over offset
+            event_type: Optional event type filter
+            offset: Only used for the first page when no cursor is given
+            include_archived: Merge events from the cold archive (offset is ignored)
 
-        result = await self.session.execute(query)
-        return list(result.scalars().all())
+        Returns:
+            (events, next_cursor); next_cursor is None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        query = self._events_query(sku_id, event_type)
+
+        before = None
+        if cursor:
+            before = decode_event_cursor(cursor)
+            query = query.where(
+                tuple_(InventoryEvent.created_at, InventoryEvent.event_id) < before
+            )
+        elif offset and not include_archived:
+            query = query.offset(offset)
+
+        # 多取一行判断是否还有下一页
+        result = await self.session.execute(query.limit(limit + 1))
+        events = list(result.scalars().all())
+
+        if include_archived:
+            from app.services.event_archive import EventArchiveService, event_sort_key
+
+            # 热表与归档各取前 limit + 1 条后归并
+            archived = await EventArchiveService(self.session).get_archived_events(
+                sku_id, limit + 1, before=before, event_type=event_type
+            )
+            events = sorted(events + archived, key=event_sort_key, reverse=True)[:limit + 1]
+
+        next_cursor = None
+        if len(events) > limit:
+            events = events[:limit]
+            next_cursor = encode_event_cursor(events[-1].created_at, events[-1].event_id)
+
+        return events, next_cursor
 
     async def deactivate_sku(self, sku_id: str) -> bool:
         """Mark SKU as inactive (soft delete)."""
@@ -263,50 +537,5 @@ class InventoryService:
             .values(status="inactive")
         )
         await self.session.flush()
+        sku_cache.invalidate_after_commit(self.session, sku_id)
         return True
-
-    async def log_api_error(
-        self,
-        error_message: str,
-        store_id: str | None = None,
-        error_details: dict[str, Any] | None = None,
-        sku_id: str | None = None,
-        operation: str | None = None,
-    ) -> InventoryEvent:
-        """Log API error to inventory events table.
-
-        Args:
-            error_message: Error message or exception description
-            store_id: Store ID if applicable
-            error_details: Additional error details (HTTP status, error code, etc.)
-            sku_id: SKU ID if applicable
-            operation: Operation being performed (e.g., "search_order", "confirm_order")
-
-        Returns:
-            Created InventoryEvent
-        """
-        # 使用特殊 SKU ID 用于系统级错误
-        system_sku = sku_id if sku_id else "SYSTEM_ERROR"
-
-        metadata = {
-            "error_type": "api_failure",
-            "operation": operation or "unknown",
-            "error_details": error_details or {},
-        }
-
-        if store_id:
-            metadata["store_id"] = store_id
-
-        event = await self.create_event(
-            event_type=EventTypeEnumSchema.API_ERROR,
-            sku_id=system_sku,
-            quantity=0,  # API 错误不影响库存
-            store_id=store_id,
-            operator="system",
-            reason=error_message,
-            source=SourceEnumSchema.SYSTEM,
-            metadata=metadata,
-            update_snapshot=False,  # 不更新库存快照
-        )
-        logger.error(f"API Error logged: {error_message} | Operation: {operation} | Store: {store_id}")
-        return event
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import async_session_factory
+from app.db.models import (
+    EventArchiveBaseline,
+    EventArchiveSku,
+    EventTypeEnum,
+    InventoryCheckpoint,
+    InventoryEvent,
+    SkuMaster,
+    StoreSku,
+)
+from app.services.inventory import NON_STOCK_EVENT_TYPES
+from app.utils.helpers import ensure_utc, normalize_sku, utcnow
+
+logger = logging.getLogger(__name__)
+
+# 每批计算的 SKU 数量
+CHECKPOINT_CHUNK_SIZE = 500
+
+# 检查点时间比当前时间滞后的秒数：应用侧生成 created_at 后事务可能稍晚才提交，
+# 滞后一段时间可保证检查点时刻之前的事件都已可见
+CHECKPOINT_SETTLE_SECONDS = 300
+
+
+class InventoryCheckpointService:
+    """库存检查点与时点查询服务
+
+    时点库存 = 最近一个不晚于 as_of 的检查点（或归档基线）+ 其后到 as_of 为止的库存事件，
+    折算规则与快照重建相同：INIT_RESET 覆盖，其余事件累加。
+
+    如果回放区间内有事件已被归档而又没有更近的检查点，结果无法只从数据库得出，
+    此时 internal_available 为 None。
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_quantity_at(self, sku_id: str, as_of: datetime) -> dict[str, Any]:
+        """查询单个 SKU 在 as_of 时刻的库存"""
+        sku_id = normalize_sku(sku_id)
+        return (await self._quantities_at([sku_id], as_of))[sku_id]
+
+    async def get_store_quantities_at(
+        self,
+        store_id: str,
+        as_of: datetime,
+        chunk_size: int = CHECKPOINT_CHUNK_SIZE,
+    ) -> list[dict[str, Any]]:
+        """查询店铺下所有 SKU 在 as_of 时刻的库存（按 SKU 分块计算）"""
+        result = await self.session.execute(
+            select(StoreSku.sku_id).where(StoreSku.store_id == store_id).order_by(StoreSku.sku_id)
+        )
+        sku_ids = list(result.scalars().all())
+
+        rows = []
+        for i in range(0, len(sku_ids), chunk_size):
+            chunk = sku_ids[i:i + chunk_size]
+            quantities = await self._quantities_at(chunk, as_of)
+            rows.extend(quantities[sku_id] for sku_id in chunk)
+        return rows
+
+    async def create_checkpoints(
+        self,
+        as_of: datetime | None = None,
+        chunk_size: int = CHECKPOINT_CHUNK_SIZE,
+    ) -> dict[str, Any]:
+        """为所有 SKU 记录 as_of 时刻的检查点
+
+        从上一个检查点增量回放，自上个检查点以来没有库存事件的 SKU 不重复记录。
+
+        Args:
+            as_of: 检查点时刻，默认当前时间减去 CHECKPOINT_SETTLE_SECONDS
+            chunk_size: 每批处理的 SKU 数量
+
+        Returns:
+            {"as_of": datetime, "created": int}
+        """
+        as_of = ensure_utc(as_of or utcnow() - timedelta(seconds=CHECKPOINT_SETTLE_SECONDS))
+        created = 0
+        last_sku_id = None
+
+        while True:
+            query = select(SkuMaster.sku_id).order_by(SkuMaster.sku_id).limit(chunk_size)
+            if last_sku_id is not None:
+                query = query.where(SkuMaster.sku_id > last_sku_id)
+            sku_ids = list((await self.session.execute(query)).scalars())
+            if not sku_ids:
+                break
+            last_sku_id = sku_ids[-1]
+
+            for row in (await self._quantities_at(sku_ids, as_of)).values():
+                if row["internal_available"] is None:
+                    continue
+                if row["checkpoint_as_of"] is not None and not row["replayed_events"]:
+                    continue
+                self.session.add(InventoryCheckpoint(
+                    sku_id=row["sku_id"],
+                    internal_available=row["internal_available"],
+                    as_of=as_of,
+                    last_event_id=row["last_event_id"],
+                ))
+                created += 1
+            await self.session.commit()
+
+        logger.info(f"库存检查点 {as_of.isoformat()}: 新增 {created} 条")
+        return {"as_of": as_of, "created": created}
+
+    async def _quantities_at(self, sku_ids: list[str], as_of: datetime) -> dict[str, dict[str, Any]]:
+        as_of = ensure_utc(as_of)
+
+        # 1. 每个 SKU 最近一个不晚于 as_of 的检查点
+        ranked = (
+            select(
+                InventoryCheckpoint.sku_id,
+                InventoryCheckpoint.internal_available,
+                InventoryCheckpoint.as_of,
+                InventoryCheckpoint.last_event_id,
+                func.row_number()
+                .over(
+                    partition_by=InventoryCheckpoint.sku_id,
+                    order_by=InventoryCheckpoint.as_of.desc(),
+                )
+                .label("rn"),
+            )
+            .where(InventoryCheckpoint.sku_id.in_(sku_ids), InventoryCheckpoint.as_of <= as_of)
+            .subquery("ranked_checkpoints")
+        )
+        checkpoints = {
+            row.sku_id: row
+            for row in await self.session.execute(select(ranked).where(ranked.c.rn == 1))
+        }
+
+        # 2. 归档基线及其覆盖的时间范围
+        archived = {
+            row.sku_id: row
+            for row in await self.session.execute(
+                select(
+                    EventArchiveSku.sku_id,
+                    func.min(EventArchiveSku.min_created_at).label("min_created_at"),
+                    func.max(EventArchiveSku.max_created_at).label("max_created_at"),
+                    EventArchiveBaseline.quantity.label("baseline"),
+                )
+                .outerjoin(EventArchiveBaseline, EventArchiveBaseline.sku_id == EventArchiveSku.sku_id)
+                .where(EventArchiveSku.sku_id.in_(sku_ids))
+                .group_by(EventArchiveSku.sku_id, EventArchiveBaseline.quantity)
+            )
+        }
+
+        # 3. 确定每个 SKU 的回放起点 (起点时间, 起点数量, 起点事件)
+        results: dict[str, dict[str, Any]] = {}
+        starts: dict[str, datetime | None] = {}
+        for sku_id in sku_ids:
+            start_at, quantity, last_event_id, checkpoint_as_of = None, 0, None, None
+            checkpoint = checkpoints.get(sku_id)
+            if checkpoint is not None:
+                start_at = checkpoint_as_of = ensure_utc(checkpoint.as_of)
+                quantity, last_event_id = checkpoint.internal_available, checkpoint.last_event_id
+
+            archive = archived.get(sku_id)
+            if archive is not None and archive.baseline is not None:
+                boundary = ensure_utc(archive.max_created_at)
+                if boundary <= as_of and (start_at is None or boundary > start_at):
+                    start_at, quantity, last_event_id = boundary, archive.baseline, None
+
+            results[sku_id] = {
+                "sku_id": sku_id,
+                "as_of": as_of,
+                "internal_available": quantity,
+                "last_event_id": last_event_id,
+                "checkpoint_as_of": checkpoint_as_of,
+                "replayed_events": 0,
+            }
+
+            # 回放区间 (start_at, as_of] 内有已归档事件：无法只从热表回放
+            if archive is not None and ensure_utc(archive.min_created_at) <= as_of and (
+                start_at is None or ensure_utc(archive.max_created_at) > start_at
+            ):
+                results[sku_id]["internal_available"] = None
+                continue
+            starts[sku_id] = start_at
+
+        if not starts:
+            return results
+
+        # 4. 只回放起点之后到 as_of 为止的库存事件
+        no_start = [sku_id for sku_id, start_at in starts.items() if start_at is None]
+        windows = [
+            and_(InventoryEvent.sku_id == sku_id, InventoryEvent.created_at > start_at)
+            for sku_id, start_at in starts.items()
+            if start_at is not None
+        ]
+        if no_start:
+            windows.append(InventoryEvent.sku_id.in_(no_start))
+
+        events = await self.session.execute(
+            select(
+                InventoryEvent.sku_id,
+                InventoryEvent.event_id,
+                InventoryEvent.event_type,
+                InventoryEvent.quantity,
+            )
+            .where(
+                or_(*windows),
+                InventoryEvent.created_at <= as_of,
+                InventoryEvent.event_type.not_in(NON_STOCK_EVENT_TYPES),
+            )
+            .order_by(InventoryEvent.sku_id, InventoryEvent.created_at, InventoryEvent.event_id)
+        )
+        for event in events:
+            row = results[event.sku_id]
+            if event.event_type == EventTypeEnum.INIT_RESET:
+                row["internal_available"] = event.quantity
+            else:
+                row["internal_available"] += event.quantity
+            row["last_event_id"] = event.event_id
+            row["replayed_events"] += 1
+
+        return results
+
+
+async def run_periodic_checkpoints(interval_seconds: float) -> None:
+    """按固定间隔记录检查点（在应用 lifespan 中作为后台任务运行）"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with async_session_factory() as session:
+                await InventoryCheckpointService(session).create_checkpoints()
+        except Exception as e:
+            logger.error(f"记录库存检查点失败: {e}")
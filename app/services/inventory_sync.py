@@ -1,152 +1,672 @@
-import asyncio
 import logging
-from typing import Any
+import re
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from typing import Any, NamedTuple
 
-from sqlalchemy import select
+from sqlalchemy import bindparam, case, func, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.db.models import (
     EventTypeEnum,
-    InventoryEvent,
     InventorySnapshot,
     SkuMaster,
+    SourceEnum,
     Store,
     StoreSku,
 )
 from app.services.inventory import InventoryService
-from app.services.rakuten_api import RakutenAPIError, get_rakuten_client
-from app.utils.helpers import normalize_sku
+from app.services.rakuten_api import (
+    BULK_GET_MAX_ITEMS,
+    BULK_UPSERT_MAX_ITEMS,
+    CIRCUIT_INVENTORY,
+    RakutenAPIError,
+    circuit_open,
+    get_rakuten_client,
+    track_requests,
+)
+from app.services.sync_executor import SyncExecutor
+from app.services.sync_runs import SYNC_KIND_INVENTORY, SyncRunService
+from app.utils import json_codec
+from app.utils.helpers import normalize_sku, utcnow
 
 logger = logging.getLogger(__name__)
 
+# bulk-upsert 限速为每秒 1 次请求
+BULK_UPSERT_INTERVAL_SECONDS = 1.0
+
+# bulk-get 限速为每秒 5 次请求
+BULK_GET_INTERVAL_SECONDS = 0.2
+
+# 乐天在库数上限
+RAKUTEN_MAX_STOCK = 99999
+
+# 店铺级加载每页读取的 SKU 数（按 sku_id 键集分页，内存占用与店铺规模无关）
+PRELOAD_PAGE_SIZE = 2000
+
+# 错误位置 "inventories[3].quantity" 中的下标
+_PROPERTY_INDEX = re.compile(r"^inventories\[(\d+)\]")
+
+
+class PushItem(NamedTuple):
+    """一个待推送的 SKU（店铺级加载输出的紧凑表示）"""
+    sku_id: str
+    manage_number: str | None
+    platform_sku: str
+    quantity: int | None  # 平台库存数（已截断到 0..RAKUTEN_MAX_STOCK）；None 表示没有快照
+
+
+class PushFailure(NamedTuple):
+    item: PushItem
+    error: str
+    error_code: Any = None
+
 
 class InventorySyncService:
-    """库存同步服务 - 将库存同步到各平台"""
+    """库存同步服务 - 将库存同步到各平台
 
-    def __init__(self, session: AsyncSession):
+    店铺级同步用一条 store_sku / sku_master / inventory_snapshots 联表查询按页流式读取
+    PushItem，HTTP 请求交给 SyncExecutor 的 worker 并发执行，结果（SYNC_FAILURE 事件、
+    last_pushed_quantity）由执行器的单一 writer 通过本服务的会话写回。
+    """
+
+    def __init__(self, session: AsyncSession, workers: int | None = None):
         self.session = session
+        self.workers = workers or settings.SYNC_WORKERS
 
     async def sync_to_store(self, sku_id: str, store_id: str) -> dict[str, Any]:
         """同步单个SKU到单个店铺"""
         sku_id = normalize_sku(sku_id)
+        store, error = await self._get_rakuten_store(store_id)
+        if error:
+            return {"error": error, "success": False}
+
         result = await self.session.execute(
-            select(Store).where(Store.store_id == store_id)
+            self._push_items_query().where(SkuMaster.sku_id == sku_id)
         )
-        store = result.scalar_one_or_none()
-        if not store:
-            return {"error": "Store not found", "success": False}
+        row = result.first()
+        if row is None:
+            return {"error": "SKU not found", "success": False, "sku_id": sku_id}
+        item = self._to_push_item(row)
 
-        if not store.api_config:
-            return {"error": "Store has no API config", "success": False}
+        summary = await self._push(store, [item])
+        if summary.get("error"):
+            return {"error": summary["error"], "success": False}
+        if summary["errors"]:
+            return {"success": False, **summary["errors"][0]}
+        return {"success": True, "store_id": store_id, **self._result_row(item)}
 
-        snapshot_result = await self.session.execute(
-            select(InventorySnapshot).where(InventorySnapshot.sku_id == sku_id)
+    async def sync_all_to_store(self, store_id: str, full: bool = False) -> dict[str, Any]:
+        """同步店铺中平台库存与快照不一致的 SKU（bulk-upsert，每次请求 400 个 SKU）
+
+        默认只推送从未推送过、或快照与 last_pushed_quantity 不同的 SKU（由数据库比较，
+        任何进程写入的变化都会被发现）；full=True 时推送店铺的全部 SKU。
+        """
+        store, error = await self._get_rakuten_store(store_id)
+        if error:
+            return {"error": error, "total": 0}
+
+        started_at = utcnow()
+        mode = "full" if full else "incremental"
+
+        result = await self._push(
+            store,
+            self.iter_store_items(store_id, changed_only=not full),
+            min_interval=BULK_UPSERT_INTERVAL_SECONDS,
         )
-        snapshot = snapshot_result.scalar_one_or_none()
-        if not snapshot:
-            return {"error": "Snapshot not found", "success": False}
+        run_service = SyncRunService(self.session)
+        if result.get("error"):
+            await run_service.record(
+                store_id, SYNC_KIND_INVENTORY, started_at, mode=mode, error=result["error"]
+            )
+            return {"error": result["error"], "total": 0}
 
-        platform_stock = max(0, snapshot.internal_available)
+        await run_service.record(
+            store_id,
+            SYNC_KIND_INVENTORY,
+            started_at,
+            considered=result["total"],
+            pushed=result["success"],
+            failed=result["failed"],
+            http=result["http"],
+            mode=mode,
+        )
 
-        if store.platform_type == "rakuten":
-            return await self._sync_to_rakuten(store, sku_id, platform_stock)
+        registered = await self.session.scalar(
+            select(func.count()).select_from(StoreSku).where(StoreSku.store_id == store_id)
+        )
+        return {
+            **result,
+            "unchanged": registered - result["total"],
+            "mode": mode,
+        }
 
-        return {"error": "Unknown platform type", "success": False}
+    async def sync_skus_to_store(self, store_id: str, sku_ids: list[str]) -> dict[str, Any]:
+        """推送指定 SKU 中与上次推送值不同的部分（推送队列合并后调用）
 
-    async def _sync_to_rakuten(
-        self,
-        store: Store,
-        sku_id: str,
-        platform_stock: int,
-    ) -> dict[str, Any]:
-        """同步到乐天"""
-        sku_result = await self.session.execute(
-            select(SkuMaster).where(SkuMaster.sku_id == sku_id)
+        日常的库存推送大多经由推送队列，实际有推送的批次同样写入同步运行记录（mode=queued）。
+        """
+        store, error = await self._get_rakuten_store(store_id)
+        if error:
+            return {"error": error, "total": 0}
+
+        started_at = utcnow()
+        result = await self._push(
+            store,
+            self.iter_store_items(
+                store_id, [normalize_sku(sku_id) for sku_id in sku_ids], include_unpushed=False
+            ),
+            min_interval=BULK_UPSERT_INTERVAL_SECONDS,
+        )
+        run_service = SyncRunService(self.session)
+        if result.get("error"):
+            await run_service.record(
+                store_id, SYNC_KIND_INVENTORY, started_at, mode="queued", error=result["error"]
+            )
+            return {"error": result["error"], "total": 0}
+
+        # 通知的 SKU 都已推送过相同的值时没有任何请求，不记录
+        if result["total"]:
+            await run_service.record(
+                store_id,
+                SYNC_KIND_INVENTORY,
+                started_at,
+                considered=result["total"],
+                pushed=result["success"],
+                failed=result["failed"],
+                http=result["http"],
+                mode="queued",
+            )
+        return result
+
+    async def sync_sku_to_all_stores(self, sku_id: str) -> dict[str, Any]:
+        """同步SKU到所有注册店铺（每个店铺一个任务，并发数受 workers 限制）"""
+        sku_id = normalize_sku(sku_id)
+        result = await self.session.execute(
+            self._push_items_query()
+            .add_columns(Store)
+            .join(StoreSku, StoreSku.sku_id == SkuMaster.sku_id)
+            .join(Store, Store.store_id == StoreSku.store_id)
+            .where(SkuMaster.sku_id == sku_id)
+            .order_by(Store.store_id)
         )
-        sku = sku_result.scalar_one_or_none()
-        if not sku:
-            return {"error": "SKU not found", "success": False}
+        records = result.all()
+        if not records:
+            return {"synced": 0, "stores": []}
+
+        stores = [
+            record.Store for record in records
+            if record.Store.api_config and record.Store.platform_type == "rakuten"
+        ]
+        # 库存接口已熔断的店铺直接跳过，不拖慢其他店铺
+        skipped_stores = [
+            store.store_id for store in stores if circuit_open(store.api_config, CIRCUIT_INVENTORY)
+        ]
+        stores = [store for store in stores if store.store_id not in skipped_stores]
+        item = self._to_push_item(records[0])
+        try:
+            clients = {store.store_id: get_rakuten_client(store.api_config) for store in stores}
+        except ValueError as e:
+            return {"error": str(e), "synced": 0, "stores": []}
+        # 不同店铺的接口限速互不影响，每个店铺一个任务
+        summary = await self._push_many([(store, [item]) for store in stores], clients)
+        failed_stores = {row["store_id"] for row in summary["errors"]}
+        synced_stores = [store.store_id for store in stores if store.store_id not in failed_stores]
+
+        return {
+            "sku_id": sku_id,
+            "synced": len(synced_stores),
+            "total": len(records),
+            "stores": synced_stores,
+            "skipped_stores": skipped_stores,
+            "stats": summary["stats"],
+        }
 
-        rakuten_sku = sku.aliases.get("rakuten") or sku.original_sku or sku_id
+    async def verify_store(self, store_id: str, repair: bool = True) -> dict[str, Any]:
+        """校验模式：用 bulk-get 读取平台库存，与快照比较后只推送不一致的 SKU
 
+        每次读取 1000 个 SKU（bulk-get 每秒 5 次），比写入（400 个、每秒 1 次）便宜得多。
+        与平台一致的 SKU 同时更新 last_pushed_quantity，之后的增量同步以平台实际值为准。
+
+        Args:
+            store_id: 店铺 ID
+            repair: 是否推送不一致的 SKU；False 时只生成漂移报告
+
+        Returns:
+            {"checked", "matched", "drifted", "missing", "drift": [...], "repair": {...}}
+        """
+        store, error = await self._get_rakuten_store(store_id)
+        if error:
+            return {"error": error, "checked": 0}
         try:
             client = get_rakuten_client(store.api_config)
-            result = await client.set_inventory(rakuten_sku, platform_stock)
-            return {
-                "success": True,
-                "sku_id": sku_id,
-                "rakuten_sku": rakuten_sku,
-                "stock": platform_stock,
-                "result": result,
-            }
-        except RakutenAPIError as e:
-            inv_service = InventoryService(self.session)
-            await inv_service.create_event(
-                event_type=EventTypeEnum.SYNC_FAILURE,
-                sku_id=sku_id,
-                quantity=platform_stock,
-                store_id=store.store_id,
-                operator="system",
-                source="api",
-                reason="Sync to Rakuten failed",
-                event_metadata={
-                    "platform": "rakuten",
-                    "rakuten_sku": rakuten_sku,
-                    "error": str(e),
-                    "error_code": e.code if hasattr(e, "code") else None,
-                }
+        except ValueError as e:
+            return {"error": str(e), "checked": 0}
+
+        started_at = utcnow()
+        drifted: list[tuple[PushItem, int | None]] = []
+        checked = 0
+        matched = 0
+        read_errors: list[dict[str, Any]] = []
+
+        async def chunks():
+            chunk: list[PushItem] = []
+            async for item in self.iter_store_items(store_id, changed_only=False):
+                # 没有快照或 manageNumber 的 SKU 无法比较，由推送路径报告
+                if item.quantity is None or not item.manage_number:
+                    continue
+                chunk.append(item)
+                if len(chunk) == BULK_GET_MAX_ITEMS:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        async def call(items):
+            return await client.bulk_get_inventory(
+                [{"manageNumber": item.manage_number, "variantId": item.platform_sku} for item in items]
             )
-            return {
-                "success": False,
-                "error": str(e),
-                "sku_id": sku_id,
+
+        async def write(items, outcome):
+            nonlocal checked, matched
+            if isinstance(outcome, Exception):
+                read_errors.append({"skus": len(items), "error": str(outcome)})
+                return
+            platform = {
+                (str(inv.get("manageNumber", "")).lower(), inv.get("variantId")): inv.get("quantity")
+                for inv in outcome
             }
+            in_sync = []
+            for item in items:
+                checked += 1
+                quantity = platform.get((item.manage_number.lower(), item.platform_sku))
+                if quantity == item.quantity:
+                    in_sync.append(item)
+                else:
+                    drifted.append((item, quantity))
+            matched += len(in_sync)
+            await self._record_pushed(store_id, in_sync)
+            await self.session.commit()
 
-    async def sync_all_to_store(self, store_id: str) -> dict[str, Any]:
-        """同步所有SKU到店铺"""
+        executor = SyncExecutor(workers=self.workers, min_interval=BULK_GET_INTERVAL_SECONDS)
+        with track_requests() as metrics:
+            stats = await executor.run(chunks(), call, write)
+
+        report = {
+            "checked": checked,
+            "matched": matched,
+            "drifted": sum(1 for _item, quantity in drifted if quantity is not None),
+            "missing": sum(1 for _item, quantity in drifted if quantity is None),
+            "drift": [
+                {**self._result_row(item), "platform_quantity": quantity}
+                for item, quantity in drifted
+            ],
+            "read_errors": read_errors,
+            "stats": stats,
+        }
+        if drifted:
+            logger.warning(
+                f"店铺 {store_id} 库存漂移: {report['drifted']} 个不一致, {report['missing']} 个平台不存在"
+            )
+
+        http = metrics.summary()
+        pushed = failed = 0
+        if repair and drifted:
+            result = await self._push(
+                store,
+                [item for item, _quantity in drifted],
+                min_interval=BULK_UPSERT_INTERVAL_SECONDS,
+            )
+            report["repair"] = result
+            pushed, failed = result.get("success", 0), result.get("failed", 0)
+            for key in ("http_calls", "retries", "rate_limited"):
+                http[key] += result.get("http", {}).get(key, 0)
+
+        await SyncRunService(self.session).record(
+            store_id,
+            SYNC_KIND_INVENTORY,
+            started_at,
+            considered=checked,
+            pushed=pushed,
+            failed=failed,
+            http=http,
+            mode="verify",
+            error="; ".join(e["error"] for e in read_errors) or None,
+        )
+        return report
+
+    async def iter_store_items(
+        self,
+        store_id: str,
+        candidates: list[str] | None = None,
+        include_unpushed: bool = True,
+        page_size: int = PRELOAD_PAGE_SIZE,
+        changed_only: bool = True,
+    ) -> AsyncIterator[PushItem]:
+        """按页流式读取店铺中快照与 last_pushed_quantity 不同的 SKU
+
+        每页一条联表查询，按 sku_id 键集分页：不持有跨页的游标，页与页之间可以提交事务。
+
+        Args:
+            store_id: 店铺 ID
+            candidates: 只比较这些 SKU；None 表示比较店铺全部 SKU
+            include_unpushed: 是否同时包含从未推送过的 SKU（不论是否在 candidates 中）
+            page_size: 每页行数
+            changed_only: False 时不按 last_pushed_quantity 过滤（校验模式读取全部 SKU）
+        """
+        platform_quantity = case(
+            (InventorySnapshot.internal_available < 0, 0),
+            (InventorySnapshot.internal_available > RAKUTEN_MAX_STOCK, RAKUTEN_MAX_STOCK),
+            else_=InventorySnapshot.internal_available,
+        )
+        query = (
+            self._push_items_query()
+            .join(StoreSku, StoreSku.sku_id == SkuMaster.sku_id)
+            .where(StoreSku.store_id == store_id)
+            .order_by(SkuMaster.sku_id)
+            .limit(page_size)
+        )
+        if changed_only:
+            query = query.where(
+                or_(
+                    StoreSku.last_pushed_quantity.is_(None),
+                    StoreSku.last_pushed_quantity != platform_quantity,
+                )
+            )
+        if candidates is not None:
+            selected = SkuMaster.sku_id.in_(candidates)
+            if include_unpushed:
+                selected = or_(StoreSku.last_pushed_quantity.is_(None), selected)
+            query = query.where(selected)
+
+        last_sku_id = None
+        while True:
+            page_query = query
+            if last_sku_id is not None:
+                page_query = query.where(SkuMaster.sku_id > last_sku_id)
+            rows = (await self.session.execute(page_query)).all()
+            for row in rows:
+                yield self._to_push_item(row)
+            if len(rows) < page_size:
+                return
+            last_sku_id = rows[-1].sku_id
+
+    async def _get_rakuten_store(self, store_id: str) -> tuple[Store | None, str | None]:
         result = await self.session.execute(
-            select(StoreSku.sku_id).where(StoreSku.store_id == store_id)
+            select(Store).where(Store.store_id == store_id)
         )
-        sku_ids = [row[0] for row in result.fetchall()]
+        store = result.scalar_one_or_none()
+        if not store:
+            return None, "Store not found"
+        if not store.api_config:
+            return None, "Store has no API config"
+        if store.platform_type != "rakuten":
+            return None, "Unknown platform type"
+        if circuit_open(store.api_config, CIRCUIT_INVENTORY):
+            return None, "Rakuten inventory API circuit is open"
+        return store, None
 
-        tasks = [self.sync_to_store(sku_id, store_id) for sku_id in sku_ids]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    async def _push(
+        self,
+        store: Store,
+        items: Iterable[PushItem] | AsyncIterator[PushItem],
+        min_interval: float = 0.0,
+    ) -> dict[str, Any]:
+        """将一个店铺的 PushItem 按 BULK_UPSERT_MAX_ITEMS 分块推送"""
+        try:
+            client = get_rakuten_client(store.api_config)
+        except ValueError as e:
+            return {"error": str(e)}
+        skipped: list[PushFailure] = []
 
-        success_count = sum(1 for r in results if isinstance(r, dict) and r.get("success"))
-        failed = [
-            r for r in results
-            if isinstance(r, dict) and not r.get("success")
-        ]
+        async def chunks():
+            chunk: list[PushItem] = []
+            async for item in _aiter(items):
+                if item.quantity is None or not item.manage_number:
+                    skipped.append(PushFailure(
+                        item,
+                        "Snapshot not found" if item.quantity is None else "Missing manageNumber",
+                    ))
+                    continue
+                chunk.append(item)
+                if len(chunk) == BULK_UPSERT_MAX_ITEMS:
+                    yield store, chunk
+                    chunk = []
+            if chunk:
+                yield store, chunk
+
+        with track_requests() as metrics:
+            summary = await self._push_many(
+                chunks(), {store.store_id: client}, min_interval=min_interval
+            )
+
+        # 无法推送的 SKU（缺少 manageNumber 的记为同步失败；没有快照的只报告）
+        if skipped:
+            await self._record_failures(
+                store.store_id, [f for f in skipped if f.item.quantity is not None]
+            )
+            await self.session.commit()
+            summary["errors"].extend(self._error_row(store.store_id, f) for f in skipped)
+            summary["failed"] += len(skipped)
+            summary["total"] += len(skipped)
+
+        summary["http"] = metrics.summary()
+        # 逐项错误后去掉失败 SKU 的重发也计为重试
+        summary["http"]["retries"] += summary["requests"] - summary["stats"]["jobs"]
+        return summary
+
+    async def _push_many(
+        self,
+        jobs: Iterable[tuple[Store, list[PushItem]]] | AsyncIterator[tuple[Store, list[PushItem]]],
+        clients: dict[str, Any],
+        min_interval: float = 0.0,
+    ) -> dict[str, Any]:
+        """并发推送 (店铺, PushItem 块) 任务，单个 SKU 的错误记为 SYNC_FAILURE 事件
+
+        Returns:
+            {"total", "success", "failed", "errors": [...], "requests", "stats"}
+        """
+        success = 0
+        errors: list[dict[str, Any]] = []
+        requests = 0
+        executor = SyncExecutor(workers=self.workers, min_interval=min_interval)
+
+        async def call(job):
+            store, items = job
+            return await self._push_chunk(clients[store.store_id], items, executor.pace)
+
+        async def write(job, outcome):
+            nonlocal success, requests
+            store, items = job
+            if isinstance(outcome, Exception):
+                failures, chunk_requests = [PushFailure(item, str(outcome)) for item in items], 1
+            else:
+                failures, chunk_requests = outcome
+            requests += chunk_requests
+
+            failed_ids = {f.item.sku_id for f in failures}
+            succeeded = [item for item in items if item.sku_id not in failed_ids]
+            success += len(succeeded)
+            errors.extend(self._error_row(store.store_id, f) for f in failures)
+            if failures:
+                await self._record_failures(store.store_id, failures)
+            await self._record_pushed(store.store_id, succeeded)
+            await self.session.commit()
+
+        stats = await executor.run(jobs, call, write)
+
+        if errors:
+            logger.warning(f"库存推送失败 {len(errors)} 项")
 
         return {
-            "total": len(sku_ids),
-            "success": success_count,
-            "failed": len(failed),
-            "errors": failed,
+            "total": success + len(errors),
+            "success": success,
+            "failed": len(errors),
+            "errors": errors,
+            "requests": requests,
+            "stats": stats,
         }
 
-    async def sync_sku_to_all_stores(self, sku_id: str) -> dict[str, Any]:
-        """同步SKU到所有注册店铺"""
-        sku_id = normalize_sku(sku_id)
-        result = await self.session.execute(
-            select(StoreSku.store_id).where(StoreSku.sku_id == sku_id)
+    def _push_items_query(self):
+        return (
+            select(
+                SkuMaster.sku_id,
+                SkuMaster.original_sku,
+                SkuMaster.aliases,
+                SkuMaster.extra_data,
+                InventorySnapshot.internal_available,
+            )
+            .outerjoin(InventorySnapshot, InventorySnapshot.sku_id == SkuMaster.sku_id)
         )
-        store_ids = [row[0] for row in result.fetchall()]
 
-        if not store_ids:
-            return {"synced": 0, "stores": []}
+    @staticmethod
+    def _to_push_item(row) -> PushItem:
+        quantity = row.internal_available
+        if quantity is not None:
+            quantity = min(max(0, quantity), RAKUTEN_MAX_STOCK)
+        return PushItem(
+            sku_id=row.sku_id,
+            manage_number=(row.extra_data or {}).get("manage_number"),
+            platform_sku=(row.aliases or {}).get("rakuten") or row.original_sku or row.sku_id,
+            quantity=quantity,
+        )
+
+    async def _push_chunk(
+        self,
+        client,
+        items: list[PushItem],
+        pace: Callable[[], Awaitable[None]],
+    ) -> tuple[list[PushFailure], int]:
+        """推送一块库存（只发 HTTP 请求，不访问数据库），返回 (失败项, 请求次数)
+
+        400 响应按 propertyPath 中的下标定位到具体 SKU。整个请求被拒绝时，
+        去掉出错的 SKU 后重试一次（ABSOLUTE 模式可安全重放）。
+        """
+        failures: list[PushFailure] = []
+        requests = 0
+
+        for attempt in range(2):
+            payload = [
+                {
+                    "manageNumber": item.manage_number,
+                    "variantId": item.platform_sku,
+                    "mode": "ABSOLUTE",
+                    "quantity": item.quantity,
+                }
+                for item in items
+            ]
+            if attempt:
+                await pace()
+            requests += 1
+            try:
+                await client.bulk_upsert_inventory(payload)
+                return failures, requests
+            except RakutenAPIError as e:
+                item_errors = self._item_errors(e) if not attempt else None
+                if not item_errors:
+                    failures.extend(PushFailure(item, str(e), e.code) for item in items)
+                    return failures, requests
+
+                failures.extend(
+                    PushFailure(items[index], error["error"], error["error_code"])
+                    for index, error in item_errors.items()
+                    if index < len(items)
+                )
+                items = [item for index, item in enumerate(items) if index not in item_errors]
+                if not items:
+                    return failures, requests
+
+        return failures, requests
 
-        tasks = [self.sync_to_store(sku_id, store_id) for store_id in store_ids]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    @staticmethod
+    def _item_errors(error: RakutenAPIError) -> dict[int, dict[str, Any]] | None:
+        """从 400 响应解析逐项错误 {下标: {"error", "error_code"}}；存在无法定位的错误时返回 None"""
+        if error.code != 400 or not error.response:
+            return None
+        try:
+            body = (
+                json_codec.loads(error.response) if isinstance(error.response, str) else error.response
+            )
+            items = body.get("errors") or []
+        except (ValueError, AttributeError):
+            return None
+
+        item_errors: dict[int, dict[str, Any]] = {}
+        for item in items:
+            match = _PROPERTY_INDEX.match((item.get("metadata") or {}).get("propertyPath") or "")
+            if not match:
+                return None
+            item_errors[int(match.group(1))] = {
+                "error": item.get("message", ""),
+                "error_code": item.get("code"),
+            }
+        return item_errors or None
 
-        synced_stores = []
-        for store_id, result in zip(store_ids, results):
-            if isinstance(result, dict) and result.get("success"):
-                synced_stores.append(store_id)
+    async def _record_failures(self, store_id: str, failures: list[PushFailure]) -> None:
+        """将推送失败记为 SYNC_FAILURE 事件（不影响库存快照）"""
+        if not failures:
+            return
+        inv_service = InventoryService(self.session)
+        await inv_service.create_events_bulk(
+            [
+                {
+                    "event_type": EventTypeEnum.SYNC_FAILURE,
+                    "sku_id": f.item.sku_id,
+                    "quantity": f.item.quantity or 0,
+                    "store_id": store_id,
+                    "operator": "system",
+                    "source": SourceEnum.API,
+                    "reason": "Sync to Rakuten failed",
+                    "metadata": {
+                        "platform": "rakuten",
+                        "manage_number": f.item.manage_number,
+                        "rakuten_sku": f.item.platform_sku,
+                        "error": f.error,
+                        "error_code": f.error_code,
+                    },
+                }
+                for f in failures
+            ],
+            update_snapshot=False,
+        )
 
+    async def _record_pushed(self, store_id: str, items: list[PushItem]) -> None:
+        """记录成功推送的库存数（未注册到店铺的 SKU 不更新）"""
+        if not items:
+            return
+        table = StoreSku.__table__
+        now = utcnow()
+        await self.session.execute(
+            update(table)
+            .where(table.c.store_id == bindparam("b_store_id"), table.c.sku_id == bindparam("b_sku_id"))
+            .values(last_pushed_quantity=bindparam("b_quantity"), last_pushed_at=bindparam("b_at")),
+            [
+                {
+                    "b_store_id": store_id,
+                    "b_sku_id": item.sku_id,
+                    "b_quantity": item.quantity,
+                    "b_at": now,
+                }
+                for item in items
+            ],
+        )
+
+    @staticmethod
+    def _result_row(item: PushItem) -> dict[str, Any]:
         return {
-            "sku_id": sku_id,
-            "synced": len(synced_stores),
-            "total": len(store_ids),
-            "stores": synced_stores,
+            "sku_id": item.sku_id,
+            "rakuten_sku": item.platform_sku,
+            "stock": item.quantity,
         }
+
+    def _error_row(self, store_id: str, failure: PushFailure) -> dict[str, Any]:
+        return {**self._result_row(failure.item), "store_id": store_id, "error": failure.error}
+
+
+async def _aiter(items):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
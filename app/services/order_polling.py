@@ -2,7 +2,7 @@ import logging
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
-from sqlalchemy import select, update
+from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.models import (
@@ -14,13 +14,24 @@ from app.db.models import (
     Store,
 )
 from app.db.schemas import EventTypeEnumSchema, SourceEnumSchema
+from app.services.error_log import api_error_log
 from app.services.inventory import InventoryService
-from app.services.rakuten_api import RakutenAPIError, get_rakuten_client
+from app.services.rakuten_api import (
+    CIRCUIT_ORDERS,
+    RakutenAPIError,
+    circuit_open,
+    get_rakuten_client,
+)
+from app.services.write_lanes import sku_write_lanes
 from app.utils.helpers import normalize_sku, utcnow
 
 logger = logging.getLogger(__name__)
 
 
+# getOrder 每次最多 100 个订单
+GET_ORDER_BATCH_SIZE = 100
+
+
 class RetryConfig:
     """重试配置"""
     MAX_RETRIES = 3
@@ -56,15 +67,24 @@ class OrderPollingService:
         start_str = start_time.strftime("%Y-%m-%dT%H:%M:%S")
         end_str = end_time.strftime("%Y-%m-%dT%H:%M:%S")
 
+        processed = 0
+        found = 0
+        failed_confirms: list[str] = []
+        batch: list[str] = []
+
+        # 订单号逐页到达，每满一批就开始 getOrder，不必等待搜索结束
         try:
-            order_numbers = await client.search_order(start_str, end_str)
-            logger.info(f"Store {store.store_id}: Found {len(order_numbers)} orders")
+            async for order_number in client.iter_order_numbers(start_str, end_str):
+                found += 1
+                batch.append(order_number)
+                if len(batch) == GET_ORDER_BATCH_SIZE:
+                    processed += await self._process_batch(store, client, batch, failed_confirms)
+                    batch = []
         except RakutenAPIError as e:
             error_msg = f"Failed to search orders for {store.store_id}: {e}"
             logger.error(error_msg)
-            # 记录 API 错误到事件表
-            inv_service = InventoryService(self.session)
-            await inv_service.log_api_error(
+            # 记录 API 错误（批量写入错误日志，不占用当前事务）
+            api_error_log.record(
                 error_message=str(e),
                 store_id=store.store_id,
                 operation="search_order",
@@ -74,177 +94,290 @@ class OrderPollingService:
                     "error_code": e.code if hasattr(e, 'code') else None,
                 }
             )
-            await self.session.commit()
-            return {"error": str(e), "processed": 0}
+            return {"error": str(e), "processed": processed}
 
-        if not order_numbers:
+        if batch:
+            processed += await self._process_batch(store, client, batch, failed_confirms)
+        logger.info(f"Store {store.store_id}: Found {found} orders")
+
+        if not found:
             return {"processed": 0}
 
-        processed = 0
-        failed_confirms = []
-
-        # 使用事务处理订单批次，确保数据一致性
-        for batch in [order_numbers[i:i+100] for i in range(0, len(order_numbers), 100)]:
-            async with self.session.begin():
-                try:
-                    orders = await client.get_order(batch)
-                except RakutenAPIError as e:
-                    error_msg = f"Failed to get order details for {store.store_id}: {e}"
-                    logger.error(error_msg)
-                    # 记录 API 错误到事件表
-                    inv_service = InventoryService(self.session)
-                    await inv_service.log_api_error(
-                        error_message=str(e),
-                        store_id=store.store_id,
-                        operation="get_order",
-                        error_details={
-                            "batch": batch[:5] if len(batch) > 5 else batch,
-                            "batch_size": len(batch),
-                            "error_code": e.code if hasattr(e, 'code') else None,
-                        }
-                    )
-                    await self.session.rollback()
-                    continue
+        return {
+            "processed": processed,
+            "failed_confirms": failed_confirms,
+            "start_time": start_str,
+            "end_time": end_str,
+        }
+
+    async def _process_batch(
+        self,
+        store: Store,
+        client,
+        batch: list[str],
+        failed_confirms: list[str],
+    ) -> int:
+        """获取一批订单详情并在一个事务中处理，返回处理的订单数
+
+        getOrder 与 confirmOrder 的 HTTP 调用都在写入通道之外进行，通道只覆盖数据库写入。
+        需要确认的订单先在同一事务中登记到重试队列，提交后再确认并删除记录；
+        确认前进程退出时由重试队列补确认。
+        """
+        try:
+            orders = await client.get_order(batch)
+        except RakutenAPIError as e:
+            error_msg = f"Failed to get order details for {store.store_id}: {e}"
+            logger.error(error_msg)
+            # 记录 API 错误（批量写入错误日志，不占用当前事务）
+            api_error_log.record(
+                error_message=str(e),
+                store_id=store.store_id,
+                operation="get_order",
+                error_details={
+                    "batch": batch[:5] if len(batch) > 5 else batch,
+                    "batch_size": len(batch),
+                    "error_code": e.code if hasattr(e, 'code') else None,
+                }
+            )
+            return 0
 
+        processed = 0
+        pending_confirms: list[tuple[str, dict[str, Any]]] = []
+        # 按 SKU 串行化本批次的库存写入，直到批次提交
+        batch_skus = [
+            sku_id for order in orders for sku_id, _ in self._iter_order_items(order)
+        ]
+        async with sku_write_lanes.acquire(self.session, batch_skus):
+            try:
+                # 一次查询整批订单的去重 token
+                existing_tokens = await self._existing_tokens(
+                    self._order_token(order, store.store_id) for order in orders
+                )
                 for order in orders:
+                    order_number = order.get("orderNumber", "unknown")
                     try:
-                        result = await self._process_order(order, store.store_id, client)
-                        if result.get("confirm_failed"):
-                            failed_confirms.append(result["order_number"])
+                        # 单个订单失败只回滚到 savepoint，不影响批次中的其他订单和已持有的锁
+                        async with self.session.begin_nested():
+                            result = await self._process_order(
+                                order, store.store_id, client, existing_tokens, defer_confirm=True
+                            )
+                            if "confirm_item" in result:
+                                await self._add_order_to_retry_queue(
+                                    order_number, store.store_id, "confirm pending", result["confirm_item"]
+                                )
+                                pending_confirms.append((order_number, result["confirm_item"]))
                         processed += 1
                     except Exception as e:
-                        logger.error(f"Error processing order {result.get('order_number', 'unknown')}: {e}")
-                        await self.session.rollback()
-                        continue
+                        logger.error(f"Error processing order {order_number}: {e}")
 
                 # 提交这个批次的所有订单
                 await self.session.commit()
+            except BaseException:
+                await self.session.rollback()
+                raise
 
-        return {
-            "processed": processed,
-            "failed_confirms": failed_confirms,
-            "start_time": start_str,
-            "end_time": end_str,
-        }
+        if pending_confirms:
+            await self._confirm_pending(client, store.store_id, pending_confirms, failed_confirms)
+        return processed
+
+    async def _confirm_pending(
+        self,
+        client,
+        store_id: str,
+        pending: list[tuple[str, dict[str, Any]]],
+        failed_confirms: list[str],
+    ) -> None:
+        """确认已提交的新订单；成功的从重试队列删除，失败的留在队列中按退避重试"""
+        confirmed = []
+        for order_number, _ in pending:
+            try:
+                await client.confirm_order(order_number)
+                logger.info(f"Order {order_number} confirmed successfully")
+                confirmed.append(order_number)
+            except RakutenAPIError as e:
+                logger.error(f"Failed to confirm order {order_number}: {e}")
+                api_error_log.record(
+                    error_message=str(e),
+                    store_id=store_id,
+                    operation="confirm_order",
+                    error_details={
+                        "order_number": order_number,
+                        "error_code": e.code if hasattr(e, 'code') else None,
+                    }
+                )
+                failed_confirms.append(order_number)
+                await self.session.execute(
+                    update(OrderConfirmRetry)
+                    .where(
+                        OrderConfirmRetry.order_number == order_number,
+                        OrderConfirmRetry.store_id == store_id,
+                        OrderConfirmRetry.status == "pending",
+                    )
+                    .values(last_error=str(e), last_attempt_at=utcnow())
+                )
+
+        if confirmed:
+            await self.session.execute(
+                delete(OrderConfirmRetry).where(
+                    OrderConfirmRetry.order_number.in_(confirmed),
+                    OrderConfirmRetry.store_id == store_id,
+                    OrderConfirmRetry.status == "pending",
+                )
+            )
+        await self.session.commit()
 
     async def _process_order(
         self,
         order: dict[str, Any],
         store_id: str,
         client,
+        existing_tokens: set[str] | None = None,
+        defer_confirm: bool = False,
     ) -> dict[str, Any]:
         """处理单个订单
 
+        订单的所有商品行在一条 INSERT ... ON CONFLICT (token) DO NOTHING 中写入。
+        预先查询的 existing_tokens 只用于提前跳过；与重叠轮询的竞争由数据库的唯一约束
+        解决：首行 token 未插入即视为重复订单，不再确认订单。
+
         Args:
             order: 订单数据
             store_id: 店铺ID
             client: Rakuten API 客户端
+            existing_tokens: 已存在的去重 token（为空时单独查询）
+            defer_confirm: 不在此处确认新订单，而是在结果中返回 confirm_item 由调用方在提交后确认
 
         Returns:
             处理结果字典，包含 order_number 和 confirm_failed 标志
-
-        Raises:
-            ValueError: 如果订单已处理过（重复）
         """
         order_number = order.get("orderNumber", "")
         order_status = order.get("orderStatus", "")
 
-        # 订单去重检查 - 使用 order_number + status + store_id 组合
-        dedup_token = f"{order_number}_{order_status}_{store_id}"
-        existing_event = await self.session.execute(
-            select(InventoryEvent).where(InventoryEvent.token == dedup_token)
-        )
-        if existing_event.scalar_one_or_none():
+        # 订单去重 - 使用 order_number + status + store_id 组合
+        dedup_token = self._order_token(order, store_id)
+        if existing_tokens is None:
+            existing_tokens = await self._existing_tokens([dedup_token])
+        skipped = {
+            "order_number": order_number,
+            "confirm_failed": False,
+            "skipped": True,
+            "reason": "duplicate_order",
+        }
+        if dedup_token in existing_tokens:
             logger.warning(
                 f"重复订单已跳过: order={order_number}, status={order_status}, store={store_id}"
             )
-            return {
-                "order_number": order_number,
-                "confirm_failed": False,
-                "skipped": True,
-                "reason": "duplicate_order"
-            }
+            return skipped
 
-        order_items = order.get("orderItemList", {}).get("orderItem", [])
-        if isinstance(order_items, dict):
-            order_items = [order_items]
+        handler = {
+            "100": self._new_order_spec,
+            "300": self._confirmed_order_spec,
+            "900": self._cancelled_order_spec,
+        }.get(order_status)
+        if handler is None:
+            return {"order_number": order_number, "confirm_failed": False}
+
+        inv_service = InventoryService(self.session)
+        specs = []
+        for line_no, (sku_id, item) in enumerate(self._iter_order_items(order)):
+            spec = await handler(inv_service, sku_id, int(item.get("quantity", 0)), item)
+            specs.append({
+                **spec,
+                "sku_id": sku_id,
+                "store_id": store_id,
+                "platform_status": order_status,
+                "order_id": order_number,
+                "operator": "system",
+                "source": SourceEnumSchema.API,
+                "metadata": {"item": item},
+                # 首行沿用订单 token，其余商品行加行号后缀，保证 token 唯一
+                "token": dedup_token if line_no == 0 else f"{dedup_token}_{line_no}",
+            })
+
+        if not specs:
+            return {"order_number": order_number, "confirm_failed": False}
+
+        result = await inv_service.create_events_bulk(specs)
+        if dedup_token in result["skipped_tokens"]:
+            logger.warning(
+                f"重复订单已跳过（并发写入）: order={order_number}, status={order_status}, store={store_id}"
+            )
+            return skipped
 
         results = {"order_number": order_number, "confirm_failed": False}
+        if order_status == "100" and defer_confirm:
+            results["confirm_item"] = specs[0]["metadata"]["item"]
+        elif order_status == "100":
+            results["confirm_failed"] = not await self._confirm_order(
+                client, order_number, store_id, specs[0]["metadata"]["item"]
+            )
+        return results
 
-        for item in order_items:
-            raw_sku = item.get("skuNumber", item.get("itemManagementNumber", ""))
-            if not raw_sku:
-                continue
+    @staticmethod
+    def _order_token(order: dict[str, Any], store_id: str) -> str:
+        return f"{order.get('orderNumber', '')}_{order.get('orderStatus', '')}_{store_id}"
 
-            sku_id = normalize_sku(raw_sku)
-            quantity = int(item.get("quantity", 0))
+    async def _existing_tokens(self, tokens) -> set[str]:
+        """用一条 IN 查询返回已存在的 token（只取 token 列）"""
+        tokens = list(set(tokens))
+        if not tokens:
+            return set()
+        result = await self.session.execute(
+            select(InventoryEvent.token).where(InventoryEvent.token.in_(tokens))
+        )
+        return set(result.scalars().all())
 
-            if order_status == "100":
-                await self._handle_new_order(
-                    sku_id, quantity, store_id, order_number, order_status, item, client
-                )
-                results["confirm_failed"] = True
-            elif order_status == "300":
-                await self._handle_confirmed_order(
-                    sku_id, store_id, order_number, order_status, item
-                )
-            elif order_status == "900":
-                await self._handle_cancelled_order(
-                    sku_id, quantity, store_id, order_number, order_status, item
-                )
+    @staticmethod
+    def _iter_order_items(order: dict[str, Any]):
+        """遍历订单商品行，返回 (规范化 SKU, 商品行)，跳过没有 SKU 的行"""
+        order_items = order.get("orderItemList", {}).get("orderItem", [])
+        if isinstance(order_items, dict):
+            order_items = [order_items]
 
-        return results
+        for item in order_items:
+            raw_sku = item.get("skuNumber", item.get("itemManagementNumber", ""))
+            if raw_sku:
+                yield normalize_sku(raw_sku), item
 
-    async def _handle_new_order(
+    async def _new_order_spec(
         self,
+        inv_service: InventoryService,
         sku_id: str,
         quantity: int,
-        store_id: str,
-        order_number: str,
-        platform_status: str,
         item: dict[str, Any],
-        client,
-    ):
-        """处理新订单 (状态100) - 减少库存并确认订单"""
-        from app.services.inventory import InventoryService
-
-        inv_service = InventoryService(self.session)
-
-        sku = await inv_service.get_or_create_sku(sku_id, sku_id, environment="prod")
-
-        # 生成去重 token
-        dedup_token = f"{order_number}_{platform_status}_{store_id}"
+    ) -> dict[str, Any]:
+        """新订单 (状态100) - 减少库存"""
+        if not await inv_service.get_sku_info(sku_id):
+            await inv_service.get_or_create_sku(sku_id, sku_id, environment="prod")
 
-        await inv_service.create_event(
-            event_type=EventTypeEnumSchema.ORDER_RECEIVED,
-            sku_id=sku_id,
-            quantity=-quantity,
-            store_id=store_id,
-            platform_status=platform_status,
-            order_id=order_number,
-            operator="system",
-            reason="乐天新订单",
-            source=SourceEnumSchema.API,
-            metadata={"item": item},
-            token=dedup_token,  # 设置去重 token
-        )
+        return {
+            "event_type": EventTypeEnumSchema.ORDER_RECEIVED,
+            "quantity": -quantity,
+            "reason": "乐天新订单",
+        }
 
-        # 尝试确认订单
+    async def _confirm_order(
+        self,
+        client,
+        order_number: str,
+        store_id: str,
+        item: dict[str, Any],
+    ) -> bool:
+        """确认新订单，失败时加入重试队列"""
         try:
             await client.confirm_order(order_number)
             logger.info(f"Order {order_number} confirmed successfully")
+            return True
         except RakutenAPIError as e:
             error_msg = f"Failed to confirm order {order_number}: {e}"
             logger.error(error_msg)
-            # 记录 API 错误到事件表
-            await inv_service.log_api_error(
+            # 记录 API 错误（批量写入错误日志，不占用当前事务）
+            api_error_log.record(
                 error_message=str(e),
                 store_id=store_id,
-                sku_id=sku_id,
                 operation="confirm_order",
                 error_details={
                     "order_number": order_number,
-                    "sku_id": sku_id,
                     "error_code": e.code if hasattr(e, 'code') else None,
                 }
             )
@@ -252,6 +385,7 @@ class OrderPollingService:
             await self._add_order_to_retry_queue(
                 order_number, store_id, str(e), item
             )
+            return False
 
     async def _add_order_to_retry_queue(
         self,
@@ -318,6 +452,10 @@ class OrderPollingService:
                 failed.append(retry.order_number)
                 continue
 
+            if circuit_open(store.api_config, CIRCUIT_ORDERS):
+                # 熔断期间保留重试记录，不消耗重试次数
+                continue
+
             try:
                 client = get_rakuten_client(store.api_config)
                 await client.confirm_order(retry.order_number)
@@ -339,9 +477,8 @@ class OrderPollingService:
                     logger.error(
                         f"Order {retry.order_number} failed after {RetryConfig.MAX_RETRIES} retries"
                     )
-                    # 记录最终失败到事件表
-                    inv_service = InventoryService(self.session)
-                    await inv_service.log_api_error(
+                    # 记录最终失败到错误日志
+                    api_error_log.record(
                         error_message=f"Order confirm failed after {RetryConfig.MAX_RETRIES} retries: {e}",
                         store_id=retry.store_id,
                         operation="confirm_order",
@@ -360,9 +497,8 @@ class OrderPollingService:
                         f"Order {retry.order_number} will retry in {wait_minutes} minutes "
                         f"(attempt {retry.retry_count}/{RetryConfig.MAX_RETRIES})"
                     )
-                    # 记录重试失败到事件表
-                    inv_service = InventoryService(self.session)
-                    await inv_service.log_api_error(
+                    # 记录重试失败到错误日志
+                    api_error_log.record(
                         error_message=str(e),
                         store_id=retry.store_id,
                         operation="confirm_order_retry",
@@ -383,66 +519,33 @@ class OrderPollingService:
             "total": len(retries),
         }
 
-    async def _handle_confirmed_order(
+    async def _confirmed_order_spec(
         self,
+        inv_service: InventoryService,
         sku_id: str,
-        store_id: str,
-        order_number: str,
-        platform_status: str,
+        quantity: int,
         item: dict[str, Any],
-    ):
-        """处理已确认订单 (状态300)"""
-        from app.services.inventory import InventoryService
-
-        inv_service = InventoryService(self.session)
-
-        # 生成去重 token
-        dedup_token = f"{order_number}_{platform_status}_{store_id}"
-
-        await inv_service.create_event(
-            event_type=EventTypeEnumSchema.ORDER_CONFIRMED,
-            sku_id=sku_id,
-            quantity=0,
-            store_id=store_id,
-            platform_status=platform_status,
-            order_id=order_number,
-            operator="system",
-            reason="乐天订单已确认",
-            source=SourceEnumSchema.API,
-            metadata={"item": item},
-            token=dedup_token,  # 设置去重 token
-        )
+    ) -> dict[str, Any]:
+        """已确认订单 (状态300) - 只记录，不影响库存"""
+        return {
+            "event_type": EventTypeEnumSchema.ORDER_CONFIRMED,
+            "quantity": 0,
+            "reason": "乐天订单已确认",
+        }
 
-    async def _handle_cancelled_order(
+    async def _cancelled_order_spec(
         self,
+        inv_service: InventoryService,
         sku_id: str,
         quantity: int,
-        store_id: str,
-        order_number: str,
-        platform_status: str,
         item: dict[str, Any],
-    ):
-        """处理取消订单 (状态900) - 增加库存"""
-        from app.services.inventory import InventoryService
-
-        inv_service = InventoryService(self.session)
-
-        # 生成去重 token
-        dedup_token = f"{order_number}_{platform_status}_{store_id}"
-
-        await inv_service.create_event(
-            event_type=EventTypeEnumSchema.ORDER_CANCELLED,
-            sku_id=sku_id,
-            quantity=quantity,
-            store_id=store_id,
-            platform_status=platform_status,
-            order_id=order_number,
-            operator="system",
-            reason="乐天订单取消",
-            source=SourceEnumSchema.API,
-            metadata={"item": item},
-            token=dedup_token,  # 设置去重 token
-        )
+    ) -> dict[str, Any]:
+        """取消订单 (状态900) - 增加库存"""
+        return {
+            "event_type": EventTypeEnumSchema.ORDER_CANCELLED,
+            "quantity": quantity,
+            "reason": "乐天订单取消",
+        }
 
     async def poll_all_stores(self) -> dict[str, Any]:
         """轮询所有活跃店铺的订单"""
@@ -456,8 +559,13 @@ class OrderPollingService:
 
         total_processed = 0
         errors = []
+        skipped = []
 
         for store in stores:
+            if circuit_open(store.api_config, CIRCUIT_ORDERS):
+                # 订单接口已熔断（认证失效、RMS 故障），冷却结束前不请求该店铺
+                skipped.append(store.store_id)
+                continue
             store_result = await self.poll_orders_for_store(store)
             total_processed += store_result.get("processed", 0)
             if "error" in store_result:
@@ -468,7 +576,8 @@ class OrderPollingService:
 
         return {
             "total_processed": total_processed,
-            "stores_polled": len(stores),
+            "stores_polled": len(stores) - len(skipped),
+            "stores_skipped": skipped,
             "errors": errors,
             "retry_processed": retry_result.get("processed", 0),
             "retry_failed": retry_result.get("failed", []),
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import async_session_factory
+from app.db.models import StoreSku
+from app.utils.helpers import normalize_sku
+
+logger = logging.getLogger(__name__)
+
+# Session.info 中等待提交后通知的 [(队列, sku_id, store_id, 所在事务)]
+_PENDING_NOTICES = "push_queue_pending"
+
+
+class PushQueue:
+    """合并库存变更通知、按店铺批量推送的队列
+
+    写入路径在快照变化时调用 ``notify_after_commit``（不阻塞、不访问数据库），
+    事务提交后才记为通知，回滚时丢弃，刷新时读到的一定是已提交的快照。窗口内对同一
+    (store_id, sku_id) 的重复通知只保留一个；窗口结束后每个店铺的待推送 SKU
+    通过 InventorySyncService.sync_skus_to_store 一次 bulk 推送，API 调用次数随
+    不同 SKU 数增长，而不是随订单行数增长。
+
+    只有调用 ``start`` 后才接收通知。
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = async_session_factory,
+        window_seconds: float = 2.0,
+    ):
+        self.session_factory = session_factory
+        self.window_seconds = window_seconds
+        # store_id -> SKU；store_id 为 None 表示推送到 SKU 注册的所有店铺
+        self._pending: dict[str | None, set[str]] = {}
+        self._oldest: float | None = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self.notices = 0
+        self.flushed_skus = 0
+        self.pushed_skus = 0
+        self.flushes = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def notify(self, sku_id: str, store_id: str | None = None) -> None:
+        """记录一次库存变更通知"""
+        if not self.running:
+            return
+        self._pending.setdefault(store_id, set()).add(normalize_sku(sku_id))
+        self.notices += 1
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+            self._wakeup.set()
+
+    def notify_after_commit(
+        self,
+        session: AsyncSession,
+        sku_id: str,
+        store_id: str | None = None,
+    ) -> None:
+        """会话提交后记录通知；所在事务（或 savepoint）回滚时丢弃"""
+        if not self.running:
+            return
+        sync_session = session.sync_session
+        transaction = sync_session.get_nested_transaction() or sync_session.get_transaction()
+        sync_session.info.setdefault(_PENDING_NOTICES, []).append(
+            (self, sku_id, store_id, transaction)
+        )
+
+    def depth(self) -> int:
+        """待推送的 (store_id, sku_id) 数量"""
+        return sum(len(skus) for skus in self._pending.values())
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await asyncio.sleep(self.window_seconds)
+            await self.flush()
+
+    async def flush(self) -> dict[str, Any]:
+        """推送当前所有待推送的 SKU，返回每个店铺的推送摘要"""
+        from app.services.inventory_sync import InventorySyncService
+
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            oldest, self._oldest = self._oldest, None
+            if not pending:
+                return {}
+
+            self.flushed_skus += sum(len(skus) for skus in pending.values())
+            results: dict[str, Any] = {}
+            try:
+                async with self.session_factory() as session:
+                    by_store = await self._resolve_stores(session, pending)
+                    service = InventorySyncService(session)
+                    for store_id, sku_ids in by_store.items():
+                        result = await service.sync_skus_to_store(store_id, sorted(sku_ids))
+                        results[store_id] = result
+                        self.pushed_skus += result.get("success", 0)
+            except Exception as e:
+                # 未推送的变化与 last_pushed_quantity 不同，由下一次店铺同步补上
+                logger.error(f"推送队列刷新失败: {e}")
+
+            self.flushes += 1
+            if oldest is not None:
+                self.last_flush_latency = time.monotonic() - oldest
+                self.max_flush_latency = max(self.max_flush_latency, self.last_flush_latency)
+            return results
+
+    async def _resolve_stores(
+        self,
+        session: AsyncSession,
+        pending: dict[str | None, set[str]],
+    ) -> dict[str, set[str]]:
+        by_store = {store_id: set(skus) for store_id, skus in pending.items() if store_id}
+        unscoped = pending.get(None)
+        if unscoped:
+            result = await session.execute(
+                select(StoreSku.store_id, StoreSku.sku_id).where(StoreSku.sku_id.in_(unscoped))
+            )
+            for store_id, sku_id in result:
+                by_store.setdefault(store_id, set()).add(sku_id)
+        return by_store
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self.running,
+            "window_seconds": self.window_seconds,
+            "depth": self.depth(),
+            "notices": self.notices,
+            "flushed_skus": self.flushed_skus,
+            "pushed_skus": self.pushed_skus,
+            # 平均每个待推送 SKU 合并了多少次通知
+            "coalescing_ratio": (
+                round(self.notices / self.flushed_skus, 2) if self.flushed_skus else 0.0
+            ),
+            "flushes": self.flushes,
+            "last_flush_latency_ms": round(self.last_flush_latency * 1000, 1),
+            "max_flush_latency_ms": round(self.max_flush_latency * 1000, 1),
+        }
+
+    def start(self) -> None:
+        """启动后台合并推送（在应用 lifespan 中调用）"""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台任务并推送剩余的变更"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+push_queue = PushQueue(window_seconds=settings.PUSH_COALESCE_SECONDS)
+
+
+def _within(transaction, ancestor) -> bool:
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_committed(session: Session) -> None:
+    for queue, sku_id, store_id, _ in session.info.pop(_PENDING_NOTICES, ()):
+        queue.notify(sku_id, store_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_rolled_back(session: Session, previous_transaction) -> None:
+    pending = session.info.get(_PENDING_NOTICES)
+    if pending:
+        pending[:] = [
+            notice for notice in pending if not _within(notice[3], previous_transaction)
+        ]
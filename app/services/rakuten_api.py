@@ -1,16 +1,75 @@
+import asyncio
 import base64
-import json
+import importlib.util
 import logging
+import random
+import re
+import time
+import uuid
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
 from typing import Any
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
 
 import httpx
 
 from app.core.config import settings
+from app.services.circuit_breaker import CircuitBreaker, rakuten_circuits
+from app.services.rate_limiter import RateLimiter, create_rate_limiter, shop_key
+from app.services.retry_policy import RetryPolicy, default_retry_policy, parse_retry_after
+from app.utils import json_codec
+from app.utils.helpers import percentile
 
 logger = logging.getLogger(__name__)
 
-RAKUTEN_BASE_URL = "https://api.rms.rakuten.co.jp"
+# 接口名（与乐天文档的功能名一致），用于重试预算与统计
+ENDPOINT_SEARCH_ORDER = "searchOrder"
+ENDPOINT_GET_ORDER = "getOrder"
+ENDPOINT_CONFIRM_ORDER = "confirmOrder"
+ENDPOINT_INVENTORY_SET = "inventory.set"
+ENDPOINT_BULK_UPSERT = "inventories.bulk.upsert"
+ENDPOINT_BULK_GET = "inventories.bulk.get"
+ENDPOINT_BULK_GET_RANGE = "inventories.bulk.get.range"
+ENDPOINT_ITEMS_GET = "items.get"
+ENDPOINT_ITEMS_SEARCH = "items.search"
+
+# 各接口每秒请求上限（INVENTORY_API_2.0_DETAIL_EXAMPLE.md 等）；未列出的接口不限速
+ENDPOINT_RATE_LIMITS: dict[str, float] = {
+    ENDPOINT_INVENTORY_SET: 1,
+    ENDPOINT_BULK_UPSERT: 1,
+    ENDPOINT_BULK_GET: 5,
+    ENDPOINT_BULK_GET_RANGE: 5,
+    ENDPOINT_ITEMS_GET: 5,
+}
+
+# 熔断按接口类别计，一类接口故障（如订单接口维护）不影响其他类别；未列出的接口不熔断
+CIRCUIT_ORDERS = "orders"
+CIRCUIT_INVENTORY = "inventory"
+CIRCUIT_ITEMS = "items"
+ENDPOINT_CIRCUITS: dict[str, str] = {
+    ENDPOINT_SEARCH_ORDER: CIRCUIT_ORDERS,
+    ENDPOINT_GET_ORDER: CIRCUIT_ORDERS,
+    ENDPOINT_CONFIRM_ORDER: CIRCUIT_ORDERS,
+    ENDPOINT_INVENTORY_SET: CIRCUIT_INVENTORY,
+    ENDPOINT_BULK_UPSERT: CIRCUIT_INVENTORY,
+    ENDPOINT_BULK_GET: CIRCUIT_INVENTORY,
+    ENDPOINT_BULK_GET_RANGE: CIRCUIT_INVENTORY,
+    ENDPOINT_ITEMS_GET: CIRCUIT_ITEMS,
+    ENDPOINT_ITEMS_SEARCH: CIRCUIT_ITEMS,
+}
+
+# searchOrder 每页最多 1000 个订单；其余页的并发请求数
+SEARCH_ORDER_MAX_PAGE_SIZE = 1000
+SEARCH_ORDER_CONCURRENCY = 4
+
+# inventories/bulk-upsert 每次请求最多 400 个 SKU
+BULK_UPSERT_MAX_ITEMS = 400
+
+# inventories/bulk-get 每次请求最多 1000 个 SKU
+BULK_GET_MAX_ITEMS = 1000
 
 # 乐天图片 URL 基础地址
 RAKUTEN_CABINET_IMAGE_BASE = "https://image.rakuten.co.jp"
@@ -24,12 +83,201 @@ class RakutenAPIError(Exception):
         self.response = response
 
 
+class CircuitOpenError(RakutenAPIError):
+    """店铺该类接口已熔断，请求未发送"""
+
+
+class RequestMetrics:
+    """HTTP 调用统计（每次尝试计一次调用）
+
+    客户端自身的统计是累计值（只保留最近 max_samples 个延迟样本）；
+    单次同步运行的统计使用 track_requests。
+    """
+
+    def __init__(self, max_samples: int | None = None):
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.retry_wait = 0.0
+        self.throttle_wait = 0.0
+        self.latencies: deque[float] = deque(maxlen=max_samples)
+
+    def summary(self) -> dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "http_calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "retry_wait_seconds": round(self.retry_wait, 3),
+            "throttle_wait_seconds": round(self.throttle_wait, 3),
+            "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            "latency_p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        }
+
+
+# 当前作用域（及其中创建的子任务）内需要额外记录调用的统计对象
+_tracked_metrics: ContextVar[tuple[RequestMetrics, ...]] = ContextVar(
+    "rakuten_tracked_metrics", default=()
+)
+
+# 客户端累计统计保留的延迟样本数
+CLIENT_LATENCY_SAMPLES = 1000
+
+
+@contextmanager
+def track_requests() -> Iterator[RequestMetrics]:
+    """统计作用域内发出的所有乐天 API 调用（客户端共享时按运行区分统计）"""
+    metrics = RequestMetrics()
+    token = _tracked_metrics.set(_tracked_metrics.get() + (metrics,))
+    try:
+        yield metrics
+    finally:
+        _tracked_metrics.reset(token)
+
+
+def _payload_summary(payload: Any) -> str:
+    """载荷的简短描述（顶层键与列表长度），INFO 日志使用，不序列化整个载荷"""
+    if isinstance(payload, dict):
+        parts = [
+            f"{key}[{len(value)}]" if isinstance(value, (list, dict)) else key
+            for key, value in payload.items()
+        ]
+        return "{" + ", ".join(parts) + "}"
+    if isinstance(payload, list):
+        return f"[{len(payload)} items]"
+    return type(payload).__name__
+
+
+def _log_payload(endpoint: str, direction: str, payload: Any) -> None:
+    """DEBUG 级别才序列化载荷，并截断到 RAKUTEN_LOG_PAYLOAD_MAX_CHARS 个字符"""
+    if payload is None or not logger.isEnabledFor(logging.DEBUG):
+        return
+    text = json_codec.dumps(payload)
+    limit = settings.RAKUTEN_LOG_PAYLOAD_MAX_CHARS
+    if len(text) > limit:
+        text = f"{text[:limit]}...({len(text)} chars)"
+    logger.debug("Rakuten API %s %s: %s", endpoint, direction, text)
+
+
+class PayloadDumper:
+    """按采样率把完整的请求/响应写入目录，排查问题时使用（默认关闭）
+
+    序列化在事件循环中完成（orjson 很快），写文件放到线程池。
+    """
+
+    def __init__(
+        self,
+        directory: str | None,
+        sample_rate: float = 0.0,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.directory = Path(directory) if directory else None
+        self.sample_rate = sample_rate
+        self.rng = rng
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None and self.sample_rate > 0
+
+    def maybe_dump(self, endpoint: str, request: Any, response: Any) -> None:
+        if not self.enabled or self.rng() >= self.sample_rate:
+            return
+        name = re.sub(r"[^\w.-]", "_", endpoint).strip("_")
+        path = self.directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{uuid.uuid4().hex[:8]}.json"
+        content = json_codec.dumps_bytes(
+            {"endpoint": endpoint, "request": request, "response": response}
+        )
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._write, path, content)
+        except RuntimeError:
+            self._write(path, content)
+
+    def _write(self, path: Path, content: bytes) -> None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+        except OSError as e:
+            logger.warning(f"写入乐天 API 载荷样本失败: {e}")
+
+
+payload_dumper = PayloadDumper(
+    settings.RAKUTEN_PAYLOAD_DUMP_DIR,
+    settings.RAKUTEN_PAYLOAD_DUMP_SAMPLE_RATE,
+)
+
+rakuten_rate_limiter = create_rate_limiter(ENDPOINT_RATE_LIMITS)
+
+
+def _order_numbers(response: dict[str, Any]) -> list[str]:
+    """searchOrder 响应中的订单号"""
+    order_numbers = []
+    if "orderNumberList" in response:
+        order_list = response["orderNumberList"]
+        if isinstance(order_list, dict):
+            order_numbers.append(order_list.get("orderNumber", ""))
+        elif isinstance(order_list, list):
+            for item in order_list:
+                # 正式接口返回订单号字符串列表；兼容旧格式 [{"orderNumber": ...}]
+                if isinstance(item, str):
+                    order_numbers.append(item)
+                else:
+                    order_numbers.append(item.get("orderNumber", ""))
+
+    return [o for o in order_numbers if o]
+
+
 class RakutenAPIClient:
-    def __init__(self, service_secret: str, license_key: str, shop_url: str = None):
+    def __init__(
+        self,
+        service_secret: str,
+        license_key: str,
+        shop_url: str = None,
+        base_url: str | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+        http_client: httpx.AsyncClient | None = None,
+        retry_policy: RetryPolicy | None = None,
+        rate_limiter: RateLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+    ):
         self.service_secret = service_secret
         self.license_key = license_key
         self.shop_url = shop_url
+        # 默认使用 RAKUTEN_API_BASE_URL；transport 用于在进程内直接调用模拟器等 ASGI 应用
+        self.base_url = base_url or settings.RAKUTEN_API_BASE_URL
+        self.transport = transport
+        # 由 RakutenClientRegistry 提供的长连接池；为 None 时每次请求新建连接
+        self.http_client = http_client
+        # 正在使用连接池的请求数；retire 后由最后一个请求关闭连接池
+        self._pool_users = 0
+        self._retired_pool: httpx.AsyncClient | None = None
+        self.retry_policy = retry_policy or default_retry_policy
+        # 默认使用进程共享的限速器（RAKUTEN_RATE_LIMIT_BACKEND=off 时为 None）
+        self.rate_limiter = rate_limiter or rakuten_rate_limiter
+        self.circuit_breaker = circuit_breaker or rakuten_circuits
+        self._shop_key = shop_key(service_secret, license_key)
+        # 进行中的幂等 GET 请求 {(url, 参数): task}，并发的相同请求共用结果
+        self._inflight: dict[tuple, asyncio.Future] = {}
         self._auth_header = self._generate_auth_header()
+        self.metrics = RequestMetrics(max_samples=CLIENT_LATENCY_SAMPLES)
+
+    def _record(
+        self,
+        latency: float | None = None,
+        retry: bool = False,
+        rate_limited: bool = False,
+        wait: float = 0.0,
+        throttle_wait: float = 0.0,
+    ) -> None:
+        for metrics in (self.metrics, *_tracked_metrics.get()):
+            metrics.throttle_wait += throttle_wait
+            if latency is not None:
+                metrics.calls += 1
+                metrics.latencies.append(latency)
+            if retry:
+                metrics.retries += 1
+                metrics.retry_wait += wait
+            if rate_limited:
+                metrics.rate_limited += 1
 
     def _generate_auth_header(self) -> str:
         auth_str = f"{self.service_secret}:{self.license_key}"
@@ -49,73 +297,210 @@ class RakutenAPIClient:
         url: str,
         params: dict | None = None,
         data: dict | None = None,
-        max_retries: int = 3,
+        endpoint: str = "",
+        idempotent: bool = True,
     ) -> dict[str, Any]:
-        retry_count = 0
-        last_error = None
+        """发送请求，按 retry_policy 重试 429、临时故障和网络错误
+
+        所属接口类别熔断时直接抛出 CircuitOpenError；重试用尽后的 5xx / 网络错误计为一次
+        失败，401/403 立即熔断，429 不影响熔断状态。
+
+        幂等 GET 请求合并（single-flight）：同一 URL 和参数的并发请求共用一个进行中的请求
+        及其结果（同一个 dict，调用方不要修改）。
+
+        Args:
+            endpoint: 接口名（重试预算按接口计），为空时使用 URL 路径
+            idempotent: 请求是否可以安全地重复执行
+        """
+        endpoint = endpoint or urlsplit(url).path
+        if method != "GET" or not idempotent:
+            return await self._guarded_request(method, url, params, data, endpoint, idempotent)
+
+        key = (url, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._guarded_request(method, url, params, data, endpoint, idempotent)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._request_done(key, done))
+        else:
+            logger.debug(f"{endpoint} request coalesced with in-flight GET {url}")
+        # 某个调用方被取消时不取消共享请求，其他调用方仍然等待它的结果
+        return await asyncio.shield(task)
 
-        while retry_count <= max_retries:
+    async def _release_pool(self) -> None:
+        self._pool_users -= 1
+        if self._pool_users == 0 and self._retired_pool is not None:
+            pool, self._retired_pool = self._retired_pool, None
+            await pool.aclose()
+
+    async def retire(self) -> None:
+        """停止使用连接池：之后的请求改用一次性连接，进行中的请求结束后关闭连接池
+
+        凭证变更时注册表不再提供该客户端，但同步任务可能仍持有它。
+        """
+        pool, self.http_client = self.http_client, None
+        if pool is None:
+            return
+        if self._pool_users:
+            self._retired_pool = pool
+        else:
+            await pool.aclose()
+
+    def _request_done(self, key: tuple, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # 所有调用方都已取消时，避免 "exception was never retrieved" 警告
+            task.exception()
+
+    async def _guarded_request(
+        self,
+        method: str,
+        url: str,
+        params: dict | None,
+        data: dict | None,
+        endpoint: str,
+        idempotent: bool,
+    ) -> dict[str, Any]:
+        """经过熔断器发送请求"""
+        circuit = ENDPOINT_CIRCUITS.get(endpoint)
+        if circuit is None:
+            return await self._request_with_retries(method, url, params, data, endpoint, idempotent)
+
+        breaker = self.circuit_breaker
+        if not breaker.allow(self._shop_key, circuit):
+            raise CircuitOpenError(f"Circuit open for {circuit} endpoints, request to {endpoint} skipped")
+        try:
+            result = await self._request_with_retries(method, url, params, data, endpoint, idempotent)
+        except RakutenAPIError as e:
+            if e.code is None or e.code >= 500:
+                breaker.record_failure(self._shop_key, circuit, str(e))
+            elif e.code in (401, 403):
+                breaker.record_failure(self._shop_key, circuit, str(e), trip=True)
+            elif e.code == 429:
+                breaker.release(self._shop_key, circuit)
+            else:
+                # 400/404 等业务错误说明服务正常
+                breaker.record_success(self._shop_key, circuit)
+            raise
+        except BaseException:
+            breaker.release(self._shop_key, circuit)
+            raise
+        breaker.record_success(self._shop_key, circuit)
+        return result
+
+    async def _request_with_retries(
+        self,
+        method: str,
+        url: str,
+        params: dict | None,
+        data: dict | None,
+        endpoint: str,
+        idempotent: bool,
+    ) -> dict[str, Any]:
+        attempt = 0
+        # 请求体只序列化一次，重试时复用
+        content = json_codec.dumps_bytes(data) if data is not None else None
+        _log_payload(endpoint, "request", data if data is not None else params)
+
+        while True:
+            if self.rate_limiter is not None:
+                waited = await self.rate_limiter.acquire(self._shop_key, endpoint)
+                if waited:
+                    self._record(throttle_wait=waited)
+            started = time.monotonic()
             try:
-                # 使用代理（如果配置了）
-                proxy = settings.RAKUTEN_PROXY if settings.RAKUTEN_PROXY else None
-                if proxy:
-                    logger.info(f"使用代理: {proxy}")
-
-                async with httpx.AsyncClient(timeout=30.0, proxy=proxy) as client:
-                    if method == "GET":
-                        response = await client.request(
-                            method=method,
-                            url=url,
-                            headers=self._get_headers(),
-                            params=params,
-                        )
-                    else:
-                        response = await client.request(
-                            method=method,
-                            url=url,
-                            headers=self._get_headers(),
-                            json=data,
-                        )
-
-                    if response.status_code == 200:
-                        try:
-                            return response.json()
-                        except:
-                            return {"raw": response.text}
-                    elif response.status_code == 401:
-                        raise RakutenAPIError(
-                            "License key may be expired",
-                            code=401,
-                            response=response.text
-                        )
-                    elif response.status_code == 429:
-                        wait_time = 2 ** retry_count
-                        logger.warning(f"Rate limited, waiting {wait_time}s before retry")
-                        import asyncio
-                        asyncio.sleep(wait_time)
-                        retry_count += 1
-                        continue
-                    else:
-                        raise RakutenAPIError(
-                            f"API request failed: {response.status_code}",
-                            code=response.status_code,
-                            response=response.text
-                        )
-
-            except RakutenAPIError:
-                raise
+                http_client = self.http_client
+                if http_client is not None:
+                    self._pool_users += 1
+                    try:
+                        response = await self._send(http_client, method, url, params, content)
+                    finally:
+                        await self._release_pool()
+                else:
+                    # 使用代理（如果配置了；自定义 transport 时不使用）
+                    proxy = settings.RAKUTEN_PROXY if settings.RAKUTEN_PROXY and not self.transport else None
+                    if proxy:
+                        logger.info(f"使用代理: {proxy}")
+
+                    async with httpx.AsyncClient(
+                        timeout=30.0, proxy=proxy, transport=self.transport
+                    ) as client:
+                        response = await self._send(client, method, url, params, content)
             except Exception as e:
-                last_error = e
-                if retry_count < max_retries:
-                    wait_time = 2 ** retry_count
-                    logger.warning(f"Request failed: {e}, retrying in {wait_time}s")
-                    import asyncio
-                    asyncio.sleep(wait_time)
-                    retry_count += 1
+                self._record(latency=time.monotonic() - started)
+                delay = self.retry_policy.retry_delay(endpoint, attempt, idempotent, error=e)
+                if delay is None:
+                    raise RakutenAPIError(f"Request failed after {attempt} retries: {e}") from e
+                logger.warning(f"{endpoint} request failed: {e}, retrying in {delay:.2f}s")
+                status = None
+            else:
+                self._record(latency=time.monotonic() - started)
+                status = response.status_code
+
+                if status == 204:
+                    # bulk-upsert 等更新类接口成功时没有响应体
+                    return {}
+                elif 200 <= status < 300:
+                    try:
+                        result = json_codec.loads(response.content)
+                    except ValueError:
+                        return {"raw": response.text}
+                    _log_payload(endpoint, "response", result)
+                    payload_dumper.maybe_dump(endpoint, data if data is not None else params, result)
+                    return result
+                elif status == 401:
+                    raise RakutenAPIError(
+                        "License key may be expired",
+                        code=401,
+                        response=response.text
+                    )
+
+                delay = self.retry_policy.retry_delay(
+                    endpoint,
+                    attempt,
+                    idempotent,
+                    status=status,
+                    retry_after=parse_retry_after(response.headers.get("Retry-After")),
+                )
+                if delay is None:
+                    raise RakutenAPIError(
+                        f"API request failed: {status}",
+                        code=status,
+                        response=response.text
+                    )
+                if status == 429:
+                    logger.warning(f"{endpoint} rate limited, waiting {delay:.2f}s before retry")
                 else:
-                    raise RakutenAPIError(f"Request failed after {max_retries} retries: {e}")
+                    logger.warning(f"{endpoint} returned {status}, retrying in {delay:.2f}s")
 
-        return {}
+            self._record(retry=True, rate_limited=status == 429, wait=delay)
+            await self.retry_policy.sleep(delay)
+            attempt += 1
+
+    async def _send(
+        self,
+        client: httpx.AsyncClient,
+        method: str,
+        url: str,
+        params: dict | None,
+        content: bytes | None,
+    ) -> httpx.Response:
+        if method == "GET":
+            return await client.request(
+                method=method,
+                url=url,
+                headers=self._get_headers(),
+                params=params,
+            )
+        return await client.request(
+            method=method,
+            url=url,
+            headers=self._get_headers(),
+            content=content,
+        )
 
     async def search_order(
         self,
@@ -123,9 +508,70 @@ class RakutenAPIClient:
         end_datetime,
         order_status: list | None = None,
     ) -> list[str]:
-        """Search orders by date range. Returns order numbers."""
-        url = urljoin(RAKUTEN_BASE_URL, "/es/2.0/order/searchOrder/")
+        """Search orders by date range. Returns order numbers of all pages."""
+        return [
+            order_number
+            async for order_number in self.iter_order_numbers(
+                start_datetime, end_datetime, order_status
+            )
+        ]
+
+    async def iter_order_numbers(
+        self,
+        start_datetime,
+        end_datetime,
+        order_status: list | None = None,
+        page_size: int = SEARCH_ORDER_MAX_PAGE_SIZE,
+        concurrency: int = SEARCH_ORDER_CONCURRENCY,
+    ) -> AsyncIterator[str]:
+        """按日期范围搜索订单，逐页产出订单号
+
+        先请求第 1 页并读取 PaginationResponseModel.totalPages，其余页最多 concurrency 个并发
+        请求（仍经过限速器），按到达顺序产出，调用方可以在搜索完成前开始 getOrder。
+        结果按下单时间倒序：翻页期间新到的订单只会把已有订单挤到后面的页，不会漏单，
+        重复出现的订单号只产出一次。
+        """
+        request_body = self._search_order_body(start_datetime, end_datetime, order_status, page_size)
+        seen: set[str] = set()
+
+        def fresh(response: dict[str, Any]) -> list[str]:
+            numbers = [n for n in _order_numbers(response) if n not in seen]
+            seen.update(numbers)
+            return numbers
+
+        first = await self._search_order_page(request_body, 1)
+        for order_number in fresh(first):
+            yield order_number
+
+        pagination = first.get("PaginationResponseModel") or {}
+        total_pages = int(pagination.get("totalPages") or 1)
+        if total_pages <= 1:
+            return
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(page: int) -> dict[str, Any]:
+            async with semaphore:
+                return await self._search_order_page(request_body, page)
 
+        tasks = [asyncio.create_task(fetch(page)) for page in range(2, total_pages + 1)]
+        try:
+            for next_page in asyncio.as_completed(tasks):
+                for order_number in fresh(await next_page):
+                    yield order_number
+        finally:
+            # 调用方提前停止或某页失败时取消其余请求
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _search_order_body(
+        self,
+        start_datetime,
+        end_datetime,
+        order_status: list | None,
+        page_size: int,
+    ) -> dict[str, Any]:
         if isinstance(start_datetime, str):
             start_dt = start_datetime
         else:
@@ -141,7 +587,7 @@ class RakutenAPIClient:
             "startDatetime": start_dt,
             "endDatetime": end_dt,
             "PaginationRequestModel": {
-                "requestRecordsAmount": 30,
+                "requestRecordsAmount": page_size,
                 "requestPage": 1,
                 "sortModelList": [
                     {
@@ -157,27 +603,29 @@ class RakutenAPIClient:
 
         if self.shop_url:
             request_body["shopUrl"] = self.shop_url
+        return request_body
 
-        logger.info(f"Rakuten API: Searching orders with body: {request_body}")
-        
-        response = await self._request("POST", url, data=request_body)
-        
-        logger.info(f"Rakuten API: Search response: {response}")
-
-        order_numbers = []
-        if "orderNumberList" in response:
-            order_list = response["orderNumberList"]
-            if isinstance(order_list, dict):
-                order_numbers.append(order_list.get("orderNumber", ""))
-            elif isinstance(order_list, list):
-                for item in order_list:
-                    order_numbers.append(item.get("orderNumber", ""))
+    async def _search_order_page(self, request_body: dict[str, Any], page: int) -> dict[str, Any]:
+        url = urljoin(self.base_url, "/es/2.0/order/searchOrder/")
+        body = {
+            **request_body,
+            "PaginationRequestModel": {**request_body["PaginationRequestModel"], "requestPage": page},
+        }
+
+        response = await self._request(
+            "POST", url, data=body, endpoint=ENDPOINT_SEARCH_ORDER
+        )
 
-        return [o for o in order_numbers if o]
+        logger.info(
+            "Rakuten API: searchOrder page %d returned %d orders",
+            page,
+            len(response.get("orderNumberList") or []),
+        )
+        return response
 
     async def get_order(self, order_numbers: list[str]) -> list[dict[str, Any]]:
         """Get order details by order numbers."""
-        url = urljoin(RAKUTEN_BASE_URL, "/es/2.0/order/getOrder")
+        url = urljoin(self.base_url, "/es/2.0/order/getOrder")
 
         request_body = {
             "orderNumberList": order_numbers
@@ -186,11 +634,9 @@ class RakutenAPIClient:
         if self.shop_url:
             request_body["shopUrl"] = self.shop_url
 
-        logger.info(f"Rakuten API: Getting orders: {order_numbers}")
-        
-        response = await self._request("POST", url, data=request_body)
-        
-        logger.info(f"Rakuten API: Get order response: {response}")
+        response = await self._request(
+            "POST", url, data=request_body, endpoint=ENDPOINT_GET_ORDER
+        )
 
         orders = []
         if "orderList" in response:
@@ -200,11 +646,12 @@ class RakutenAPIClient:
             elif isinstance(order_data, list):
                 orders = order_data
 
+        logger.info("Rakuten API: getOrder returned %d/%d orders", len(orders), len(order_numbers))
         return orders
 
     async def confirm_order(self, order_number: str) -> dict[str, Any]:
         """Confirm an order (status 100 -> 300)."""
-        url = urljoin(RAKUTEN_BASE_URL, "/es/2.0/order/confirmOrder")
+        url = urljoin(self.base_url, "/es/2.0/order/confirmOrder")
 
         request_body = {
             "orderNumber": order_number
@@ -213,7 +660,9 @@ class RakutenAPIClient:
         if self.shop_url:
             request_body["shopUrl"] = self.shop_url
 
-        return await self._request("POST", url, data=request_body)
+        return await self._request(
+            "POST", url, data=request_body, endpoint=ENDPOINT_CONFIRM_ORDER, idempotent=False
+        )
 
     async def set_inventory(
         self,
@@ -222,7 +671,7 @@ class RakutenAPIClient:
         inventory_type: str = "0",
     ) -> dict[str, Any]:
         """Update inventory using 在庫API 2.0."""
-        url = urljoin(RAKUTEN_BASE_URL, "/es/2.0/inventory/set")
+        url = urljoin(self.base_url, "/es/2.0/inventory/set")
 
         request_body = {
             "inventoryInfoList": {
@@ -237,7 +686,55 @@ class RakutenAPIClient:
         if self.shop_url:
             request_body["shopUrl"] = self.shop_url
 
-        return await self._request("POST", url, data=request_body)
+        return await self._request(
+            "POST", url, data=request_body, endpoint=ENDPOINT_INVENTORY_SET
+        )
+
+    async def bulk_upsert_inventory(self, inventories: list[dict[str, Any]]) -> dict[str, Any]:
+        """Set inventory for up to 400 variants using 在庫API 2.0 bulk-upsert.
+
+        Args:
+            inventories: [{"manageNumber", "variantId", "mode", "quantity"}, ...]
+
+        Returns:
+            Empty dict on success (204 No Content)
+
+        Raises:
+            RakutenAPIError: 请求失败；400 时 response 为 {"errors": [...]}，
+                metadata.propertyPath 形如 "inventories[3].quantity"
+        """
+        if len(inventories) > BULK_UPSERT_MAX_ITEMS:
+            raise ValueError(f"bulk-upsert accepts at most {BULK_UPSERT_MAX_ITEMS} inventories")
+
+        url = urljoin(self.base_url, "/es/2.0/inventories/bulk-upsert")
+        # DELTA 模式重复执行会重复加减库存
+        idempotent = all(item.get("mode", "ABSOLUTE") == "ABSOLUTE" for item in inventories)
+        return await self._request(
+            "POST",
+            url,
+            data={"inventories": inventories},
+            endpoint=ENDPOINT_BULK_UPSERT,
+            idempotent=idempotent,
+        )
+
+    async def bulk_get_inventory(self, keys: list[dict[str, str]]) -> list[dict[str, Any]]:
+        """Get inventory for up to 1000 variants using 在庫API 2.0 bulk-get.
+
+        Args:
+            keys: [{"manageNumber", "variantId"}, ...]
+
+        Returns:
+            [{"manageNumber", "variantId", "quantity", "created", "updated"}, ...]
+            （不存在的 SKU 不出现在结果中；manageNumber 由乐天转为小写）
+        """
+        if len(keys) > BULK_GET_MAX_ITEMS:
+            raise ValueError(f"bulk-get accepts at most {BULK_GET_MAX_ITEMS} inventories")
+
+        url = urljoin(self.base_url, "/es/2.0/inventories/bulk-get")
+        response = await self._request(
+            "POST", url, data={"inventories": keys}, endpoint=ENDPOINT_BULK_GET
+        )
+        return response.get("inventories", [])
 
     async def get_items(
         self,
@@ -245,7 +742,7 @@ class RakutenAPIClient:
         page: int = 1,
     ) -> dict[str, Any]:
         """Get store items using 楽天商品API."""
-        url = urljoin(RAKUTEN_BASE_URL, "/es/2.0/item/getItems")
+        url = urljoin(self.base_url, "/es/2.0/item/getItems")
 
         request_body = {
             "hits": limit,
@@ -255,11 +752,11 @@ class RakutenAPIClient:
         if self.shop_url:
             request_body["shopUrl"] = self.shop_url
 
-        logger.info(f"Rakuten API: Getting items with body: {request_body}")
-        
         try:
-            response = await self._request("POST", url, data=request_body)
-            logger.info(f"Rakuten API: Items response: {response}")
+            response = await self._request(
+                "POST", url, data=request_body, endpoint=ENDPOINT_ITEMS_SEARCH
+            )
+            logger.info("Rakuten API: getItems page %d returned %s", page, _payload_summary(response))
             return response
         except Exception as e:
             logger.error(f"Rakuten API get_items failed: {e}")
@@ -404,7 +901,7 @@ class RakutenAPIClient:
         Raises:
             RakutenAPIError: API 调用失败
         """
-        url = urljoin(RAKUTEN_BASE_URL, "/es/2.0/inventories/bulk-get/range")
+        url = urljoin(self.base_url, "/es/2.0/inventories/bulk-get/range")
         params = {
             "minQuantity": min_quantity,
             "maxQuantity": max_quantity,
@@ -413,11 +910,16 @@ class RakutenAPIClient:
         if self.shop_url:
             params["shopUrl"] = self.shop_url
 
-        logger.info(f"Rakuten API: Getting inventory range {min_quantity}-{max_quantity}")
-
         try:
-            response = await self._request("GET", url, params=params)
-            logger.info(f"Rakuten API: Inventory range response: {response}")
+            response = await self._request(
+                "GET", url, params=params, endpoint=ENDPOINT_BULK_GET_RANGE
+            )
+            logger.info(
+                "Rakuten API: inventory range %s-%s returned %s",
+                min_quantity,
+                max_quantity,
+                _payload_summary(response),
+            )
             return response
         except Exception as e:
             logger.error(f"Rakuten API get_inventory_range failed: {e}")
@@ -437,26 +939,121 @@ class RakutenAPIClient:
         Raises:
             RakutenAPIError: API 调用失败
         """
-        url = urljoin(RAKUTEN_BASE_URL, f"/es/2.0/items/manage-numbers/{manage_number}")
-
-        logger.info(f"Rakuten API: Getting item details for {manage_number}")
+        url = urljoin(self.base_url, f"/es/2.0/items/manage-numbers/{manage_number}")
 
         try:
-            response = await self._request("GET", url)
-            logger.info(f"Rakuten API: Item details response: {response}")
+            response = await self._request("GET", url, endpoint=ENDPOINT_ITEMS_GET)
+            logger.debug("Rakuten API: item details for %s returned %s", manage_number, _payload_summary(response))
             return response
         except Exception as e:
             logger.error(f"Rakuten API get_item_details failed: {e}")
             raise
 
 
-def get_rakuten_client(api_config: dict[str, str]) -> RakutenAPIClient:
-    """Create Rakuten API client from store config."""
+def _client_key(api_config: dict[str, str]) -> tuple[str, str, str | None]:
+    """店铺配置对应的 (serviceSecret, licenseKey, shopUrl)"""
     service_secret = api_config.get("serviceSecret", settings.RAKUTEN_DEFAULT_SERVICE_SECRET)
     license_key = api_config.get("licenseKey", settings.RAKUTEN_DEFAULT_LICENSE_KEY)
     shop_url = api_config.get("shopUrl", None)
 
     if not service_secret or not license_key:
         raise ValueError("Missing Rakuten API credentials")
+    return service_secret, license_key, shop_url
+
+
+class RakutenClientRegistry:
+    """按店铺凭证缓存 RakutenAPIClient，每个客户端持有一个长连接池
+
+    在应用 lifespan 中 open / close。未打开时 get 每次返回新的客户端，
+    请求使用一次性连接（脚本、测试）。凭证变更后调用 invalidate 移除旧客户端，
+    其连接池在进行中的请求结束后关闭。
+    """
+
+    def __init__(self):
+        self._clients: dict[tuple[str, str, str | None], RakutenAPIClient] = {}
+        self._open = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    def open(self) -> None:
+        self._open = True
+        if settings.RAKUTEN_HTTP2 and importlib.util.find_spec("h2") is None:
+            logger.warning("未安装 h2，乐天 API 连接池使用 HTTP/1.1（pip install 'httpx[http2]'）")
+
+    def get(self, api_config: dict[str, str]) -> RakutenAPIClient:
+        key = _client_key(api_config)
+        if not self._open:
+            return RakutenAPIClient(*key)
+
+        client = self._clients.get(key)
+        if client is None:
+            client = RakutenAPIClient(*key, http_client=self._build_http_client())
+            self._clients[key] = client
+        return client
+
+    @staticmethod
+    def _build_http_client() -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=30.0,
+            proxy=settings.RAKUTEN_PROXY or None,
+            http2=settings.RAKUTEN_HTTP2 and importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=settings.RAKUTEN_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.RAKUTEN_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.RAKUTEN_HTTP_KEEPALIVE_SECONDS,
+            ),
+        )
+
+    async def invalidate(self, api_config: dict[str, str] | None) -> bool:
+        """移除该店铺配置对应的客户端
+
+        相同凭证的店铺共用同一个客户端，正在运行的同步任务可能仍持有它：
+        不立即关闭连接池，而是 retire —— 进行中的请求正常完成，之后持有者的请求改用一次性连接。
+        """
+        try:
+            key = _client_key(api_config or {})
+        except ValueError:
+            return False
+        client = self._clients.pop(key, None)
+        if client is None:
+            return False
+        await client.retire()
+        return True
+
+    async def close(self) -> None:
+        """关闭所有连接池（应用关闭时调用）"""
+        self._open = False
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.http_client.aclose()
+
+
+rakuten_clients = RakutenClientRegistry()
 
-    return RakutenAPIClient(service_secret, license_key, shop_url)
+
+def get_rakuten_client(api_config: dict[str, str]) -> RakutenAPIClient:
+    """Get the Rakuten API client for a store config (shared while the registry is open)."""
+    return rakuten_clients.get(api_config)
+
+
+def circuit_open(api_config: dict[str, str] | None, circuit: str) -> bool:
+    """店铺该类接口是否处于熔断状态（调用方据此直接跳过店铺，不发送请求）"""
+    try:
+        service_secret, license_key, _ = _client_key(api_config or {})
+    except ValueError:
+        return False
+    return rakuten_circuits.is_open(shop_key(service_secret, license_key), circuit)
+
+
+def store_circuits(api_config: dict[str, str] | None) -> dict[str, dict[str, Any]]:
+    """店铺各类接口的熔断状态"""
+    try:
+        service_secret, license_key, _ = _client_key(api_config or {})
+    except ValueError:
+        return {}
+    return rakuten_circuits.snapshot(
+        shop_key(service_secret, license_key),
+        [CIRCUIT_ORDERS, CIRCUIT_INVENTORY, CIRCUIT_ITEMS],
+    )
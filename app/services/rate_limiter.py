@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import time
+from typing import Protocol
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketBackend(Protocol):
+    async def reserve(self, key: str, rate: float, burst: float) -> float:
+        """取走一个令牌，返回调用方还需等待的秒数（令牌不足时预约下一个）"""
+        ...
+
+    async def close(self) -> None:
+        ...
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> tuple[float, float]:
+    """按经过的时间补充令牌并取走一个，返回 (剩余令牌, 需等待秒数)
+
+    令牌可以为负：每个调用方预约一个发送时刻，排队的请求按 1/rate 的间隔依次发出，
+    吞吐稳定在上限而不是靠 429 试探。
+    """
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate) - 1
+    return tokens, (-tokens / rate if tokens < 0 else 0.0)
+
+
+class LocalTokenBucketBackend:
+    """进程内令牌桶（单 worker 部署）"""
+
+    def __init__(self):
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    async def reserve(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens, wait = _refill(tokens, updated, now, rate, burst)
+        self._buckets[key] = (tokens, now)
+        return wait
+
+    async def close(self) -> None:
+        self._buckets.clear()
+
+
+class SqliteTokenBucketBackend:
+    """SQLite 文件中的令牌桶，同一台机器上的多个 uvicorn worker 共享
+
+    每次预约在 BEGIN IMMEDIATE 事务中读改写一行，由 SQLite 文件锁保证跨进程原子性。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _reserve(self, key: str, rate: float, burst: float) -> float:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated FROM token_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens, wait = _refill(tokens, updated, now, rate, burst)
+            conn.execute(
+                "INSERT INTO token_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    async def reserve(self, key: str, rate: float, burst: float) -> float:
+        # 同一进程内串行使用连接，写锁等待放到线程中，不阻塞事件循环
+        async with self._lock:
+            return await asyncio.to_thread(self._reserve, key, rate, burst)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# KEYS[1] = 桶，ARGV = rate, burst；时间取 Redis 服务器时间，多台机器之间无需对时
+_REDIS_RESERVE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], 3600)
+if tokens < 0 then
+    return tostring(-tokens / rate)
+end
+return '0'
+"""
+
+
+class RedisTokenBucketBackend:
+    """Redis（或兼容服务）中的令牌桶，多台机器共享；用一个 Lua 脚本原子地预约"""
+
+    def __init__(self, url: str, prefix: str = "rakuten:ratelimit:"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(_REDIS_RESERVE_SCRIPT)
+        self.prefix = prefix
+
+    async def reserve(self, key: str, rate: float, burst: float) -> float:
+        return float(await self._script(keys=[self.prefix + key], args=[rate, burst]))
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class RateLimiter:
+    """按 (店铺凭证, 接口) 的令牌桶限速；每次 HTTP 请求（含重试）前调用 acquire"""
+
+    def __init__(
+        self,
+        limits: dict[str, float],
+        backend: TokenBucketBackend | None = None,
+        burst: float = 1.0,
+    ):
+        # 接口名 -> 每秒请求数；未列出的接口不限速
+        self.limits = limits
+        self.backend = backend or LocalTokenBucketBackend()
+        self.burst = burst
+
+    async def acquire(self, shop_key: str, endpoint: str) -> float:
+        """等待直到可以向该接口发送请求，返回等待的秒数"""
+        rate = self.limits.get(endpoint)
+        if not rate:
+            return 0.0
+        try:
+            wait = await self.backend.reserve(f"{shop_key}:{endpoint}", rate, self.burst)
+        except Exception as e:
+            # 共享存储不可用时不阻断请求，由服务端 429 与重试策略兜底
+            logger.warning(f"限速存储不可用，跳过限速: {e}")
+            return 0.0
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+def shop_key(service_secret: str, license_key: str) -> str:
+    """凭证的摘要（共享存储中不保存凭证本身）"""
+    return hashlib.sha256(f"{service_secret}:{license_key}".encode()).hexdigest()[:16]
+
+
+def create_rate_limiter(
+    limits: dict[str, float],
+    mode: str = settings.RAKUTEN_RATE_LIMIT_BACKEND,
+) -> RateLimiter | None:
+    """按 RAKUTEN_RATE_LIMIT_BACKEND 创建限速器：local / sqlite / redis / off"""
+    if mode == "off":
+        return None
+    if mode == "sqlite":
+        return RateLimiter(limits, SqliteTokenBucketBackend(settings.RAKUTEN_RATE_LIMIT_SQLITE_PATH))
+    if mode == "redis":
+        try:
+            return RateLimiter(limits, RedisTokenBucketBackend(settings.REDIS_URL))
+        except ImportError:
+            logger.warning("未安装 redis，乐天 API 限速改为进程内令牌桶")
+    return RateLimiter(limits)
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict, deque
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 幂等请求遇到这些状态码时重试（服务端临时故障）
+RETRYABLE_STATUS = {500, 502, 503, 504}
+
+# 请求一定没有到达服务端的网络错误，非幂等请求也可以安全重试
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class RetryPolicy:
+    """乐天 API 重试策略：指数退避 + full jitter，遵守 Retry-After，按接口限制重试预算
+
+    - 429：请求被拒绝、未执行，任何请求都可以重试
+    - 5xx / 网络错误：只重试幂等请求（读取、ABSOLUTE 模式写入）；confirmOrder 等非幂等
+      请求只在连接未建立时重试，避免重复执行
+    - 每个接口在 budget_window 秒内最多重试 budget 次，超出后直接失败，故障期间不放大流量
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        budget: int = 30,
+        budget_window: float = 60.0,
+        rng: Callable[[], float] = random.random,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.budget_window = budget_window
+        self.rng = rng
+        self.sleep = sleep
+        self._spent: dict[str, deque] = defaultdict(deque)
+
+    def retry_delay(
+        self,
+        endpoint: str,
+        attempt: int,
+        idempotent: bool = True,
+        status: int | None = None,
+        error: Exception | None = None,
+        retry_after: float | None = None,
+    ) -> float | None:
+        """返回第 attempt 次失败后应等待的秒数；不应重试时返回 None
+
+        Args:
+            endpoint: 接口名（重试预算按接口计）
+            attempt: 已重试次数（首次请求失败时为 0）
+            idempotent: 请求是否幂等
+            status: 响应状态码（网络错误时为 None）
+            error: 网络错误
+            retry_after: 响应 Retry-After 头给出的秒数
+        """
+        if attempt >= self.max_retries or not self._retryable(idempotent, status, error):
+            return None
+        if retry_after is not None and retry_after > self.max_delay:
+            # 服务端要求的等待超过上限，不在请求内等待
+            return None
+        if not self._take_budget(endpoint):
+            logger.warning(f"接口 {endpoint} 的重试预算已用完，不再重试")
+            return None
+
+        if retry_after is not None:
+            return retry_after
+        return self.rng() * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+    @staticmethod
+    def _retryable(idempotent: bool, status: int | None, error: Exception | None) -> bool:
+        if status == 429:
+            return True
+        if status is not None:
+            return idempotent and status in RETRYABLE_STATUS
+        if isinstance(error, _NOT_SENT_ERRORS):
+            return True
+        return idempotent and isinstance(error, httpx.TransportError)
+
+    def _take_budget(self, endpoint: str) -> bool:
+        spent = self._spent[endpoint]
+        now = time.monotonic()
+        while spent and now - spent[0] >= self.budget_window:
+            spent.popleft()
+        if len(spent) >= self.budget:
+            return False
+        spent.append(now)
+        return True
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """解析 Retry-After（秒数或 HTTP 日期）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+default_retry_policy = RetryPolicy(
+    max_retries=settings.RAKUTEN_RETRY_MAX,
+    base_delay=settings.RAKUTEN_RETRY_BASE_SECONDS,
+    max_delay=settings.RAKUTEN_RETRY_MAX_SECONDS,
+    budget=settings.RAKUTEN_RETRY_BUDGET_PER_MINUTE,
+)
@@ -0,0 +1,136 @@
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+# session.info 中待提交后失效的 SKU 的键
+_PENDING_INVALIDATIONS = "sku_cache_pending_invalidations"
+
+
+class SkuInfo(NamedTuple):
+    """SKU 主数据的只读视图（缓存用，不绑定会话）"""
+    sku_id: str
+    original_sku: str | None
+    aliases: dict[str, Any]
+    allow_oversell: bool
+    status: str
+
+
+class SkuCache:
+    """进程内 SKU 主数据缓存（LRU + TTL）
+
+    只缓存存在的 SKU；写入 sku_master 的路径负责调用 invalidate_after_commit。
+    多进程部署时各 worker 各自缓存，跨进程的一致性由 TTL 保证。
+
+    除 SkuInfo 外还可以附带整行的列值（columns），供 InventoryService.get_sku
+    在不查询数据库的情况下重建 ORM 对象。
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[
+            str, tuple[float, SkuInfo, dict[str, Any] | None]
+        ] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, sku_id: str) -> tuple[float, SkuInfo, dict[str, Any] | None] | None:
+        entry = self._entries.get(sku_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[sku_id]
+            return None
+        return entry
+
+    def get(self, sku_id: str) -> SkuInfo | None:
+        entry = self._lookup(sku_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(sku_id)
+        self.hits += 1
+        return entry[1]
+
+    def get_columns(self, sku_id: str) -> dict[str, Any] | None:
+        """整行列值的副本（JSON 列深拷贝，调用方可以随意修改）"""
+        entry = self._lookup(sku_id)
+        if entry is None or entry[2] is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(sku_id)
+        self.hits += 1
+        return copy.deepcopy(entry[2])
+
+    def put(self, info: SkuInfo, columns: dict[str, Any] | None = None) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[info.sku_id] = (
+            time.monotonic() + self.ttl_seconds,
+            info,
+            copy.deepcopy(columns) if columns is not None else None,
+        )
+        self._entries.move_to_end(info.sku_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, sku_id: str) -> None:
+        self._entries.pop(sku_id, None)
+
+    def invalidate_after_commit(self, session: AsyncSession, sku_id: str) -> None:
+        """写入 sku_master 后调用：立即失效，并在事务结束（提交或回滚）后再失效一次
+
+        只在提交前失效的话，并发读取者可能在提交前把旧行重新放回缓存；
+        本会话在事务内读到的未提交数据也不会在回滚后残留在缓存中。
+        """
+        self.invalidate(sku_id)
+        session.sync_session.info.setdefault(_PENDING_INVALIDATIONS, set()).add(
+            (self, sku_id)
+        )
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    for cache, sku_id in session.info.pop(_PENDING_INVALIDATIONS, ()):
+        cache.invalidate(sku_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _invalidate_rolled_back(session: Session, previous_transaction) -> None:
+    pending = session.info.get(_PENDING_INVALIDATIONS)
+    if not pending:
+        return
+    for cache, sku_id in pending:
+        cache.invalidate(sku_id)
+    if previous_transaction.parent is None:
+        # 外层事务结束；保存点回滚后外层事务仍可能提交其它写入，保留待失效项
+        session.info.pop(_PENDING_INVALIDATIONS, None)
+
+
+sku_cache = SkuCache(settings.SKU_CACHE_MAX_SIZE, settings.SKU_CACHE_TTL_SECONDS)
@@ -2,6 +2,7 @@ import csv
 import codecs
 import logging
 import os
+from collections import OrderedDict
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
@@ -11,8 +12,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.models import Store, StoreSku, SkuMaster
 from app.db.schemas import SourceEnumSchema
+from app.services.error_log import api_error_log
 from app.services.inventory import InventoryService
-from app.services.rakuten_api import get_rakuten_client, RakutenAPIError
+from app.services.rakuten_api import get_rakuten_client, RakutenAPIError, track_requests
+from app.services.sync_runs import SYNC_KIND_SKU, SyncRunService
+from app.services.sku_cache import sku_cache
 from app.utils.helpers import normalize_sku, utcnow
 
 logger = logging.getLogger(__name__)
@@ -24,6 +28,9 @@ MOCK_MODE = os.getenv("MOCK_MODE", "false").lower() in ("true", "1", "yes")
 # 库存范围查询的批次大小
 INVENTORY_BATCH_SIZE = 1000
 
+# 同步期间保留的最近商品详情数（LRU）；同一商品的 SKU 通常相邻处理，少量即可命中
+ITEM_DETAILS_MEMO_SIZE = 32
+
 # CSV 文件编码
 CSV_ENCODING = "shift_jis"
 
@@ -52,6 +59,9 @@ class SkuSyncService:
 
     def __init__(self, session: AsyncSession):
         self.session = session
+        # 最近获取的商品详情 {manageNumber: 响应}（最多 ITEM_DETAILS_MEMO_SIZE 个），
+        # 同一商品的多个 SKU 只请求一次 items.get，又不会把整个目录的响应留在内存中
+        self._item_details: OrderedDict[str, dict[str, Any]] = OrderedDict()
 
     async def sync_store_skus(self, store_id: str) -> dict[str, Any]:
         """从乐天同步店铺SKU"""
@@ -71,79 +81,83 @@ class SkuSyncService:
             logger.info(f"模拟模式：为店铺 {store_id} 生成模拟SKU数据")
             return await self._sync_with_mock_data(store_id)
 
+        started_at = utcnow()
+        run_service = SyncRunService(self.session)
+        self._item_details.clear()
+
         # 真实模式：使用乐天 API
         try:
             client = get_rakuten_client(store.api_config)
         except ValueError as e:
+            await run_service.record(store_id, SYNC_KIND_SKU, started_at, error=str(e))
             return {"error": str(e), "synced": 0}
 
         synced = 0
         errors = []
         processed_skus = set()  # 用于去重
 
-        # 使用库存范围 API 遍历获取所有 SKU
-        # 从 0 到 10000，分批查询
-        for min_q in range(0, 10001, INVENTORY_BATCH_SIZE):
-            max_q = min(min_q + INVENTORY_BATCH_SIZE - 1, 10000)
+        with track_requests() as metrics:
+            # 使用库存范围 API 遍历获取所有 SKU
+            # 从 0 到 10000，分批查询
+            for min_q in range(0, 10001, INVENTORY_BATCH_SIZE):
+                max_q = min(min_q + INVENTORY_BATCH_SIZE - 1, 10000)
 
-            logger.info(f"查询库存范围: {min_q}-{max_q}")
+                logger.info(f"查询库存范围: {min_q}-{max_q}")
 
-            try:
-                response = await client.get_inventory_range(min_q, max_q)
-            except RakutenAPIError as e:
-                error_msg = f"Failed to get inventory range {min_q}-{max_q}: {e}"
-                logger.error(error_msg)
-                # 记录 API 错误到事件表
-                inv_service = InventoryService(self.session)
-                await inv_service.log_api_error(
-                    error_message=str(e),
-                    store_id=store_id,
-                    operation="get_inventory_range",
-                    error_details={
-                        "min_quantity": min_q,
-                        "max_quantity": max_q,
-                        "error_code": e.code if hasattr(e, 'code') else None,
-                    }
-                )
-                await self.session.commit()
-                continue
+                try:
+                    response = await client.get_inventory_range(min_q, max_q)
+                except RakutenAPIError as e:
+                    error_msg = f"Failed to get inventory range {min_q}-{max_q}: {e}"
+                    logger.error(error_msg)
+                    # 记录 API 错误（批量写入错误日志，不占用当前事务）
+                    api_error_log.record(
+                        error_message=str(e),
+                        store_id=store_id,
+                        operation="get_inventory_range",
+                        error_details={
+                            "min_quantity": min_q,
+                            "max_quantity": max_q,
+                            "error_code": e.code if hasattr(e, 'code') else None,
+                        }
+                    )
+                    continue
 
-            inventories = response.get("inventories", [])
+                inventories = response.get("inventories", [])
 
-            if not inventories:
-                logger.info(f"库存范围 {min_q}-{max_q} 为空，继续下一个范围")
-                continue
+                if not inventories:
+                    logger.info(f"库存范围 {min_q}-{max_q} 为空，继续下一个范围")
+                    continue
 
-            for inv in inventories:
-                manage_number = inv.get("manageNumber", "")
-                variant_id = inv.get("variantId", "")
+                for inv in inventories:
+                    manage_number = inv.get("manageNumber", "")
+                    variant_id = inv.get("variantId", "")
 
-                if not manage_number:
-                    continue
+                    if not manage_number:
+                        continue
 
-                # SKU ID 使用 variantId（实际 SKU 编号）
-                # manageNumber 用作 original_sku
-                sku_id = normalize_sku(variant_id)
-                original_sku = variant_id
+                    # SKU ID 使用 variantId（实际 SKU 编号）
+                    # manageNumber 用作 original_sku
+                    sku_id = normalize_sku(variant_id)
+                    original_sku = variant_id
 
-                # 去重检查
-                if sku_id in processed_skus:
-                    continue
-                processed_skus.add(sku_id)
+                    # 去重检查
+                    if sku_id in processed_skus:
+                        continue
+                    processed_skus.add(sku_id)
 
-                try:
-                    # 获取商品详细信息
-                    success = await self._process_inventory(
-                        inv, store_id, sku_id, original_sku, client
-                    )
-                    if success:
-                        synced += 1
-                except Exception as e:
-                    errors.append({
-                        "sku_id": sku_id,
-                        "manage_number": manage_number,
-                        "error": str(e)
-                    })
+                    try:
+                        # 获取商品详细信息
+                        success = await self._process_inventory(
+                            inv, store_id, sku_id, original_sku, client
+                        )
+                        if success:
+                            synced += 1
+                    except Exception as e:
+                        errors.append({
+                            "sku_id": sku_id,
+                            "manage_number": manage_number,
+                            "error": str(e)
+                        })
 
         # 更新最后同步时间
         await self.session.execute(
@@ -153,6 +167,16 @@ class SkuSyncService:
         )
         await self.session.commit()
 
+        await run_service.record(
+            store_id,
+            SYNC_KIND_SKU,
+            started_at,
+            considered=len(processed_skus),
+            pushed=synced,
+            failed=len(errors),
+            http=metrics.summary(),
+        )
+
         logger.info(f"为店铺 {store_id} 同步了 {synced} 个 SKU，{len(errors)} 个错误")
 
         return {
@@ -185,8 +209,7 @@ class SkuSyncService:
         except RakutenAPIError as e:
             # API 调用失败，记录错误但继续处理下一个
             logger.warning(f"获取商品 {manage_number} 详情失败: {e}")
-            inv_service = InventoryService(self.session)
-            await inv_service.log_api_error(
+            api_error_log.record(
                 error_message=str(e),
                 store_id=store_id,
                 sku_id=sku_id,
@@ -196,7 +219,6 @@ class SkuSyncService:
                     "error_code": e.code if hasattr(e, 'code') else None,
                 }
             )
-            await self.session.commit()
             return False
 
         return False
@@ -210,7 +232,14 @@ class SkuSyncService:
     ) -> bool:
         """获取商品详情并处理"""
         try:
-            item_response = await client.get_item_details(manage_number)
+            item_response = self._item_details.get(manage_number)
+            if item_response is None:
+                item_response = await client.get_item_details(manage_number)
+                self._item_details[manage_number] = item_response
+                if len(self._item_details) > ITEM_DETAILS_MEMO_SIZE:
+                    self._item_details.popitem(last=False)
+            else:
+                self._item_details.move_to_end(manage_number)
 
             if not item_response:
                 return False
@@ -255,6 +284,7 @@ class SkuSyncService:
             sku.aliases = aliases
 
             await self.session.flush()
+            sku_cache.invalidate_after_commit(self.session, sku_id)
 
             # 检查是否已注册到店铺
             existing_store_sku = await self.session.execute(
@@ -279,8 +309,7 @@ class SkuSyncService:
         except RakutenAPIError as e:
             # API 调用失败
             logger.error(f"获取商品 {manage_number} 详情失败: {e}")
-            inv_service = InventoryService(self.session)
-            await inv_service.log_api_error(
+            api_error_log.record(
                 error_message=str(e),
                 store_id=store_id,
                 sku_id=sku_id,
@@ -290,7 +319,6 @@ class SkuSyncService:
                     "error_code": e.code if hasattr(e, 'code') else None,
                 }
             )
-            await self.session.commit()
             return False
 
     async def _sync_with_mock_data(self, store_id: str) -> dict[str, Any]:
@@ -365,6 +393,7 @@ class SkuSyncService:
             if sku.extra_data.get("item_name") != item_name:
                 metadata["previous_item_name"] = sku.extra_data.get("item_name")
             sku.extra_data = {**sku.extra_data, **metadata}
+            sku_cache.invalidate_after_commit(self.session, sku_id)
         else:
             sku = SkuMaster(
                 sku_id=sku_id,
@@ -627,6 +656,7 @@ class SkuSyncService:
         sku.aliases = aliases
 
         await self.session.flush()
+        sku_cache.invalidate_after_commit(self.session, sku_id_normalized)
 
         # 检查是否已注册到店铺
         existing_store_sku = await self.session.execute(
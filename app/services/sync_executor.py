@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable
+from typing import Any, TypeVar
+
+from app.utils.helpers import percentile
+
+logger = logging.getLogger(__name__)
+
+Job = TypeVar("Job")
+Outcome = TypeVar("Outcome")
+
+
+class SyncExecutor:
+    """有界并发的同步执行器
+
+    - 固定数量的 worker 从队列中取任务并发执行 HTTP 调用（调用中不得使用数据库会话）
+    - 所有结果在调用 run 的协程中按完成顺序依次写回，AsyncSession 只在该协程中使用
+    - min_interval > 0 时，各 worker 发起请求的间隔不小于该值（接口限速）
+
+    call 抛出的异常不会中断执行，而是作为结果交给 write；write 抛出异常时取消剩余任务并向上抛出。
+    """
+
+    def __init__(self, workers: int = 4, min_interval: float = 0.0):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.workers = workers
+        self.min_interval = min_interval
+        self._pace_lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def pace(self) -> None:
+        """等待直到可以发起下一次请求；任务内部的重试也应先调用"""
+        if self.min_interval <= 0:
+            return
+        async with self._pace_lock:
+            wait = self._next_start - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_start = time.monotonic() + self.min_interval
+
+    async def run(
+        self,
+        jobs: Iterable[Job] | AsyncIterable[Job],
+        call: Callable[[Job], Awaitable[Outcome]],
+        write: Callable[[Job, Outcome | Exception], Awaitable[None]],
+    ) -> dict[str, Any]:
+        """执行所有任务，返回本次运行的吞吐与延迟统计
+
+        任务按需从 jobs 中读取，同时在途的任务不超过 2 * workers 个。读取 jobs 与调用
+        write 在同一个协程中交替进行，因此 jobs 可以是使用同一数据库会话的异步生成器。
+        """
+        job_iter = aiter(jobs) if isinstance(jobs, AsyncIterable) else _aiter_sync(jobs)
+        pending: asyncio.Queue = asyncio.Queue()
+        results: asyncio.Queue = asyncio.Queue()
+        latencies: list[float] = []
+        total = 0
+        failed = 0
+        in_flight = 0
+        exhausted = False
+        started = time.monotonic()
+
+        async def worker() -> None:
+            while True:
+                job = await pending.get()
+                await self.pace()
+                call_started = time.monotonic()
+                try:
+                    outcome = await call(job)
+                except Exception as e:
+                    outcome = e
+                latencies.append(time.monotonic() - call_started)
+                await results.put((job, outcome))
+
+        worker_tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            while True:
+                while not exhausted and in_flight < 2 * self.workers:
+                    try:
+                        job = await anext(job_iter)
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    pending.put_nowait(job)
+                    total += 1
+                    in_flight += 1
+                if exhausted and not in_flight:
+                    break
+
+                job, outcome = await results.get()
+                in_flight -= 1
+                if isinstance(outcome, Exception):
+                    failed += 1
+                await write(job, outcome)
+        finally:
+            for task in worker_tasks:
+                task.cancel()
+            await asyncio.gather(*worker_tasks, return_exceptions=True)
+
+        elapsed = time.monotonic() - started
+        latencies.sort()
+        stats = {
+            "jobs": total,
+            "failed": failed,
+            "workers": min(self.workers, total),
+            "elapsed_seconds": round(elapsed, 3),
+            "jobs_per_second": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_ms": {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+                "p50": round(percentile(latencies, 50) * 1000, 1),
+                "p95": round(percentile(latencies, 95) * 1000, 1),
+                "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+            },
+        }
+        logger.info(
+            f"同步执行完成: {total} 个任务, {failed} 个失败, "
+            f"{stats['elapsed_seconds']}s, p95 {stats['latency_ms']['p95']}ms"
+        )
+        return stats
+
+
+async def _aiter_sync(jobs: Iterable[Job]) -> AsyncIterator[Job]:
+    for job in jobs:
+        yield job
@@ -0,0 +1,94 @@
+import logging
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import SyncRun
+from app.utils.helpers import ensure_utc, utcnow
+
+logger = logging.getLogger(__name__)
+
+# 同步运行类型
+SYNC_KIND_INVENTORY = "inventory"
+SYNC_KIND_SKU = "sku"
+
+
+class SyncRunService:
+    """店铺同步运行记录"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def record(
+        self,
+        store_id: str,
+        kind: str,
+        started_at: datetime,
+        considered: int = 0,
+        pushed: int = 0,
+        failed: int = 0,
+        http: dict[str, Any] | None = None,
+        mode: str | None = None,
+        error: str | None = None,
+    ) -> SyncRun:
+        """写入一次同步运行的统计并提交
+
+        Args:
+            store_id: 店铺 ID
+            kind: SYNC_KIND_INVENTORY / SYNC_KIND_SKU
+            started_at: 开始时间
+            considered: 参与比较的 SKU 数
+            pushed: 成功推送（或写入）的 SKU 数
+            failed: 失败的 SKU 数
+            http: RequestMetrics.summary() 的结果
+            mode: 运行模式（full / incremental / verify / queued）
+            error: 整体失败时的错误信息
+        """
+        http = http or {}
+        finished_at = utcnow()
+        run = SyncRun(
+            store_id=store_id,
+            kind=kind,
+            mode=mode,
+            status="failed" if error else ("partial" if failed else "success"),
+            started_at=started_at,
+            finished_at=finished_at,
+            duration_ms=int((finished_at - ensure_utc(started_at)).total_seconds() * 1000),
+            skus_considered=considered,
+            skus_pushed=pushed,
+            skus_failed=failed,
+            http_calls=http.get("http_calls", 0),
+            retries=http.get("retries", 0),
+            rate_limited=http.get("rate_limited", 0),
+            latency_p50_ms=http.get("latency_p50_ms"),
+            latency_p95_ms=http.get("latency_p95_ms"),
+            error=error,
+        )
+        self.session.add(run)
+        await self.session.commit()
+
+        logger.info(
+            f"店铺 {store_id} {kind} 同步: {run.duration_ms}ms, {considered} 个 SKU, "
+            f"{run.http_calls} 次调用, {run.rate_limited} 次 429"
+        )
+        return run
+
+    async def get_runs(
+        self,
+        store_id: str,
+        kind: str | None = None,
+        limit: int = 50,
+    ) -> list[SyncRun]:
+        """按开始时间倒序列出店铺的同步运行记录"""
+        query = (
+            select(SyncRun)
+            .where(SyncRun.store_id == store_id)
+            .order_by(SyncRun.started_at.desc())
+            .limit(limit)
+        )
+        if kind:
+            query = query.where(SyncRun.kind == kind)
+        result = await self.session.execute(query)
+        return list(result.scalars().all())
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import InventorySnapshot
+from app.utils.helpers import normalize_sku
+
+logger = logging.getLogger(__name__)
+
+# 写入通道的数据库锁模式
+LOCK_MODE_LOCAL = "local"  # 仅进程内 asyncio 锁
+LOCK_MODE_ADVISORY = "advisory"  # 额外加 PostgreSQL 事务级 advisory lock
+LOCK_MODE_ROW = "row"  # 额外对 inventory_snapshots 行加 SELECT ... FOR UPDATE
+
+
+class SkuWriteLanes:
+    """按 SKU 串行化库存写入的通道
+
+    同一 SKU 的写入按到达顺序排队，不同 SKU 互不影响。多个 SKU 一次性按排序后的
+    顺序加锁，避免死锁。调用方应在 ``acquire`` 的上下文内完成提交：进程内锁在
+    退出上下文时释放，数据库锁（advisory / row）随事务结束释放。
+
+    SQLite 本身在数据库级别串行化写事务，因此数据库锁模式只在 PostgreSQL 上生效。
+    """
+
+    def __init__(self, mode: str = LOCK_MODE_LOCAL):
+        self.mode = mode
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._users: dict[str, int] = {}
+
+    @asynccontextmanager
+    async def acquire(
+        self,
+        session: AsyncSession,
+        sku_ids: Iterable[str],
+    ) -> AsyncIterator[list[str]]:
+        """获取一组 SKU 的写入通道，返回排序后的 SKU 列表"""
+        keys = sorted({normalize_sku(sku_id) for sku_id in sku_ids if sku_id})
+        for key in keys:
+            if key not in self._locks:
+                self._locks[key] = asyncio.Lock()
+                self._users[key] = 0
+            self._users[key] += 1
+
+        acquired: list[str] = []
+        try:
+            for key in keys:
+                await self._locks[key].acquire()
+                acquired.append(key)
+            await self._acquire_db_locks(session, keys)
+            yield keys
+        finally:
+            for key in reversed(acquired):
+                self._locks[key].release()
+            for key in keys:
+                self._users[key] -= 1
+                if not self._users[key]:
+                    # 无人使用的锁及时回收，避免锁表随 SKU 数量无限增长
+                    del self._users[key]
+                    del self._locks[key]
+
+    async def _acquire_db_locks(self, session: AsyncSession, keys: list[str]) -> None:
+        if not keys or self.mode == LOCK_MODE_LOCAL:
+            return
+        if session.bind.dialect.name != "postgresql":
+            return
+
+        if self.mode == LOCK_MODE_ADVISORY:
+            for key in keys:
+                await session.execute(
+                    text("SELECT pg_advisory_xact_lock(hashtext(:lock_key))"),
+                    {"lock_key": f"sku:{key}"},
+                )
+        elif self.mode == LOCK_MODE_ROW:
+            await session.execute(
+                select(InventorySnapshot.sku_id)
+                .where(InventorySnapshot.sku_id.in_(keys))
+                .order_by(InventorySnapshot.sku_id)
+                .with_for_update()
+            )
+
+    def active_lanes(self) -> int:
+        """当前持有或等待中的 SKU 通道数"""
+        return len(self._locks)
+
+
+sku_write_lanes = SkuWriteLanes(settings.SKU_WRITE_LOCK_MODE)
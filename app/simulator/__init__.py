@@ -0,0 +1,3 @@
+from app.simulator.rakuten import RakutenSimulator, SimulatorSettings, create_app
+
+__all__ = ["RakutenSimulator", "SimulatorSettings", "create_app"]
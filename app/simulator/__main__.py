@@ -0,0 +1,8 @@
+"""启动乐天 RMS 模拟器：python -m app.simulator"""
+import uvicorn
+
+from app.simulator.rakuten import RakutenSimulator, SimulatorSettings, create_app
+
+if __name__ == "__main__":
+    config = SimulatorSettings()
+    uvicorn.run(create_app(RakutenSimulator(config)), host=config.host, port=config.port)
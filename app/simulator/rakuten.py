@@ -0,0 +1,459 @@
+"""乐天 RMS API 本地模拟器
+
+实现 RakutenAPIClient 用到的接口（searchOrder / getOrder / confirmOrder、
+inventories bulk-upsert / bulk-get / bulk-get range、items.get / getItems），
+用于离线压测与集成测试。商品目录和订单流由 seed 确定性生成；延迟、各接口每秒
+请求上限（超出返回 429）和错误注入均可配置。
+
+启动：python -m app.simulator，然后设置 RAKUTEN_API_BASE_URL=http://127.0.0.1:9000
+测试中可直接使用 httpx.ASGITransport(app=create_app(RakutenSimulator(...)))。
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+logger = logging.getLogger(__name__)
+
+JST = timezone(timedelta(hours=9))
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S+0900"
+
+# 接口名（与乐天文档的功能名一致），用于限速、错误注入和统计
+SEARCH_ORDER = "searchOrder"
+GET_ORDER = "getOrder"
+CONFIRM_ORDER = "confirmOrder"
+BULK_UPSERT = "inventories.bulk.upsert"
+BULK_GET = "inventories.bulk.get"
+BULK_GET_RANGE = "inventories.bulk.get.range"
+ITEMS_GET = "items.get"
+ITEMS_SEARCH = "items.search"
+
+BULK_UPSERT_MAX_ITEMS = 400
+BULK_GET_MAX_ITEMS = 1000
+GET_ORDER_MAX_ITEMS = 100
+MAX_QUANTITY = 99999
+
+
+class SimulatorSettings(BaseSettings):
+    """模拟器配置（环境变量前缀 RAKUTEN_SIM_，dict 类型使用 JSON）"""
+
+    model_config = SettingsConfigDict(env_prefix="RAKUTEN_SIM_", extra="ignore")
+
+    seed: int = Field(default=42)
+    host: str = Field(default="127.0.0.1")
+    port: int = Field(default=9000)
+
+    # 商品目录：items 个商品 × variants_per_item 个 SKU，初始库存 0..initial_quantity_max
+    items: int = Field(default=100)
+    variants_per_item: int = Field(default=5)
+    initial_quantity_max: int = Field(default=50)
+
+    # 订单流：启动前已有 order_backlog 个订单，之后每分钟 orders_per_minute 个
+    order_backlog: int = Field(default=0)
+    orders_per_minute: float = Field(default=0.0)
+    max_lines_per_order: int = Field(default=3)
+
+    # 每次请求的响应延迟（毫秒），实际延迟为 latency_ms ± latency_jitter_ms
+    latency_ms: float = Field(default=0.0)
+    latency_jitter_ms: float = Field(default=0.0)
+
+    # 各接口每秒请求上限（按 Authorization 即店铺计），0 或未列出表示不限
+    rate_limits: dict[str, float] = Field(default_factory=lambda: {
+        BULK_UPSERT: 1,
+        BULK_GET: 5,
+        BULK_GET_RANGE: 5,
+    })
+
+    # 错误注入：各接口按概率返回 error_status
+    error_rates: dict[str, float] = Field(default_factory=dict)
+    error_status: int = Field(default=500)
+
+    # True 时 bulk-upsert 中不存在的 SKU 返回 400 GE0014（正式接口不报错，只保留孤立库存）
+    strict_variants: bool = Field(default=False)
+
+
+class SimulatedError(Exception):
+    def __init__(self, status: int, code: str, message: str, property_path: str | None = None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+        self.property_path = property_path
+
+    def body(self) -> dict[str, Any]:
+        error: dict[str, Any] = {"code": self.code, "message": self.message}
+        if self.property_path:
+            error["metadata"] = {"propertyPath": self.property_path}
+        return {"errors": [error]}
+
+
+class RakutenSimulator:
+    """模拟器状态：商品目录、库存、订单、限速窗口与调用统计
+
+    所有状态变更都不跨越 await，因此在单个事件循环中无需加锁。
+    """
+
+    def __init__(self, config: SimulatorSettings | None = None):
+        self.config = config or SimulatorSettings()
+        self._latency_rng = random.Random(self.config.seed)
+        self._error_rng = random.Random(self.config.seed + 1)
+        # manageNumber -> 商品；(manageNumber, variantId) -> {"quantity", "created", "updated"}
+        self.items: dict[str, dict[str, Any]] = {}
+        self.inventory: dict[tuple[str, str], dict[str, Any]] = {}
+        self.orders: dict[str, dict[str, Any]] = {}
+        self._order_times: list[tuple[datetime, str]] = []
+        self._windows: dict[tuple[str, str], deque] = defaultdict(deque)
+        self.calls: dict[str, int] = defaultdict(int)
+        self.rate_limited: dict[str, int] = defaultdict(int)
+        self.injected_errors: dict[str, int] = defaultdict(int)
+
+        self._build_catalog()
+        self.started_at = datetime.now(timezone.utc)
+        self._generated = 0
+        self._injected = 0
+        for _ in range(self.config.order_backlog):
+            self._generate_order(self.started_at - timedelta(seconds=1))
+
+    # ===== 商品目录与订单流 =====
+
+    def _build_catalog(self) -> None:
+        rng = random.Random(self.config.seed)
+        now = _format(datetime.now(timezone.utc))
+        for i in range(self.config.items):
+            manage_number = f"item-{i:05d}"
+            variants = {}
+            for j in range(self.config.variants_per_item):
+                variant_id = f"SKU-{i:05d}-{j:02d}"
+                variants[variant_id] = {
+                    "selectorValues": {"key1": f"V{j}"},
+                    "standardPrice": str(rng.randrange(500, 20000, 10)),
+                }
+                self.inventory[(manage_number, variant_id)] = {
+                    "quantity": rng.randint(0, self.config.initial_quantity_max),
+                    "created": now,
+                    "updated": now,
+                }
+            self.items[manage_number] = {
+                "manageNumber": manage_number,
+                "itemNumber": manage_number.upper(),
+                "title": f"模拟商品 {i}",
+                "itemType": "NORMAL",
+                "variants": variants,
+            }
+
+    def _generate_order(self, ordered_at: datetime) -> dict[str, Any]:
+        """按序号确定性生成一个新订单（状态 100），并扣减平台库存"""
+        seq = self._generated
+        self._generated += 1
+        rng = random.Random(self.config.seed * 1_000_003 + seq)
+        keys = list(self.inventory)
+        lines = []
+        for key in rng.sample(keys, min(len(keys), rng.randint(1, self.config.max_lines_per_order))):
+            manage_number, variant_id = key
+            quantity = rng.randint(1, 3)
+            stock = self.inventory[key]
+            stock["quantity"] = max(0, stock["quantity"] - quantity)
+            stock["updated"] = _format(ordered_at)
+            lines.append({
+                "itemManagementNumber": manage_number,
+                "manageNumber": manage_number,
+                "skuNumber": variant_id,
+                "itemName": self.items[manage_number]["title"],
+                "quantity": quantity,
+            })
+
+        order_number = f"400000-{ordered_at.astimezone(JST):%Y%m%d}-{seq:010d}"
+        order = {
+            "orderNumber": order_number,
+            "orderProgress": 100,
+            "orderStatus": "100",
+            "orderDatetime": _format(ordered_at),
+            "orderItemList": {"orderItem": lines},
+        }
+        self.orders[order_number] = order
+        self._order_times.append((ordered_at, order_number))
+        return order
+
+    def advance(self, now: datetime | None = None) -> None:
+        """生成到 now 为止应到达的订单（按 orders_per_minute 匀速到达）"""
+        rate = self.config.orders_per_minute
+        if rate <= 0:
+            return
+        now = now or datetime.now(timezone.utc)
+        interval = 60.0 / rate
+        due = int((now - self.started_at).total_seconds() / interval)
+        streamed = self._generated - self.config.order_backlog - self._injected
+        for n in range(streamed, due):
+            self._generate_order(self.started_at + timedelta(seconds=(n + 1) * interval))
+
+    def add_orders(self, count: int) -> list[str]:
+        """立即生成 count 个新订单（不占用订单流的序号节奏）"""
+        now = datetime.now(timezone.utc)
+        self._injected += count
+        return [self._generate_order(now)["orderNumber"] for _ in range(count)]
+
+    # ===== 请求准入 =====
+
+    async def admit(self, endpoint: str, request: Request) -> None:
+        """认证、限速、延迟与错误注入；不通过时抛出 SimulatedError"""
+        self.calls[endpoint] += 1
+        authorization = request.headers.get("authorization", "")
+        if not authorization.startswith("ESA "):
+            raise SimulatedError(401, "GE0011", "Un-Authorised")
+
+        limit = self.config.rate_limits.get(endpoint, 0)
+        if limit > 0:
+            window = self._windows[(endpoint, authorization)]
+            now = time.monotonic()
+            while window and now - window[0] >= 1.0:
+                window.popleft()
+            if len(window) >= limit:
+                self.rate_limited[endpoint] += 1
+                raise SimulatedError(429, "GE0010", "Too Many Requests")
+            window.append(now)
+
+        delay = self.config.latency_ms
+        if self.config.latency_jitter_ms:
+            delay += self._latency_rng.uniform(
+                -self.config.latency_jitter_ms, self.config.latency_jitter_ms
+            )
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        rate = self.config.error_rates.get(endpoint, 0)
+        if rate > 0 and self._error_rng.random() < rate:
+            self.injected_errors[endpoint] += 1
+            raise SimulatedError(self.config.error_status, "GE0001", "Injected error")
+
+    # ===== 接口实现 =====
+
+    def search_order(self, body: dict[str, Any]) -> dict[str, Any]:
+        self.advance()
+        start = _parse(body.get("startDatetime"))
+        end = _parse(body.get("endDatetime"))
+        if start is None or end is None or start > end:
+            raise SimulatedError(400, "ORDER_EXT_API_SEARCH_ORDER_ERROR_001", "Invalid datetime range")
+        statuses = set(body.get("orderProgressList") or [])
+
+        matched = [
+            number for ordered_at, number in sorted(self._order_times)
+            if start <= ordered_at <= end
+            and (not statuses or self.orders[number]["orderProgress"] in statuses)
+        ]
+        pagination = body.get("PaginationRequestModel") or {}
+        per_page = max(1, min(int(pagination.get("requestRecordsAmount", 30)), 1000))
+        page = max(1, int(pagination.get("requestPage", 1)))
+        total_pages = (len(matched) + per_page - 1) // per_page
+        return {
+            "orderNumberList": matched[(page - 1) * per_page:page * per_page],
+            "PaginationResponseModel": {
+                "totalRecordsAmount": len(matched),
+                "totalPages": total_pages,
+                "requestPage": page,
+            },
+        }
+
+    def get_order(self, body: dict[str, Any]) -> dict[str, Any]:
+        numbers = body.get("orderNumberList") or []
+        if len(numbers) > GET_ORDER_MAX_ITEMS:
+            raise SimulatedError(
+                400, "ORDER_EXT_API_GET_ORDER_ERROR_002",
+                f"orderNumberList accepts at most {GET_ORDER_MAX_ITEMS} orders",
+            )
+        return {"orderList": [self.orders[n] for n in numbers if n in self.orders]}
+
+    def confirm_order(self, body: dict[str, Any]) -> dict[str, Any]:
+        numbers = body.get("orderNumberList") or [body.get("orderNumber")]
+        for number in numbers:
+            order = self.orders.get(number)
+            if order is None:
+                raise SimulatedError(400, "ORDER_EXT_API_CONFIRM_ORDER_ERROR_001", f"Order not found: {number}")
+            if order["orderProgress"] == 100:
+                order["orderProgress"] = 300
+                order["orderStatus"] = "300"
+        return {}
+
+    def bulk_upsert(self, body: dict[str, Any]) -> None:
+        inventories = body.get("inventories") or []
+        if len(inventories) > BULK_UPSERT_MAX_ITEMS:
+            raise SimulatedError(
+                400, "IE0001", f"inventories accepts at most {BULK_UPSERT_MAX_ITEMS} items",
+                "inventories",
+            )
+        # 先整体校验，任一条目出错则整批不更新（与正式接口一致）
+        for i, entry in enumerate(inventories):
+            key = (str(entry.get("manageNumber", "")).lower(), str(entry.get("variantId", "")))
+            quantity = entry.get("quantity")
+            if not isinstance(quantity, int) or not 0 <= quantity <= MAX_QUANTITY:
+                raise SimulatedError(
+                    400, "IE0003", f"quantity must be between 0 and {MAX_QUANTITY}.",
+                    f"inventories[{i}].quantity",
+                )
+            if self.config.strict_variants and key not in self.inventory:
+                raise SimulatedError(
+                    400, "GE0014",
+                    f"Not found for inputs; manageNumber={key[0]}, variantId={key[1]}",
+                    f"inventories[{i}].variantId",
+                )
+
+        now = _format(datetime.now(timezone.utc))
+        for entry in inventories:
+            key = (str(entry["manageNumber"]).lower(), str(entry["variantId"]))
+            stock = self.inventory.setdefault(key, {"quantity": 0, "created": now})
+            if entry.get("mode", "ABSOLUTE") == "DELTA":
+                stock["quantity"] = max(0, min(MAX_QUANTITY, stock["quantity"] + entry["quantity"]))
+            else:
+                stock["quantity"] = entry["quantity"]
+            stock["updated"] = now
+
+    def bulk_get(self, body: dict[str, Any]) -> dict[str, Any]:
+        keys = body.get("inventories") or []
+        if len(keys) > BULK_GET_MAX_ITEMS:
+            raise SimulatedError(
+                400, "IE0001", f"inventories accepts at most {BULK_GET_MAX_ITEMS} items",
+                "inventories",
+            )
+        found = []
+        for entry in keys:
+            key = (str(entry.get("manageNumber", "")).lower(), str(entry.get("variantId", "")))
+            if key in self.inventory:
+                found.append(_inventory_row(key, self.inventory[key]))
+        return {"inventories": found}
+
+    def bulk_get_range(self, min_quantity: int | None, max_quantity: int | None) -> dict[str, Any]:
+        if min_quantity is None and max_quantity is None:
+            raise SimulatedError(400, "IE0004", "minQuantity or maxQuantity is required.")
+        low = 0 if min_quantity is None else min_quantity
+        high = MAX_QUANTITY if max_quantity is None else max_quantity
+        rows = [
+            _inventory_row(key, stock) for key, stock in self.inventory.items()
+            if low <= stock["quantity"] <= high
+        ]
+        if len(rows) > BULK_GET_MAX_ITEMS:
+            raise SimulatedError(400, "IE0005", f"Result exceeds {BULK_GET_MAX_ITEMS} inventories.")
+        return {"inventories": rows}
+
+    def get_item(self, manage_number: str) -> dict[str, Any]:
+        item = self.items.get(manage_number.lower())
+        if item is None:
+            raise SimulatedError(404, "GE0014", f"No item found for inputs; manageNumber={manage_number}")
+        return item
+
+    def search_items(self, body: dict[str, Any]) -> dict[str, Any]:
+        hits = max(1, int(body.get("hits", 100)))
+        page = max(1, int(body.get("page", 1)))
+        items = list(self.items.values())
+        return {"numFound": len(items), "items": items[(page - 1) * hits:page * hits]}
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "items": len(self.items),
+            "variants": len(self.inventory),
+            "orders": len(self.orders),
+            "calls": dict(self.calls),
+            "rate_limited": dict(self.rate_limited),
+            "injected_errors": dict(self.injected_errors),
+        }
+
+
+def create_app(simulator: RakutenSimulator | None = None) -> FastAPI:
+    """创建模拟器 ASGI 应用；路径与 RakutenAPIClient 使用的一致"""
+    sim = simulator or RakutenSimulator()
+    app = FastAPI(title="Rakuten RMS Simulator")
+    app.state.simulator = sim
+
+    @app.exception_handler(SimulatedError)
+    async def simulated_error_handler(request: Request, exc: SimulatedError):
+        return JSONResponse(status_code=exc.status, content=exc.body())
+
+    @app.post("/es/2.0/order/searchOrder/")
+    async def search_order(request: Request):
+        await sim.admit(SEARCH_ORDER, request)
+        return sim.search_order(await request.json())
+
+    @app.post("/es/2.0/order/getOrder")
+    async def get_order(request: Request):
+        await sim.admit(GET_ORDER, request)
+        return sim.get_order(await request.json())
+
+    @app.post("/es/2.0/order/confirmOrder")
+    async def confirm_order(request: Request):
+        await sim.admit(CONFIRM_ORDER, request)
+        return sim.confirm_order(await request.json())
+
+    @app.post("/es/2.0/inventories/bulk-upsert")
+    async def bulk_upsert(request: Request):
+        await sim.admit(BULK_UPSERT, request)
+        sim.bulk_upsert(await request.json())
+        return Response(status_code=204)
+
+    @app.post("/es/2.0/inventories/bulk-get")
+    async def bulk_get(request: Request):
+        await sim.admit(BULK_GET, request)
+        return sim.bulk_get(await request.json())
+
+    @app.get("/es/2.0/inventories/bulk-get/range")
+    async def bulk_get_range(
+        request: Request,
+        minQuantity: int | None = None,
+        maxQuantity: int | None = None,
+    ):
+        await sim.admit(BULK_GET_RANGE, request)
+        return sim.bulk_get_range(minQuantity, maxQuantity)
+
+    @app.get("/es/2.0/items/manage-numbers/{manage_number}")
+    async def get_item(manage_number: str, request: Request):
+        await sim.admit(ITEMS_GET, request)
+        return sim.get_item(manage_number)
+
+    @app.post("/es/2.0/item/getItems")
+    async def search_items(request: Request):
+        await sim.admit(ITEMS_SEARCH, request)
+        return sim.search_items(await request.json())
+
+    # ===== 管理接口（不受限速和错误注入影响） =====
+
+    @app.get("/_sim/stats")
+    async def stats():
+        return sim.stats()
+
+    @app.post("/_sim/orders")
+    async def add_orders(count: int = 1):
+        return {"orderNumberList": sim.add_orders(count)}
+
+    return app
+
+
+def _format(value: datetime) -> str:
+    return value.astimezone(JST).strftime(DATETIME_FORMAT)
+
+
+def _parse(value: str | None) -> datetime | None:
+    """解析乐天日期时间；不带时区时按日本时间处理"""
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%dT%H:%M:%S%z", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=JST)
+    return None
+
+
+def _inventory_row(key: tuple[str, str], stock: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "manageNumber": key[0],
+        "variantId": key[1],
+        "quantity": stock["quantity"],
+        "created": stock["created"],
+        "updated": stock["updated"],
+    }
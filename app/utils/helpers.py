@@ -1,3 +1,4 @@
+import base64
 import hashlib
 import secrets
 import uuid
@@ -41,6 +42,13 @@ def parse_rakuten_datetime(date_str: str | None) -> datetime | None:
         return None
 
 
+def ensure_utc(dt: datetime) -> datetime:
+    """Convert to UTC; naive datetimes (e.g. read back from SQLite) are treated as UTC."""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
 def format_datetime(dt: datetime | None) -> str | None:
     """Format datetime to ISO string."""
     if dt is None:
@@ -48,3 +56,31 @@ def format_datetime(dt: datetime | None) -> str | None:
     if dt.tzinfo is None:
         dt = dt.replace(tzinfo=timezone.utc)
     return dt.isoformat()
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """已排序数值的百分位（最近秩），空列表返回 0"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def encode_event_cursor(created_at: datetime, event_id: uuid.UUID) -> str:
+    """Encode an opaque keyset pagination cursor from (created_at, event_id)."""
+    raw = f"{created_at.isoformat()}|{event_id.hex}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_event_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """Decode a cursor produced by encode_event_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, event_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(event_id)
+    except (ValueError, UnicodeDecodeError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
@@ -0,0 +1,37 @@
+"""JSON 编解码：安装了 orjson 时使用 orjson，否则使用标准库 json
+
+乐天 API 的请求/响应体和 JSONType 列都经过这里；orjson 比标准库快数倍，
+大批量 bulk-get / getOrder 响应的解析不再占用事件循环太久。
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 取决于部署环境
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps_bytes(value: Any) -> bytes:
+    """序列化为 UTF-8 字节（HTTP 请求体）"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # 超出 64 位的整数等 orjson 不支持的值，交给标准库
+            pass
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(value: Any) -> str:
+    """序列化为字符串（数据库 TEXT 列、日志）"""
+    return dumps_bytes(value).decode("utf-8")
+
+
+def loads(data: str | bytes | bytearray) -> Any:
+    """反序列化 JSON 字符串或字节"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
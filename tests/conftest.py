@@ -42,3 +42,21 @@ def sample_sku_data():
         "environment": "test",
         "status": "active",
     }
+
+
+@pytest.fixture(autouse=True)
+def clear_sku_cache():
+    from app.services.sku_cache import sku_cache
+
+    sku_cache.clear()
+    yield
+    sku_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_rakuten_circuits():
+    from app.services.circuit_breaker import rakuten_circuits
+
+    rakuten_circuits.reset()
+    yield
+    rakuten_circuits.reset()
@@ -44,6 +44,388 @@ class TestRakutenAPI:
         expected = base64.b64encode(b"service_secret:license_key").decode()
         assert client._auth_header == f"ESA {expected}"
 
+    @pytest.mark.asyncio
+    async def test_client_registry_shares_pooled_clients(self):
+        from app.services.rakuten_api import RakutenClientRegistry
+
+        config = {"serviceSecret": "secret", "licenseKey": "key"}
+        registry = RakutenClientRegistry()
+        assert registry.get(config) is not registry.get(config)
+        assert registry.get(config).http_client is None
+
+        registry.open()
+        client = registry.get(config)
+        assert registry.get(dict(config)) is client
+        assert registry.get({**config, "licenseKey": "key2"}) is not client
+        assert client.http_client is not None
+
+        pool = client.http_client
+        assert await registry.invalidate(config)
+        assert pool.is_closed
+        assert client.http_client is None
+        assert registry.get(config) is not client
+        await registry.close()
+        assert not registry.is_open
+
+    @pytest.mark.asyncio
+    async def test_invalidate_waits_for_in_flight_requests(self):
+        import asyncio
+
+        import httpx
+
+        from app.services.rakuten_api import RakutenClientRegistry
+        from app.services.rate_limiter import RateLimiter
+
+        release = asyncio.Event()
+        paths = []
+
+        async def handler(request):
+            paths.append(request.url.path)
+            await release.wait()
+            return httpx.Response(200, json={"manageNumber": "item-1"})
+
+        config = {"serviceSecret": "secret", "licenseKey": "key"}
+        registry = RakutenClientRegistry()
+        registry.open()
+        client = registry.get(config)
+        await client.http_client.aclose()
+        pool = client.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client.rate_limiter = RateLimiter({})
+        client.transport = httpx.MockTransport(handler)
+
+        # 相同凭证的另一个店铺保存配置时，同步任务仍在使用该客户端
+        running = asyncio.create_task(client.get_item_details("item-1"))
+        while not paths:
+            await asyncio.sleep(0)
+        assert await registry.invalidate(dict(config))
+        assert not pool.is_closed
+
+        release.set()
+        assert (await running)["manageNumber"] == "item-1"
+        assert pool.is_closed
+        # 仍持有旧客户端的调用方改用一次性连接，不会因连接池已关闭而失败
+        assert (await client.get_item_details("item-2"))["manageNumber"] == "item-1"
+        await registry.close()
+
+    @pytest.mark.asyncio
+    async def test_tracked_metrics_scoped_to_run(self):
+        from app.services.rakuten_api import RakutenAPIClient, track_requests
+
+        client = RakutenAPIClient("service_secret", "license_key")
+        client._record(latency=0.1)
+        with track_requests() as metrics:
+            client._record(latency=0.2)
+            client._record(retry=True, rate_limited=True)
+
+        assert client.metrics.calls == 2
+        assert metrics.summary() == {
+            "http_calls": 1,
+            "retries": 1,
+            "rate_limited": 1,
+            "retry_wait_seconds": 0.0,
+            "throttle_wait_seconds": 0.0,
+            "latency_p50_ms": 200.0,
+            "latency_p95_ms": 200.0,
+        }
+
+    @pytest.mark.asyncio
+    async def test_payload_logged_only_at_debug_and_truncated(self, caplog, monkeypatch):
+        import httpx
+        import logging
+
+        from app.core.config import settings
+        from app.services.rakuten_api import RakutenAPIClient
+
+        monkeypatch.setattr(settings, "RAKUTEN_LOG_PAYLOAD_MAX_CHARS", 50)
+        orders = [{"orderNumber": f"order-{i}", "note": "納品書"} for i in range(100)]
+        client = RakutenAPIClient(
+            "secret",
+            "key",
+            base_url="http://rms.test",
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"orderList": orders})),
+        )
+
+        with caplog.at_level(logging.INFO, logger="app.services.rakuten_api"):
+            assert len(await client.get_order(["order-1"])) == 100
+        assert "納品書" not in caplog.text
+        assert "getOrder returned 100/1 orders" in caplog.text
+
+        caplog.clear()
+        with caplog.at_level(logging.DEBUG, logger="app.services.rakuten_api"):
+            await client.get_order(["order-1"])
+        response_logs = [r.getMessage() for r in caplog.records if "getOrder response" in r.getMessage()]
+        assert len(response_logs) == 1
+        assert response_logs[0].endswith("chars)")
+        assert len(response_logs[0]) < 150
+
+    @pytest.mark.asyncio
+    async def test_payload_dumper_samples_to_directory(self, tmp_path):
+        import asyncio
+
+        from app.services.rakuten_api import PayloadDumper
+        from app.utils import json_codec
+
+        PayloadDumper(str(tmp_path), 0.5, rng=lambda: 0.9).maybe_dump("items.get", None, {})
+        dumper = PayloadDumper(str(tmp_path), 0.5, rng=lambda: 0.1)
+        dumper.maybe_dump("/es/2.0/items", {"hits": 1}, {"results": []})
+        for _ in range(50):
+            files = list(tmp_path.iterdir())
+            if files:
+                break
+            await asyncio.sleep(0.01)
+
+        assert len(files) == 1
+        assert json_codec.loads(files[0].read_bytes()) == {
+            "endpoint": "/es/2.0/items",
+            "request": {"hits": 1},
+            "response": {"results": []},
+        }
+
+    def test_json_codec_round_trip(self):
+        from app.utils import json_codec
+
+        value = {"名前": "商品", 1: [1.5, None, True], "big": 2 ** 70}
+        assert json_codec.loads(json_codec.dumps(value)) == {
+            "名前": "商品",
+            "1": [1.5, None, True],
+            "big": 2 ** 70,
+        }
+        assert isinstance(json_codec.dumps_bytes(value), bytes)
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_gets_share_one_request(self):
+        import asyncio
+
+        import httpx
+
+        from app.services.rakuten_api import RakutenAPIClient
+        from app.services.rate_limiter import RateLimiter
+
+        paths = []
+
+        def handler(request):
+            paths.append(request.url.path)
+            return httpx.Response(200, json={"manageNumber": request.url.path.rsplit("/", 1)[-1]})
+
+        client = RakutenAPIClient(
+            "secret",
+            "key",
+            base_url="http://rms.test",
+            transport=httpx.MockTransport(handler),
+            rate_limiter=RateLimiter({}),
+        )
+
+        results = await asyncio.gather(
+            *(client.get_item_details("item-1") for _ in range(5)),
+            client.get_item_details("item-2"),
+        )
+
+        assert [r["manageNumber"] for r in results] == ["item-1"] * 5 + ["item-2"]
+        assert sorted(paths) == ["/es/2.0/items/manage-numbers/item-1", "/es/2.0/items/manage-numbers/item-2"]
+        # 请求完成后不缓存结果
+        await client.get_item_details("item-1")
+        assert len(paths) == 3
+        assert client._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_shared_request(self):
+        import asyncio
+
+        import httpx
+
+        from app.services.rakuten_api import RakutenAPIClient
+        from app.services.rate_limiter import RateLimiter
+
+        release = asyncio.Event()
+
+        async def handler(request):
+            await release.wait()
+            return httpx.Response(200, json={"ok": True})
+
+        client = RakutenAPIClient(
+            "secret",
+            "key",
+            base_url="http://rms.test",
+            transport=httpx.MockTransport(handler),
+            rate_limiter=RateLimiter({}),
+        )
+
+        first = asyncio.ensure_future(client.get_item_details("item-1"))
+        second = asyncio.ensure_future(client.get_item_details("item-1"))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+
+        assert await second == {"ok": True}
+        assert first.cancelled()
+
+
+class TestRetryPolicy:
+    def _client(self, responses, **policy_kwargs):
+        import httpx
+
+        from app.services.rakuten_api import RakutenAPIClient
+        from app.services.rate_limiter import RateLimiter
+        from app.services.retry_policy import RetryPolicy
+
+        waits = []
+
+        async def sleep(delay):
+            waits.append(delay)
+
+        queue = list(responses)
+
+        def handler(request):
+            return queue.pop(0)
+
+        client = RakutenAPIClient(
+            "secret",
+            "key",
+            base_url="http://rms.test",
+            transport=httpx.MockTransport(handler),
+            retry_policy=RetryPolicy(rng=lambda: 1.0, sleep=sleep, **policy_kwargs),
+            rate_limiter=RateLimiter({}),
+        )
+        return client, waits
+
+    @pytest.mark.asyncio
+    async def test_retry_after_honored_and_recorded(self):
+        import httpx
+
+        client, waits = self._client([
+            httpx.Response(429, headers={"Retry-After": "2"}),
+            httpx.Response(503),
+            httpx.Response(200, json={"inventories": []}),
+        ])
+
+        assert await client.bulk_get_inventory([]) == []
+        # 429 按 Retry-After 等待；503 按指数退避（rng=1 时取上限 0.5 * 2 ** 1）
+        assert waits == [2.0, 1.0]
+        assert client.metrics.retries == 2
+        assert client.metrics.rate_limited == 1
+        assert client.metrics.retry_wait == 3.0
+
+    @pytest.mark.asyncio
+    async def test_non_idempotent_not_retried_on_server_error(self):
+        import httpx
+
+        from app.services.rakuten_api import RakutenAPIError
+
+        client, waits = self._client([httpx.Response(503)])
+
+        with pytest.raises(RakutenAPIError) as exc_info:
+            await client.confirm_order("order-1")
+        assert exc_info.value.code == 503
+        assert waits == []
+
+    @pytest.mark.asyncio
+    async def test_retry_budget_per_endpoint(self):
+        import httpx
+
+        from app.services.rakuten_api import RakutenAPIError
+
+        client, waits = self._client(
+            [httpx.Response(429), httpx.Response(429), httpx.Response(429)], budget=1
+        )
+
+        with pytest.raises(RakutenAPIError) as exc_info:
+            await client.get_order(["order-1"])
+        assert exc_info.value.code == 429
+        assert len(waits) == 1
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold_and_probes_after_cooldown(self):
+        from app.services.circuit_breaker import CircuitBreaker
+
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=10, clock=lambda: now[0])
+
+        assert breaker.allow("shop", "orders")
+        breaker.record_failure("shop", "orders", "503")
+        assert not breaker.is_open("shop", "orders")
+        breaker.record_failure("shop", "orders", "503")
+        assert breaker.is_open("shop", "orders")
+        assert not breaker.allow("shop", "orders")
+        # 其他接口类别不受影响
+        assert breaker.allow("shop", "inventory")
+
+        now[0] = 10
+        assert not breaker.is_open("shop", "orders")
+        assert breaker.allow("shop", "orders")
+        # 半开状态只放行一个探测请求
+        assert not breaker.allow("shop", "orders")
+        breaker.record_failure("shop", "orders", "503")
+        assert breaker.snapshot("shop", ["orders"])["orders"]["state"] == "open"
+
+        now[0] = 20
+        assert breaker.allow("shop", "orders")
+        breaker.record_success("shop", "orders")
+        assert breaker.snapshot("shop", ["orders"]) == {"orders": {"state": "closed", "failures": 0}}
+
+    @pytest.mark.asyncio
+    async def test_client_trips_on_auth_failure(self):
+        import httpx
+
+        from app.services.circuit_breaker import CircuitBreaker
+        from app.services.rakuten_api import CircuitOpenError, RakutenAPIClient, RakutenAPIError
+
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(401)
+
+        client = RakutenAPIClient(
+            "secret",
+            "key",
+            base_url="http://rms.test",
+            transport=httpx.MockTransport(handler),
+            circuit_breaker=CircuitBreaker(failure_threshold=5, cooldown=60),
+        )
+
+        with pytest.raises(RakutenAPIError) as exc_info:
+            await client.get_order(["order-1"])
+        assert exc_info.value.code == 401
+        with pytest.raises(CircuitOpenError):
+            await client.confirm_order("order-1")
+        assert len(requests) == 1
+        # 订单接口熔断不影响库存接口
+        with pytest.raises(RakutenAPIError) as exc_info:
+            await client.bulk_get_inventory([])
+        assert exc_info.value.code == 401
+        assert len(requests) == 2
+
+
+class TestRateLimiter:
+    @pytest.mark.asyncio
+    async def test_local_bucket_spaces_reservations(self):
+        from app.services.rate_limiter import LocalTokenBucketBackend
+
+        backend = LocalTokenBucketBackend()
+        waits = [await backend.reserve("shop:items.get", 5, 1) for _ in range(3)]
+
+        assert waits[0] == 0
+        assert waits[1] == pytest.approx(0.2, abs=0.01)
+        assert waits[2] == pytest.approx(0.4, abs=0.01)
+
+    @pytest.mark.asyncio
+    async def test_sqlite_bucket_shared_between_processes(self, tmp_path):
+        from app.services.rate_limiter import SqliteTokenBucketBackend
+
+        # 两个独立连接模拟两个 worker 进程
+        path = str(tmp_path / "buckets.db")
+        first, second = SqliteTokenBucketBackend(path), SqliteTokenBucketBackend(path)
+        try:
+            assert await first.reserve("shop:bulk-upsert", 1, 1) == 0
+            assert await second.reserve("shop:bulk-upsert", 1, 1) == pytest.approx(1.0, abs=0.05)
+            assert await second.reserve("shop:bulk-get", 5, 1) == 0
+        finally:
+            await first.close()
+            await second.close()
+
 
 class TestInventoryModels:
     def test_sku_master_creation(self):
@@ -132,3 +514,155 @@ class TestSafetyConstraints:
 
         assert not hasattr(sku, 'price')
         assert not hasattr(sku, 'cost')
+
+
+class TestEventCursor:
+    def test_round_trip(self):
+        import uuid
+        from datetime import timezone
+
+        from app.utils.helpers import decode_event_cursor, encode_event_cursor
+
+        created_at = datetime(2026, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        event_id = uuid.uuid4()
+
+        cursor = encode_event_cursor(created_at, event_id)
+
+        assert decode_event_cursor(cursor) == (created_at, event_id)
+
+    def test_malformed_cursor(self):
+        from app.utils.helpers import decode_event_cursor
+
+        with pytest.raises(ValueError):
+            decode_event_cursor("bogus")
+
+
+class TestSkuCache:
+    def _info(self, sku_id):
+        from app.services.sku_cache import SkuInfo
+
+        return SkuInfo(sku_id, sku_id.upper(), {}, False, "active")
+
+    def test_lru_eviction(self):
+        from app.services.sku_cache import SkuCache
+
+        cache = SkuCache(max_size=2, ttl_seconds=60)
+        cache.put(self._info("a"))
+        cache.put(self._info("b"))
+        cache.get("a")
+        cache.put(self._info("c"))
+
+        assert cache.get("b") is None
+        assert cache.get("a").sku_id == "a"
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        from app.services.sku_cache import SkuCache
+
+        cache = SkuCache(max_size=10, ttl_seconds=60)
+        cache.put(self._info("a"))
+
+        with patch("app.services.sku_cache.time.monotonic", return_value=10**12):
+            assert cache.get("a") is None
+
+    def test_invalidate_and_stats(self):
+        from app.services.sku_cache import SkuCache
+
+        cache = SkuCache(max_size=10, ttl_seconds=60)
+        cache.put(self._info("a"))
+        assert cache.get("a") is not None
+        cache.invalidate("a")
+        assert cache.get("a") is None
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+
+class TestSkuWriteLanes:
+    @pytest.mark.asyncio
+    async def test_same_sku_serialized_other_skus_parallel(self):
+        import asyncio
+
+        from app.services.write_lanes import SkuWriteLanes
+
+        lanes = SkuWriteLanes()
+        session = MagicMock()
+        order = []
+
+        async def worker(name, sku_ids, delay):
+            async with lanes.acquire(session, sku_ids):
+                order.append(f"{name}-start")
+                await asyncio.sleep(delay)
+                order.append(f"{name}-end")
+
+        await asyncio.gather(
+            worker("a1", ["SKU-A"], 0.02),
+            worker("a2", ["sku-a"], 0),
+            worker("b", ["sku-b"], 0),
+        )
+
+        assert order.index("a1-end") < order.index("a2-start")
+        assert order.index("b-end") < order.index("a1-end")
+        assert lanes.active_lanes() == 0
+
+    @pytest.mark.asyncio
+    async def test_lock_released_on_error(self):
+        from app.services.write_lanes import SkuWriteLanes
+
+        lanes = SkuWriteLanes()
+        with pytest.raises(RuntimeError):
+            async with lanes.acquire(MagicMock(), ["sku-a", "sku-b"]):
+                raise RuntimeError("boom")
+
+        async with lanes.acquire(MagicMock(), ["sku-b"]) as keys:
+            assert keys == ["sku-b"]
+        assert lanes.active_lanes() == 0
+
+
+class TestApiErrorLogWriter:
+    def _writer(self, test_db, **kwargs):
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        from app.services.error_log import ApiErrorLogWriter
+
+        factory = async_sessionmaker(test_db.bind, expire_on_commit=False)
+        return ApiErrorLogWriter(session_factory=factory, **kwargs)
+
+    async def _rows(self, test_db):
+        from sqlalchemy import select
+
+        from app.db.models import ApiErrorLog
+
+        result = await test_db.execute(select(ApiErrorLog).order_by(ApiErrorLog.count.desc()))
+        return result.scalars().all()
+
+    @pytest.mark.asyncio
+    async def test_repeats_collapse_into_counted_buckets(self, test_db):
+        writer = self._writer(test_db, batch_size=100, flush_seconds=60)
+        for _ in range(3):
+            writer.record("timeout", store_id="s1", operation="search_order",
+                          error_details={"error_code": "GW_TIMEOUT"})
+        writer.record("denied", store_id="s1", operation="search_order",
+                      error_details={"error_code": "AUTH"})
+
+        assert writer.pending() == 4
+        assert await writer.flush() == 2
+        assert writer.pending() == 0
+
+        rows = await self._rows(test_db)
+        assert [(r.error_code, r.count) for r in rows] == [("GW_TIMEOUT", 3), ("AUTH", 1)]
+
+    @pytest.mark.asyncio
+    async def test_flush_triggered_by_batch_size(self, test_db):
+        writer = self._writer(test_db, batch_size=2, flush_seconds=60)
+        writer.record("e1", store_id="s1", operation="get_order")
+        writer.record("e2", store_id="s1", operation="get_order")
+
+        await writer.stop()
+
+        rows = await self._rows(test_db)
+        assert len(rows) == 1
+        assert rows[0].count == 2
+        assert rows[0].last_message == "e2"
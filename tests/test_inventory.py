@@ -0,0 +1,611 @@
+import gzip
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select, update
+
+from app.db.models import (
+    EventArchive,
+    EventArchiveBaseline,
+    InventoryEvent,
+    InventorySnapshot,
+    SkuMaster,
+    SnapshotRebuildRun,
+    StoreSku,
+)
+from app.db.schemas import (
+    EventTypeEnumSchema,
+    ImportModeEnumSchema,
+    InventoryModeEnumSchema,
+    SourceEnumSchema,
+    ZeroHandlingEnumSchema,
+)
+from app.services.csv_import import CsvImportService
+from app.services.event_archive import EventArchiveService
+from app.services.inventory import InventoryService
+from app.services.inventory_checkpoint import InventoryCheckpointService
+from app.services.sku_cache import sku_cache
+from app.services.snapshot_rebuild import SnapshotRebuildService
+
+
+async def _add_sku(session, sku_id: str, allow_oversell: bool = False) -> SkuMaster:
+    sku = SkuMaster(
+        sku_id=sku_id,
+        original_sku=sku_id.upper(),
+        sku_name=f"Product {sku_id}",
+        allow_oversell=allow_oversell,
+        environment="test",
+        status="active",
+        extra_data={},
+        aliases={},
+    )
+    session.add(sku)
+    await session.flush()
+    return sku
+
+
+async def _adjust(service: InventoryService, sku_id: str, quantity: int):
+    return await service.create_event(
+        event_type=EventTypeEnumSchema.ADJUSTMENT,
+        sku_id=sku_id,
+        quantity=quantity,
+        operator="tester",
+        source=SourceEnumSchema.MANUAL,
+    )
+
+
+class TestSnapshotUpdate:
+    @pytest.mark.asyncio
+    async def test_first_event_inserts_snapshot(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        service = InventoryService(test_db)
+
+        event = await _adjust(service, "SKU-A", 10)
+
+        snapshot = await service.get_snapshot("sku-a")
+        assert snapshot.internal_available == 10
+        assert snapshot.last_event_id == event.event_id
+
+    @pytest.mark.asyncio
+    async def test_subsequent_events_accumulate(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        service = InventoryService(test_db)
+
+        await _adjust(service, "sku-a", 10)
+        snapshot = await service.get_snapshot("sku-a")
+        await _adjust(service, "sku-a", -3)
+        last = await _adjust(service, "sku-a", 5)
+
+        # 已加载到会话中的快照对象也应同步为最新值
+        assert snapshot.internal_available == 12
+        assert snapshot.last_event_id == last.event_id
+
+    @pytest.mark.asyncio
+    async def test_oversell_rejected(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        service = InventoryService(test_db)
+        await _adjust(service, "sku-a", 2)
+
+        with pytest.raises(ValueError, match="不允许超卖"):
+            await _adjust(service, "sku-a", -3)
+
+        snapshot = await service.get_snapshot("sku-a")
+        assert snapshot.internal_available == 2
+
+    @pytest.mark.asyncio
+    async def test_oversell_allowed_when_flag_set(self, test_db):
+        await _add_sku(test_db, "sku-a", allow_oversell=True)
+        service = InventoryService(test_db)
+        await _adjust(service, "sku-a", 2)
+
+        await _adjust(service, "sku-a", -5)
+
+        snapshot = await service.get_snapshot("sku-a")
+        assert snapshot.internal_available == -3
+
+    @pytest.mark.asyncio
+    async def test_oversell_check_can_be_disabled(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        service = InventoryService(test_db)
+        event = await _adjust(service, "sku-a", 1)
+
+        await service._update_snapshot("sku-a", -4, event.event_id, allow_oversell_check=False)
+
+        value = await test_db.scalar(
+            select(InventorySnapshot.internal_available)
+            .where(InventorySnapshot.sku_id == "sku-a")
+        )
+        assert value == -3
+
+
+def _spec(sku_id: str, quantity: int, **kwargs) -> dict:
+    return {
+        "event_type": kwargs.pop("event_type", EventTypeEnumSchema.ORDER_RECEIVED),
+        "sku_id": sku_id,
+        "quantity": quantity,
+        "operator": "system",
+        "source": SourceEnumSchema.API,
+        **kwargs,
+    }
+
+
+class TestCreateEventsBulk:
+    @pytest.mark.asyncio
+    async def test_deltas_summed_per_sku(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        await _add_sku(test_db, "sku-b")
+        service = InventoryService(test_db)
+        await _adjust(service, "sku-a", 10)
+
+        result = await service.create_events_bulk([
+            _spec("sku-a", -2),
+            _spec("SKU-B", 4, event_type=EventTypeEnumSchema.STOCK_IN),
+            _spec("sku-a", -3),
+        ])
+
+        assert result["inserted"] == 3
+        assert result["snapshots"] == {"sku-a": 5, "sku-b": 4}
+        assert len(await service.get_events("sku-a")) == 3
+
+    @pytest.mark.asyncio
+    async def test_duplicate_tokens_skipped(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        service = InventoryService(test_db)
+        await _adjust(service, "sku-a", 10)
+
+        first = await service.create_events_bulk([_spec("sku-a", -1, token="order-1")])
+        second = await service.create_events_bulk([
+            _spec("sku-a", -1, token="order-1"),
+            _spec("sku-a", -2, token="order-2"),
+            _spec("sku-a", -2, token="order-2"),
+        ])
+
+        assert first["inserted"] == 1
+        assert second["inserted"] == 1
+        assert sorted(second["skipped_tokens"]) == ["order-1", "order-2"]
+        snapshot = await service.get_snapshot("sku-a")
+        assert snapshot.internal_available == 7
+
+    @pytest.mark.asyncio
+    async def test_init_reset_overwrites_then_adds(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        service = InventoryService(test_db)
+        await _adjust(service, "sku-a", 10)
+
+        result = await service.create_events_bulk([
+            _spec("sku-a", -4),
+            _spec("sku-a", 20, event_type=EventTypeEnumSchema.INIT_RESET),
+            _spec("sku-a", -1),
+        ])
+
+        assert result["snapshots"] == {"sku-a": 19}
+
+    @pytest.mark.asyncio
+    async def test_net_oversell_rejected(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        service = InventoryService(test_db)
+        await _adjust(service, "sku-a", 1)
+
+        with pytest.raises(ValueError, match="不允许超卖"):
+            await service.create_events_bulk([_spec("sku-a", -1), _spec("sku-a", -1)])
+
+
+class TestSnapshotRebuild:
+    @pytest.mark.asyncio
+    async def test_consistent_snapshots_report_no_drift(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        await _add_sku(test_db, "sku-b")
+        service = InventoryService(test_db)
+        await _adjust(service, "sku-a", 10)
+        await service.create_events_bulk([
+            _spec("sku-a", -2),
+            _spec("sku-b", 7, event_type=EventTypeEnumSchema.INIT_RESET),
+            _spec("sku-b", -1),
+        ])
+
+        result = await SnapshotRebuildService(test_db).rebuild(chunk_size=1)
+
+        assert result["status"] == "completed"
+        assert result["skus_checked"] == 2
+        assert result["drift_count"] == 0
+
+    @pytest.mark.asyncio
+    async def test_drift_detected_and_repaired(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        service = InventoryService(test_db)
+        await _adjust(service, "sku-a", 3)
+        await service.create_events_bulk([
+            _spec("sku-a", 20, event_type=EventTypeEnumSchema.INIT_RESET),
+            _spec("sku-a", -5),
+        ])
+        await _adjust(service, "sku-a", 1)
+        await test_db.execute(
+            update(InventorySnapshot)
+            .where(InventorySnapshot.sku_id == "sku-a")
+            .values(internal_available=99)
+        )
+
+        rebuild = SnapshotRebuildService(test_db)
+        report = await rebuild.rebuild()
+        assert report["drifts"] == [
+            {"sku_id": "sku-a", "expected": 16, "actual": 99, "difference": 83}
+        ]
+
+        repaired = await rebuild.rebuild(repair=True)
+        assert repaired["repaired_count"] == 1
+        assert (await service.get_snapshot("sku-a")).internal_available == 16
+        assert (await rebuild.rebuild())["drift_count"] == 0
+
+    @pytest.mark.asyncio
+    async def test_resume_from_checkpoint(self, test_db):
+        for sku_id in ("sku-a", "sku-b", "sku-c"):
+            await _add_sku(test_db, sku_id)
+        run = SnapshotRebuildRun(
+            repair=False,
+            status="running",
+            last_sku_id="sku-a",
+            skus_checked=1,
+            drift_count=0,
+            repaired_count=0,
+        )
+        test_db.add(run)
+        await test_db.commit()
+
+        result = await SnapshotRebuildService(test_db).rebuild(run_id=run.run_id)
+
+        assert result["run_id"] == run.run_id
+        assert result["skus_checked"] == 3
+
+
+class TestEventPagination:
+    @pytest.mark.asyncio
+    async def test_cursor_walks_all_events_with_tied_timestamps(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        service = InventoryService(test_db)
+        await service.create_events_bulk(
+            [_spec("sku-a", 1, event_type=EventTypeEnumSchema.STOCK_IN) for _ in range(5)]
+        )
+        await test_db.execute(
+            update(InventoryEvent).values(created_at=datetime(2026, 1, 1, tzinfo=timezone.utc))
+        )
+
+        seen = []
+        cursor = None
+        while True:
+            events, cursor = await service.get_events_page("sku-a", limit=2, cursor=cursor)
+            seen.extend(e.event_id for e in events)
+            if cursor is None:
+                break
+
+        assert len(seen) == 5
+        assert len(set(seen)) == 5
+        assert seen == [e.event_id for e in await service.get_events("sku-a", limit=10)]
+
+    @pytest.mark.asyncio
+    async def test_offset_first_page_then_cursor(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        service = InventoryService(test_db)
+        await service.create_events_bulk(
+            [_spec("sku-a", i, event_type=EventTypeEnumSchema.STOCK_IN) for i in range(1, 5)]
+        )
+
+        events, cursor = await service.get_events_page("sku-a", limit=1, offset=1)
+        assert [e.quantity for e in events] == [3]
+
+        events, cursor = await service.get_events_page("sku-a", limit=5, cursor=cursor)
+        assert [e.quantity for e in events] == [2, 1]
+        assert cursor is None
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self, test_db):
+        service = InventoryService(test_db)
+        with pytest.raises(ValueError):
+            await service.get_events_page("sku-a", cursor="not-a-cursor")
+
+
+class TestSkuInfoCache:
+    @pytest.mark.asyncio
+    async def test_second_lookup_served_from_cache(self, test_db):
+        await _add_sku(test_db, "sku-a", allow_oversell=True)
+        service = InventoryService(test_db)
+
+        first = await service.get_sku_info("SKU-A")
+        with patch.object(test_db, "execute", side_effect=AssertionError("no query expected")):
+            second = await service.get_sku_info("sku-a")
+
+        assert first == second
+        assert second.allow_oversell is True
+        assert sku_cache.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_deactivate_invalidates(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        service = InventoryService(test_db)
+        await service.get_sku_info("sku-a")
+
+        await service.deactivate_sku("sku-a")
+
+        assert (await service.get_sku_info("sku-a")).status == "inactive"
+
+    @pytest.mark.asyncio
+    async def test_get_sku_served_from_cache(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        await test_db.commit()
+        service = InventoryService(test_db)
+        await service.get_sku("sku-a")
+        test_db.expunge_all()
+
+        with patch.object(test_db, "execute", side_effect=AssertionError("no query expected")):
+            sku = await service.get_or_create_sku("SKU-A")
+
+        assert sku.sku_name == "Product sku-a"
+        assert sku in test_db
+        sku.sku_name = "Renamed"
+        await test_db.commit()
+        test_db.expunge_all()
+        stored = await test_db.scalar(select(SkuMaster.sku_name).where(SkuMaster.sku_id == "sku-a"))
+        assert stored == "Renamed"
+
+    @pytest.mark.asyncio
+    async def test_invalidated_again_after_commit(self, test_db):
+        await _add_sku(test_db, "sku-a")
+        await test_db.commit()
+        service = InventoryService(test_db)
+        stale = await service.get_sku_info("sku-a")
+
+        await service.deactivate_sku("sku-a")
+        # 并发读取者在提交前把旧行放回缓存
+        sku_cache.put(stale)
+        await test_db.commit()
+
+        assert sku_cache.get("sku-a") is None
+        assert (await service.get_sku_info("sku-a")).status == "inactive"
+
+    @pytest.mark.asyncio
+    async def test_missing_sku_not_cached(self, test_db):
+        service = InventoryService(test_db)
+        assert await service.get_sku_info("nope") is None
+        assert sku_cache.stats()["size"] == 0
+
+
+class TestCsvStockImport:
+    @pytest.mark.asyncio
+    async def test_replace_then_add_keeps_snapshot_and_events_consistent(self, test_db):
+        service = CsvImportService(test_db)
+        content = "SKU,在庫数\nSKU-A,5\n"
+
+        await service.execute_import(
+            content, None, ImportModeEnumSchema.RESET_STOCK,
+            InventoryModeEnumSchema.REPLACE, ZeroHandlingEnumSchema.IGNORE,
+        )
+        await service.execute_import(
+            content, None, ImportModeEnumSchema.RESET_STOCK,
+            InventoryModeEnumSchema.ADD, ZeroHandlingEnumSchema.IGNORE,
+        )
+
+        snapshot = await InventoryService(test_db).get_snapshot("sku-a")
+        assert snapshot.internal_available == 10
+        assert (await SnapshotRebuildService(test_db).rebuild())["drift_count"] == 0
+
+    @pytest.mark.asyncio
+    async def test_lanes_held_until_commit(self, test_db, monkeypatch):
+        from app.services.write_lanes import sku_write_lanes
+
+        held_at_commit = []
+        commit = test_db.commit
+
+        async def recording_commit():
+            held_at_commit.append(sku_write_lanes.active_lanes())
+            await commit()
+
+        monkeypatch.setattr(test_db, "commit", recording_commit)
+        await CsvImportService(test_db).execute_import(
+            "SKU,在庫数\nSKU-A,5\nSKU-B,3\n", None, ImportModeEnumSchema.RESET_STOCK,
+            InventoryModeEnumSchema.REPLACE, ZeroHandlingEnumSchema.IGNORE,
+        )
+
+        assert held_at_commit == [2]
+        assert sku_write_lanes.active_lanes() == 0
+
+    @pytest.mark.asyncio
+    async def test_stock_rows_written_in_one_bulk_call(self, test_db):
+        rows = "".join(f"SKU-{i},{i + 1}\n" for i in range(50))
+        bulk = InventoryService.create_events_bulk
+
+        with (
+            patch.object(InventoryService, "create_events_bulk", autospec=True, side_effect=bulk) as spy,
+            patch.object(InventoryService, "create_event", side_effect=AssertionError("per-row write")),
+        ):
+            result = await CsvImportService(test_db).execute_import(
+                "SKU,在庫数\n" + rows + "SKU-0,7\n", None, ImportModeEnumSchema.RESET_STOCK,
+                InventoryModeEnumSchema.REPLACE, ZeroHandlingEnumSchema.IGNORE,
+            )
+
+        assert result["errors"] == []
+        assert spy.call_count == 1
+        service = InventoryService(test_db)
+        assert (await service.get_snapshot("sku-0")).internal_available == 7
+        assert (await service.get_snapshot("sku-49")).internal_available == 50
+        assert (await SnapshotRebuildService(test_db).rebuild())["drift_count"] == 0
+
+    @pytest.mark.asyncio
+    async def test_skip_zero_resets_only_stocked_skus(self, test_db):
+        service = CsvImportService(test_db)
+        await service.execute_import(
+            "SKU,在庫数\nSKU-A,5\n", None, ImportModeEnumSchema.RESET_STOCK,
+            InventoryModeEnumSchema.REPLACE, ZeroHandlingEnumSchema.IGNORE,
+        )
+
+        result = await service.execute_import(
+            "SKU,在庫数\nSKU-A,2\nSKU-B,4\nSKU-A,3\n", None, ImportModeEnumSchema.RESET_STOCK,
+            InventoryModeEnumSchema.SKIP_ZERO, ZeroHandlingEnumSchema.IGNORE,
+        )
+
+        assert result["skipped"] == 1
+        inventory = InventoryService(test_db)
+        assert (await inventory.get_snapshot("sku-a")).internal_available == 3
+        assert await inventory.get_snapshot("sku-b") is None
+
+
+async def _backdate(session, event, created_at: datetime) -> None:
+    await session.execute(
+        update(InventoryEvent)
+        .where(InventoryEvent.event_id == event.event_id)
+        .values(created_at=created_at)
+    )
+
+
+class TestEventArchive:
+    async def _history(self, session):
+        """sku-a: 1 月 +10, 2 月 -3, 7 月 +2；sku-b: 2 月 +4, +1"""
+        await _add_sku(session, "sku-a")
+        await _add_sku(session, "sku-b")
+        service = InventoryService(session)
+        dates = [
+            ("sku-a", 10, datetime(2026, 1, 5, tzinfo=timezone.utc)),
+            ("sku-a", -3, datetime(2026, 2, 1, tzinfo=timezone.utc)),
+            ("sku-b", 4, datetime(2026, 2, 2, tzinfo=timezone.utc)),
+            ("sku-b", 1, datetime(2026, 2, 3, tzinfo=timezone.utc)),
+            ("sku-a", 2, datetime(2026, 7, 1, tzinfo=timezone.utc)),
+        ]
+        for sku_id, quantity, created_at in dates:
+            event = await _adjust(service, sku_id, quantity)
+            await _backdate(session, event, created_at)
+        await session.commit()
+        return service
+
+    @pytest.mark.asyncio
+    async def test_closed_months_moved_to_archive(self, test_db, tmp_path):
+        service = await self._history(test_db)
+
+        result = await EventArchiveService(test_db, tmp_path).archive_closed_months(
+            hot_months=3, now=datetime(2026, 8, 15, tzinfo=timezone.utc)
+        )
+
+        # 1 月、2 月归档；sku-b 的最后一条被快照引用，留在热表
+        assert [a["period"] for a in result["archives"]] == ["2026-01", "2026-02"]
+        assert [a["row_count"] for a in result["archives"]] == [1, 2]
+        assert len((await test_db.execute(select(EventArchive))).all()) == 2
+        assert len(await service.get_events("sku-a")) == 1
+        assert len(await service.get_events("sku-b")) == 1
+
+        baselines = dict(
+            (await test_db.execute(
+                select(EventArchiveBaseline.sku_id, EventArchiveBaseline.quantity)
+            )).all()
+        )
+        assert baselines == {"sku-a": 7, "sku-b": 4}
+        assert (await SnapshotRebuildService(test_db).rebuild())["drift_count"] == 0
+
+    @pytest.mark.asyncio
+    async def test_timeline_merges_archived_events(self, test_db, tmp_path):
+        service = await self._history(test_db)
+        expected = [e.event_id for e in await service.get_events("sku-a")]
+        await EventArchiveService(test_db, tmp_path).archive_closed_months(
+            hot_months=3, now=datetime(2026, 8, 15, tzinfo=timezone.utc)
+        )
+
+        with patch("app.services.event_archive.settings.EVENT_ARCHIVE_DIR", str(tmp_path)):
+            seen = []
+            cursor = None
+            while True:
+                events, cursor = await service.get_events_page(
+                    "sku-a", limit=2, cursor=cursor, include_archived=True
+                )
+                seen.extend(e.event_id for e in events)
+                if cursor is None:
+                    break
+
+        assert seen == expected
+
+    @pytest.mark.asyncio
+    async def test_file_io_runs_off_event_loop(self, test_db, tmp_path):
+        service = await self._history(test_db)
+        archive = EventArchiveService(test_db, tmp_path)
+        real_open = gzip.open
+        threads = []
+
+        def recording_open(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return real_open(*args, **kwargs)
+
+        with patch("app.services.event_archive.gzip.open", side_effect=recording_open):
+            await archive.archive_closed_months(
+                hot_months=3, now=datetime(2026, 8, 15, tzinfo=timezone.utc)
+            )
+            archived = await archive.get_archived_events("sku-a", limit=10)
+
+        assert len(archived) == 2
+        assert len(await service.get_events("sku-a")) == 1
+        assert threads and threading.get_ident() not in threads
+
+
+class TestPointInTimeInventory:
+    async def _history(self, session):
+        await _add_sku(session, "sku-a")
+        service = InventoryService(session)
+        for quantity, day in ((10, 1), (-3, 2), (5, 4)):
+            event = await _adjust(service, "sku-a", quantity)
+            await _backdate(session, event, datetime(2026, 3, day, tzinfo=timezone.utc))
+        await session.commit()
+
+    @pytest.mark.asyncio
+    async def test_replay_without_checkpoint(self, test_db):
+        await self._history(test_db)
+        checkpoints = InventoryCheckpointService(test_db)
+
+        point = await checkpoints.get_quantity_at("SKU-A", datetime(2026, 3, 3, tzinfo=timezone.utc))
+
+        assert point["internal_available"] == 7
+        assert point["replayed_events"] == 2
+
+    @pytest.mark.asyncio
+    async def test_checkpoint_limits_replay(self, test_db):
+        await self._history(test_db)
+        checkpoints = InventoryCheckpointService(test_db)
+        result = await checkpoints.create_checkpoints(as_of=datetime(2026, 3, 3, tzinfo=timezone.utc))
+        assert result["created"] == 1
+
+        point = await checkpoints.get_quantity_at("sku-a", datetime(2026, 3, 5, tzinfo=timezone.utc))
+
+        assert point["internal_available"] == 12
+        assert point["replayed_events"] == 1
+        assert point["checkpoint_as_of"] == datetime(2026, 3, 3, tzinfo=timezone.utc)
+
+        # 没有新事件时不重复记录检查点
+        again = await checkpoints.create_checkpoints(as_of=datetime(2026, 3, 3, 12, tzinfo=timezone.utc))
+        assert again["created"] == 0
+
+    @pytest.mark.asyncio
+    async def test_non_utc_as_of_converted(self, test_db):
+        await self._history(test_db)
+        checkpoints = InventoryCheckpointService(test_db)
+        jst = timezone(timedelta(hours=9))
+
+        # 3/1 08:00 JST = 2/28 23:00 UTC，早于第一个事件
+        point = await checkpoints.get_quantity_at("sku-a", datetime(2026, 3, 1, 8, tzinfo=jst))
+        assert point["internal_available"] == 0
+
+        result = await checkpoints.create_checkpoints(as_of=datetime(2026, 3, 3, 8, tzinfo=jst))
+        assert result["created"] == 1
+        point = await checkpoints.get_quantity_at("sku-a", datetime(2026, 3, 5, tzinfo=timezone.utc))
+        assert point["checkpoint_as_of"] == datetime(2026, 3, 2, 23, tzinfo=timezone.utc)
+        assert point["internal_available"] == 12
+
+    @pytest.mark.asyncio
+    async def test_store_bulk_variant(self, test_db):
+        await self._history(test_db)
+        await _add_sku(test_db, "sku-b")
+        test_db.add_all([
+            StoreSku(store_id="store-1", sku_id="sku-a"),
+            StoreSku(store_id="store-1", sku_id="sku-b"),
+        ])
+        await test_db.flush()
+
+        rows = await InventoryCheckpointService(test_db).get_store_quantities_at(
+            "store-1", datetime(2026, 3, 10, tzinfo=timezone.utc)
+        )
+
+        assert [(r["sku_id"], r["internal_available"]) for r in rows] == [("sku-a", 12), ("sku-b", 0)]
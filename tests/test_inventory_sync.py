@@ -0,0 +1,435 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import select
+
+from app.db.models import (
+    EventTypeEnum,
+    InventoryEvent,
+    InventorySnapshot,
+    SkuMaster,
+    Store,
+    StoreSku,
+)
+from app.db.schemas import EventTypeEnumSchema, SourceEnumSchema
+from app.services import inventory as inventory_module
+from app.services import inventory_sync
+from app.services.inventory import InventoryService
+from app.services.inventory_sync import InventorySyncService, PushItem
+from app.services.push_queue import PushQueue
+from app.services.rakuten_api import RakutenAPIClient, RakutenAPIError
+from app.services.sync_executor import SyncExecutor
+from app.services.sync_runs import SyncRunService
+
+
+async def _setup_store(session, count: int, stock: int = 5) -> None:
+    session.add(Store(
+        store_id="store-1",
+        store_name="Store 1",
+        platform_type="rakuten",
+        api_config={"serviceSecret": "secret", "licenseKey": "key"},
+    ))
+    for i in range(count):
+        sku_id = f"sku-{i:04d}"
+        session.add(SkuMaster(
+            sku_id=sku_id,
+            original_sku=sku_id.upper(),
+            sku_name=sku_id,
+            environment="test",
+            status="active",
+            extra_data={"manage_number": f"item-{i // 10}"},
+            aliases={},
+        ))
+        session.add(InventorySnapshot(sku_id=sku_id, internal_available=stock))
+        session.add(StoreSku(store_id="store-1", sku_id=sku_id))
+    await session.commit()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = AsyncMock()
+    monkeypatch.setattr(inventory_sync, "get_rakuten_client", lambda api_config: client)
+    monkeypatch.setattr(inventory_sync, "BULK_UPSERT_INTERVAL_SECONDS", 0)
+    return client
+
+
+class TestBulkInventoryPush:
+    @pytest.mark.asyncio
+    async def test_push_is_chunked_by_bulk_limit(self, test_db, client):
+        await _setup_store(test_db, 401)
+
+        result = await InventorySyncService(test_db).sync_all_to_store("store-1")
+
+        assert result["total"] == 401
+        assert result["success"] == 401
+        assert result["failed"] == 0
+        assert result["requests"] == 2
+        first, second = [call.args[0] for call in client.bulk_upsert_inventory.await_args_list]
+        assert len(first) == 400 and len(second) == 1
+        assert first[0] == {
+            "manageNumber": "item-0",
+            "variantId": "SKU-0000",
+            "mode": "ABSOLUTE",
+            "quantity": 5,
+        }
+
+    @pytest.mark.asyncio
+    async def test_item_error_recorded_and_rest_retried(self, test_db, client):
+        await _setup_store(test_db, 3)
+        client.bulk_upsert_inventory.side_effect = [
+            RakutenAPIError(
+                "API request failed: 400",
+                code=400,
+                response=json.dumps({"errors": [{
+                    "code": "GE0014",
+                    "message": "variant not found",
+                    "metadata": {"propertyPath": "inventories[1].variantId"},
+                }]}),
+            ),
+            {},
+        ]
+
+        result = await InventorySyncService(test_db).sync_all_to_store("store-1")
+
+        assert result["success"] == 2
+        assert result["errors"] == [{
+            "sku_id": "sku-0001",
+            "rakuten_sku": "SKU-0001",
+            "stock": 5,
+            "store_id": "store-1",
+            "error": "variant not found",
+        }]
+        retried = client.bulk_upsert_inventory.await_args_list[1].args[0]
+        assert [item["variantId"] for item in retried] == ["SKU-0000", "SKU-0002"]
+
+        events = (await test_db.execute(select(InventoryEvent))).scalars().all()
+        assert [(e.event_type, e.sku_id) for e in events] == [
+            (EventTypeEnum.SYNC_FAILURE, "sku-0001")
+        ]
+        assert events[0].event_metadata["error_code"] == "GE0014"
+        snapshot = await test_db.get(InventorySnapshot, "sku-0001")
+        assert snapshot.internal_available == 5
+
+    @pytest.mark.asyncio
+    async def test_sku_pushed_to_all_stores(self, test_db, client):
+        await _setup_store(test_db, 1)
+        test_db.add(Store(
+            store_id="store-2",
+            store_name="Store 2",
+            platform_type="rakuten",
+            api_config={"serviceSecret": "secret", "licenseKey": "key"},
+        ))
+        test_db.add(StoreSku(store_id="store-2", sku_id="sku-0000"))
+        await test_db.commit()
+
+        result = await InventorySyncService(test_db, workers=2).sync_sku_to_all_stores("SKU-0000")
+
+        assert result["synced"] == 2
+        assert result["stores"] == ["store-1", "store-2"]
+        assert result["stats"]["jobs"] == 2
+        assert client.bulk_upsert_inventory.await_count == 2
+
+
+class TestStoreLoader:
+    @pytest.mark.asyncio
+    async def test_store_items_streamed_in_pages(self, test_db):
+        await _setup_store(test_db, 5)
+        service = InventorySyncService(test_db)
+
+        items = [item async for item in service.iter_store_items("store-1", page_size=2)]
+
+        assert [item.sku_id for item in items] == [f"sku-{i:04d}" for i in range(5)]
+        assert items[0] == PushItem("sku-0000", "item-0", "SKU-0000", 5)
+
+
+class TestSyncExecutor:
+    @pytest.mark.asyncio
+    async def test_concurrency_bounded_and_writes_serialized(self):
+        running = 0
+        peak = 0
+        written = []
+
+        async def call(job):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if job == 3:
+                raise RuntimeError("boom")
+            return job * 10
+
+        async def write(job, outcome):
+            written.append((job, outcome if not isinstance(outcome, Exception) else "error"))
+
+        stats = await SyncExecutor(workers=2).run(range(6), call, write)
+
+        assert peak == 2
+        assert sorted(written) == [(0, 0), (1, 10), (2, 20), (3, "error"), (4, 40), (5, 50)]
+        assert stats["jobs"] == 6
+        assert stats["failed"] == 1
+        assert stats["workers"] == 2
+
+    @pytest.mark.asyncio
+    async def test_jobs_pulled_lazily(self):
+        pulled = 0
+        written = 0
+        max_ahead = 0
+
+        async def jobs():
+            nonlocal pulled, max_ahead
+            for job in range(50):
+                pulled += 1
+                max_ahead = max(max_ahead, pulled - written)
+                yield job
+
+        async def call(job):
+            await asyncio.sleep(0)
+            return job
+
+        async def write(job, outcome):
+            nonlocal written
+            written += 1
+
+        stats = await SyncExecutor(workers=3).run(jobs(), call, write)
+
+        assert stats["jobs"] == 50
+        assert written == 50
+        assert max_ahead <= 6
+
+
+class TestIncrementalSync:
+    @pytest.mark.asyncio
+    async def test_only_changed_skus_pushed(self, test_db, client):
+        await _setup_store(test_db, 3)
+        service = InventorySyncService(test_db)
+
+        first = await service.sync_all_to_store("store-1")
+        assert first["success"] == 3
+        assert first["mode"] == "incremental"
+
+        second = await service.sync_all_to_store("store-1")
+        assert second["total"] == 0
+        assert second["unchanged"] == 3
+        assert second["mode"] == "incremental"
+
+        await InventoryService(test_db).create_event(
+            event_type=EventTypeEnumSchema.STOCK_IN,
+            sku_id="sku-0001",
+            quantity=2,
+            operator="tester",
+            source=SourceEnumSchema.MANUAL,
+        )
+        await test_db.commit()
+
+        third = await service.sync_all_to_store("store-1")
+        assert third["success"] == 1
+        pushed = client.bulk_upsert_inventory.await_args_list[-1].args[0]
+        assert [(item["variantId"], item["quantity"]) for item in pushed] == [("SKU-0001", 7)]
+        store_sku = await test_db.get(StoreSku, ("store-1", "sku-0001"))
+        assert store_sku.last_pushed_quantity == 7
+        assert client.bulk_upsert_inventory.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_incremental_sync_finds_changes_from_other_processes(self, test_db, client):
+        await _setup_store(test_db, 2)
+        service = InventorySyncService(test_db)
+        await service.sync_all_to_store("store-1")
+
+        # 其他进程直接改写快照（不经过本进程的 InventoryService）
+        snapshot = await test_db.get(InventorySnapshot, "sku-0000")
+        snapshot.internal_available = 9
+        await test_db.commit()
+
+        result = await service.sync_all_to_store("store-1")
+        assert result["success"] == 1
+        assert result["errors"] == []
+        pushed = client.bulk_upsert_inventory.await_args_list[-1].args[0]
+        assert [(item["variantId"], item["quantity"]) for item in pushed] == [("SKU-0000", 9)]
+
+        full = await service.sync_all_to_store("store-1", full=True)
+        assert (full["mode"], full["success"], full["unchanged"]) == ("full", 2, 0)
+
+
+class TestPushQueue:
+    @pytest.mark.asyncio
+    async def test_repeated_changes_coalesced_into_one_push(self, test_db, client, monkeypatch):
+        await _setup_store(test_db, 2)
+        await InventorySyncService(test_db).sync_all_to_store("store-1", full=True)
+
+        @asynccontextmanager
+        async def session_factory():
+            yield test_db
+
+        queue = PushQueue(session_factory=session_factory, window_seconds=60)
+        monkeypatch.setattr(inventory_module, "push_queue", queue)
+        queue.start()
+        try:
+            inv_service = InventoryService(test_db)
+            for _ in range(3):
+                await inv_service.create_event(
+                    event_type=EventTypeEnumSchema.ORDER_RECEIVED,
+                    sku_id="sku-0000",
+                    quantity=-1,
+                    operator="tester",
+                    source=SourceEnumSchema.MANUAL,
+                )
+            await test_db.commit()
+            assert queue.depth() == 1
+
+            results = await queue.flush()
+        finally:
+            await queue.stop()
+
+        assert results["store-1"]["success"] == 1
+        pushed = client.bulk_upsert_inventory.await_args_list[-1].args[0]
+        assert [(item["variantId"], item["quantity"]) for item in pushed] == [("SKU-0000", 2)]
+        stats = queue.stats()
+        assert stats["notices"] == 3
+        assert stats["flushed_skus"] == 1
+        assert stats["coalescing_ratio"] == 3.0
+
+    @pytest.mark.asyncio
+    async def test_change_committed_after_window_is_pushed(self, test_db, client, monkeypatch):
+        await _setup_store(test_db, 2)
+        await InventorySyncService(test_db).sync_all_to_store("store-1", full=True)
+        pushes_before = client.bulk_upsert_inventory.await_count
+
+        @asynccontextmanager
+        async def session_factory():
+            yield test_db
+
+        queue = PushQueue(session_factory=session_factory, window_seconds=0.05)
+        monkeypatch.setattr(inventory_module, "push_queue", queue)
+        queue.start()
+        try:
+            inv_service = InventoryService(test_db)
+            await inv_service.create_event(
+                event_type=EventTypeEnumSchema.ORDER_RECEIVED,
+                sku_id="sku-0000",
+                quantity=-1,
+                operator="tester",
+                source=SourceEnumSchema.MANUAL,
+            )
+            # savepoint 回滚的变更不通知
+            async with test_db.begin_nested() as savepoint:
+                await inv_service.create_event(
+                    event_type=EventTypeEnumSchema.ORDER_RECEIVED,
+                    sku_id="sku-0001",
+                    quantity=-1,
+                    operator="tester",
+                    source=SourceEnumSchema.MANUAL,
+                )
+                await savepoint.rollback()
+            # 订单批次在 HTTP 调用之后才提交：提交晚于合并窗口
+            await asyncio.sleep(0.15)
+            assert queue.depth() == 0
+            await test_db.commit()
+            assert queue.depth() == 1
+
+            for _ in range(50):
+                if client.bulk_upsert_inventory.await_count > pushes_before:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            await queue.stop()
+
+        pushed = client.bulk_upsert_inventory.await_args_list[-1].args[0]
+        assert [(item["variantId"], item["quantity"]) for item in pushed] == [("SKU-0000", 4)]
+
+
+class TestSyncRuns:
+    @pytest.mark.asyncio
+    async def test_store_sync_recorded(self, test_db, client):
+        await _setup_store(test_db, 3)
+
+        recorder = RakutenAPIClient("secret", "key")
+
+        async def upsert(inventories):
+            # 与真实客户端一样记录一次耗时 200ms 的调用
+            recorder._record(latency=0.2)
+            return {}
+
+        client.bulk_upsert_inventory.side_effect = upsert
+
+        await InventorySyncService(test_db).sync_all_to_store("store-1", full=True)
+
+        runs = await SyncRunService(test_db).get_runs("store-1")
+        assert len(runs) == 1
+        run = runs[0]
+        assert (run.kind, run.mode, run.status) == ("inventory", "full", "success")
+        assert (run.skus_considered, run.skus_pushed, run.skus_failed) == (3, 3, 0)
+        assert run.http_calls == 1
+        assert run.latency_p95_ms == 200.0
+
+    @pytest.mark.asyncio
+    async def test_push_queue_flush_recorded(self, test_db, client, monkeypatch):
+        await _setup_store(test_db, 2)
+        service = InventorySyncService(test_db)
+        await service.sync_all_to_store("store-1", full=True)
+
+        @asynccontextmanager
+        async def session_factory():
+            yield test_db
+
+        queue = PushQueue(session_factory=session_factory, window_seconds=60)
+        monkeypatch.setattr(inventory_module, "push_queue", queue)
+        queue.start()
+        try:
+            await InventoryService(test_db).create_event(
+                event_type=EventTypeEnumSchema.ORDER_RECEIVED,
+                sku_id="sku-0001",
+                quantity=-1,
+                operator="tester",
+                source=SourceEnumSchema.MANUAL,
+            )
+            await test_db.commit()
+            await queue.flush()
+            # 已推送过相同值的 SKU 不产生请求，也不记录
+            await service.sync_skus_to_store("store-1", ["sku-0000"])
+        finally:
+            await queue.stop()
+
+        runs = await SyncRunService(test_db).get_runs("store-1")
+        assert [run.mode for run in runs] == ["queued", "full"]
+        assert (runs[0].skus_considered, runs[0].skus_pushed, runs[0].http_calls) == (1, 1, 0)
+
+
+class TestVerifyStore:
+    @pytest.mark.asyncio
+    async def test_only_drifted_skus_pushed(self, test_db, client):
+        await _setup_store(test_db, 3)
+        client.bulk_get_inventory.return_value = [
+            {"manageNumber": "item-0", "variantId": "SKU-0000", "quantity": 5},
+            {"manageNumber": "item-0", "variantId": "SKU-0001", "quantity": 2},
+        ]
+
+        report = await InventorySyncService(test_db).verify_store("store-1")
+
+        keys = client.bulk_get_inventory.await_args.args[0]
+        assert keys[0] == {"manageNumber": "item-0", "variantId": "SKU-0000"}
+        assert (report["checked"], report["matched"], report["drifted"], report["missing"]) == (
+            3, 1, 1, 1
+        )
+        assert [row["sku_id"] for row in report["drift"]] == ["sku-0001", "sku-0002"]
+        pushed = client.bulk_upsert_inventory.await_args.args[0]
+        assert [item["variantId"] for item in pushed] == ["SKU-0001", "SKU-0002"]
+        assert report["repair"]["success"] == 2
+        store_sku = await test_db.get(StoreSku, ("store-1", "sku-0000"))
+        assert store_sku.last_pushed_quantity == 5
+
+    @pytest.mark.asyncio
+    async def test_report_only(self, test_db, client):
+        await _setup_store(test_db, 1)
+        client.bulk_get_inventory.return_value = [
+            {"manageNumber": "ITEM-0", "variantId": "SKU-0000", "quantity": 1},
+        ]
+
+        report = await InventorySyncService(test_db).verify_store("store-1", repair=False)
+
+        assert report["drift"][0]["platform_quantity"] == 1
+        assert "repair" not in report
+        client.bulk_upsert_inventory.assert_not_awaited()
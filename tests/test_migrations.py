@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+alembic_command = pytest.importorskip("alembic.command")
+from alembic.config import Config  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _upgrade(monkeypatch, url: str) -> None:
+    monkeypatch.setattr("app.core.config.settings.DATABASE_URL_SYNC", url)
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "alembic"))
+    alembic_command.upgrade(config, "head")
+
+
+def test_upgrade_migrates_existing_tables(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        # 升级前由 create_all 创建的旧表结构
+        conn.execute(text(
+            "CREATE TABLE store_sku (store_id VARCHAR(50) NOT NULL, sku_id VARCHAR(50) NOT NULL, "
+            "registered_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL, "
+            "PRIMARY KEY (store_id, sku_id))"
+        ))
+        conn.execute(text(
+            "CREATE TABLE inventory_events (event_id CHAR(32) PRIMARY KEY, "
+            "sku_id VARCHAR(50) NOT NULL, created_at DATETIME NOT NULL)"
+        ))
+        conn.execute(text("CREATE INDEX idx_events_sku_id ON inventory_events (sku_id)"))
+
+    _upgrade(monkeypatch, url)
+
+    columns = {column["name"] for column in inspect(engine).get_columns("store_sku")}
+    assert {"last_pushed_quantity", "last_pushed_at"} <= columns
+    indexes = {index["name"] for index in inspect(engine).get_indexes("inventory_events")}
+    assert "idx_events_sku_created_event" in indexes
+    assert "idx_events_sku_id" not in indexes
+    engine.dispose()
+
+
+def test_upgrade_skips_schema_created_by_models(tmp_path, monkeypatch):
+    from app.db import models  # noqa: F401
+    from app.db.database import Base
+
+    url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+
+    _upgrade(monkeypatch, url)
+
+    columns = {column["name"] for column in inspect(engine).get_columns("store_sku")}
+    assert {"last_pushed_quantity", "last_pushed_at"} <= columns
+    engine.dispose()
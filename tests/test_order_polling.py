@@ -0,0 +1,155 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import func, select
+
+from app.db.models import InventoryEvent, OrderConfirmRetry, SkuMaster, Store
+from app.db.schemas import EventTypeEnumSchema, SourceEnumSchema
+from app.services.inventory import InventoryService
+from app.services.order_polling import OrderPollingService
+from app.services.write_lanes import sku_write_lanes
+
+
+def _order(order_number: str, status: str, *skus: tuple[str, int]) -> dict:
+    return {
+        "orderNumber": order_number,
+        "orderStatus": status,
+        "orderItemList": {
+            "orderItem": [{"skuNumber": sku, "quantity": qty} for sku, qty in skus]
+        },
+    }
+
+
+async def _stock(session, sku_id: str, quantity: int) -> None:
+    session.add(SkuMaster(
+        sku_id=sku_id,
+        original_sku=sku_id,
+        sku_name=sku_id,
+        environment="test",
+        status="active",
+        extra_data={},
+        aliases={},
+    ))
+    await session.flush()
+    await InventoryService(session).create_event(
+        event_type=EventTypeEnumSchema.STOCK_IN,
+        sku_id=sku_id,
+        quantity=quantity,
+        operator="tester",
+        source=SourceEnumSchema.MANUAL,
+    )
+
+
+async def _event_count(session) -> int:
+    return await session.scalar(select(func.count()).select_from(InventoryEvent))
+
+
+class TestProcessOrder:
+    @pytest.mark.asyncio
+    async def test_multi_item_order_inserted_and_confirmed_once(self, test_db):
+        await _stock(test_db, "sku-a", 5)
+        await _stock(test_db, "sku-b", 5)
+        client = AsyncMock()
+        service = OrderPollingService(test_db)
+
+        result = await service._process_order(
+            _order("o-1", "100", ("SKU-A", 2), ("sku-b", 1)), "store-1", client
+        )
+
+        assert result == {"order_number": "o-1", "confirm_failed": False}
+        client.confirm_order.assert_awaited_once_with("o-1")
+        inv_service = InventoryService(test_db)
+        assert (await inv_service.get_snapshot("sku-a")).internal_available == 3
+        assert (await inv_service.get_snapshot("sku-b")).internal_available == 4
+
+    @pytest.mark.asyncio
+    async def test_batch_dedup_uses_prefetched_tokens(self, test_db):
+        await _stock(test_db, "sku-a", 5)
+        client = AsyncMock()
+        service = OrderPollingService(test_db)
+        orders = [_order("o-1", "100", ("sku-a", 1)), _order("o-2", "100", ("sku-a", 1))]
+        await service._process_order(orders[0], "store-1", client)
+
+        existing = await service._existing_tokens(
+            service._order_token(order, "store-1") for order in orders
+        )
+
+        assert existing == {"o-1_100_store-1"}
+        result = await service._process_order(orders[0], "store-1", client, existing)
+        assert result["skipped"] is True
+
+    @pytest.mark.asyncio
+    async def test_concurrent_duplicate_resolved_by_conflict(self, test_db):
+        await _stock(test_db, "sku-a", 5)
+        client = AsyncMock()
+        service = OrderPollingService(test_db)
+        order = _order("o-1", "100", ("sku-a", 2))
+        await service._process_order(order, "store-1", client)
+        before = await _event_count(test_db)
+
+        # 模拟另一轮轮询在预查询之后已写入同一订单
+        result = await service._process_order(order, "store-1", client, existing_tokens=set())
+
+        assert result["skipped"] is True
+        assert await _event_count(test_db) == before
+        assert client.confirm_order.await_count == 1
+        snapshot = await InventoryService(test_db).get_snapshot("sku-a")
+        assert snapshot.internal_available == 3
+
+
+class TestProcessBatch:
+    @pytest.mark.asyncio
+    async def test_failed_order_rolled_back_alone_and_http_outside_lanes(self, test_db):
+        await _stock(test_db, "sku-a", 5)
+        await _stock(test_db, "sku-b", 1)
+        await test_db.commit()
+        lanes_during_http = []
+        client = AsyncMock()
+
+        async def get_order(batch):
+            lanes_during_http.append(sku_write_lanes.active_lanes())
+            return [
+                _order("o-1", "100", ("sku-a", 2)),
+                _order("o-2", "100", ("sku-b", 5)),
+                _order("o-3", "100", ("sku-a", 1)),
+            ]
+
+        async def confirm_order(order_number):
+            lanes_during_http.append(sku_write_lanes.active_lanes())
+
+        client.get_order.side_effect = get_order
+        client.confirm_order.side_effect = confirm_order
+        store = Store(store_id="store-1", store_name="Store 1", platform_type="rakuten")
+        failed_confirms = []
+
+        processed = await OrderPollingService(test_db)._process_batch(
+            store, client, ["o-1", "o-2", "o-3"], failed_confirms
+        )
+
+        # o-2 超卖被拒绝，只回滚到 savepoint
+        assert processed == 2
+        assert lanes_during_http == [0, 0, 0]
+        assert [call.args[0] for call in client.confirm_order.await_args_list] == ["o-1", "o-3"]
+        inv_service = InventoryService(test_db)
+        assert (await inv_service.get_snapshot("sku-a")).internal_available == 2
+        assert (await inv_service.get_snapshot("sku-b")).internal_available == 1
+        assert await test_db.scalar(select(func.count()).select_from(OrderConfirmRetry)) == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_confirm_stays_in_retry_queue(self, test_db):
+        from app.services.rakuten_api import RakutenAPIError
+
+        await _stock(test_db, "sku-a", 5)
+        await test_db.commit()
+        client = AsyncMock()
+        client.get_order.return_value = [_order("o-1", "100", ("sku-a", 1))]
+        client.confirm_order.side_effect = RakutenAPIError("API request failed: 503", code=503)
+        store = Store(store_id="store-1", store_name="Store 1", platform_type="rakuten")
+        failed_confirms = []
+
+        await OrderPollingService(test_db)._process_batch(store, client, ["o-1"], failed_confirms)
+
+        assert failed_confirms == ["o-1"]
+        retry = (await test_db.execute(select(OrderConfirmRetry))).scalar_one()
+        assert (retry.order_number, retry.status) == ("o-1", "pending")
+        assert "503" in retry.last_error
@@ -0,0 +1,199 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from app.db.models import InventorySnapshot, SkuMaster, Store, StoreSku
+from app.db.schemas import EventTypeEnumSchema, SourceEnumSchema
+from app.services import inventory_sync, order_polling
+from app.services.inventory import InventoryService
+from app.services.inventory_sync import InventorySyncService
+from app.services.order_polling import OrderPollingService
+from app.services.rakuten_api import ENDPOINT_BULK_GET, RakutenAPIClient
+from app.services.rate_limiter import RateLimiter
+from app.simulator import RakutenSimulator, SimulatorSettings, create_app
+from app.simulator.rakuten import BULK_GET, ITEMS_GET, SEARCH_ORDER
+
+AUTH = {"Authorization": "ESA dGVzdA=="}
+
+
+def _client(simulator: RakutenSimulator) -> RakutenAPIClient:
+    return RakutenAPIClient(
+        "secret",
+        "key",
+        base_url="http://simulator",
+        transport=httpx.ASGITransport(app=create_app(simulator)),
+    )
+
+
+class TestSimulatorOrders:
+    @pytest.mark.asyncio
+    async def test_search_get_and_confirm(self):
+        simulator = RakutenSimulator(SimulatorSettings(seed=7, items=5, order_backlog=3))
+        client = _client(simulator)
+        now = datetime.now(timezone.utc)
+
+        numbers = await client.search_order(now - timedelta(hours=1), now + timedelta(hours=10))
+        assert len(numbers) == 3
+
+        orders = await client.get_order(numbers)
+        assert [order["orderStatus"] for order in orders] == ["100"] * 3
+        assert orders[0]["orderItemList"]["orderItem"][0]["skuNumber"].startswith("SKU-")
+
+        await client.confirm_order(numbers[0])
+        assert simulator.orders[numbers[0]]["orderStatus"] == "300"
+
+    @pytest.mark.asyncio
+    async def test_search_reads_all_pages(self):
+        simulator = RakutenSimulator(SimulatorSettings(items=5, order_backlog=2500))
+        client = _client(simulator)
+        now = datetime.now(timezone.utc)
+
+        numbers = [n async for n in client.iter_order_numbers(now - timedelta(hours=1), now + timedelta(hours=10))]
+
+        assert len(numbers) == len(set(numbers)) == 2500
+        assert simulator.calls["searchOrder"] == 3
+
+    @pytest.mark.asyncio
+    async def test_poll_processes_streamed_orders(self, test_db, monkeypatch):
+        simulator = RakutenSimulator(SimulatorSettings(items=1, variants_per_item=1, order_backlog=5))
+        monkeypatch.setattr(order_polling, "get_rakuten_client", lambda api_config: _client(simulator))
+        store = Store(
+            store_id="store-1",
+            store_name="Store 1",
+            platform_type="rakuten",
+            api_config={"serviceSecret": "secret", "licenseKey": "key"},
+        )
+        test_db.add(store)
+        inv_service = InventoryService(test_db)
+        await inv_service.get_or_create_sku("SKU-00000-00", "SKU-00000-00", environment="test")
+        await inv_service.create_event(
+            event_type=EventTypeEnumSchema.STOCK_IN,
+            sku_id="SKU-00000-00",
+            quantity=100,
+            operator="tester",
+            source=SourceEnumSchema.MANUAL,
+        )
+        await test_db.commit()
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        result = await OrderPollingService(test_db).poll_orders_for_store(
+            store, now - timedelta(hours=1), now + timedelta(hours=10)
+        )
+
+        assert result["processed"] == 5
+        assert {order["orderStatus"] for order in simulator.orders.values()} == {"300"}
+
+    @pytest.mark.asyncio
+    async def test_poll_skips_store_with_open_circuit(self, test_db, monkeypatch):
+        simulator = RakutenSimulator(SimulatorSettings(
+            items=1, error_rates={SEARCH_ORDER: 1.0}, error_status=401
+        ))
+        monkeypatch.setattr(order_polling, "get_rakuten_client", lambda api_config: _client(simulator))
+        test_db.add(Store(
+            store_id="store-1",
+            store_name="Store 1",
+            platform_type="rakuten",
+            api_config={"serviceSecret": "secret", "licenseKey": "key"},
+        ))
+        await test_db.commit()
+        service = OrderPollingService(test_db)
+
+        first = await service.poll_all_stores()
+        second = await service.poll_all_stores()
+
+        assert len(first["errors"]) == 1
+        assert second["stores_skipped"] == ["store-1"]
+        assert second["errors"] == []
+        # 401 立即熔断，第二轮不再请求
+        assert simulator.calls[SEARCH_ORDER] == 1
+
+    def test_catalog_and_orders_are_seeded(self):
+        config = SimulatorSettings(seed=3, items=10, order_backlog=5)
+        first, second = RakutenSimulator(config), RakutenSimulator(config)
+
+        assert first.inventory == second.inventory
+        assert [o["orderItemList"] for o in first.orders.values()] == [
+            o["orderItemList"] for o in second.orders.values()
+        ]
+
+
+class TestClientRateLimit:
+    @pytest.mark.asyncio
+    async def test_limiter_keeps_requests_under_platform_limit(self):
+        simulator = RakutenSimulator(SimulatorSettings(items=1, rate_limits={BULK_GET: 5}))
+        client = RakutenAPIClient(
+            "secret",
+            "key",
+            base_url="http://simulator",
+            transport=httpx.ASGITransport(app=create_app(simulator)),
+            rate_limiter=RateLimiter({ENDPOINT_BULK_GET: 4}),
+        )
+        keys = [{"manageNumber": "item-00000", "variantId": "SKU-00000-00"}]
+
+        results = await asyncio.gather(*(client.bulk_get_inventory(keys) for _ in range(6)))
+
+        assert all(len(result) == 1 for result in results)
+        assert simulator.stats()["rate_limited"] == {}
+        assert client.metrics.retries == 0
+        assert client.metrics.throttle_wait > 0
+
+
+class TestSimulatorInventory:
+    @pytest.mark.asyncio
+    async def test_store_sync_then_verify_has_no_drift(self, test_db, monkeypatch):
+        simulator = RakutenSimulator(SimulatorSettings(items=1, variants_per_item=3))
+        monkeypatch.setattr(inventory_sync, "get_rakuten_client", lambda api_config: _client(simulator))
+        monkeypatch.setattr(inventory_sync, "BULK_UPSERT_INTERVAL_SECONDS", 0)
+        test_db.add(Store(
+            store_id="store-1",
+            store_name="Store 1",
+            platform_type="rakuten",
+            api_config={"serviceSecret": "secret", "licenseKey": "key"},
+        ))
+        for j in range(3):
+            sku_id = f"sku-00000-{j:02d}"
+            test_db.add(SkuMaster(
+                sku_id=sku_id,
+                original_sku=sku_id.upper(),
+                sku_name=sku_id,
+                environment="test",
+                status="active",
+                extra_data={"manage_number": "item-00000"},
+                aliases={},
+            ))
+            test_db.add(InventorySnapshot(sku_id=sku_id, internal_available=10 + j))
+            test_db.add(StoreSku(store_id="store-1", sku_id=sku_id))
+        await test_db.commit()
+        service = InventorySyncService(test_db)
+
+        result = await service.sync_all_to_store("store-1", full=True)
+        assert result["success"] == 3
+        assert simulator.inventory[("item-00000", "SKU-00000-02")]["quantity"] == 12
+
+        report = await service.verify_store("store-1")
+        assert (report["checked"], report["matched"], report["drifted"]) == (3, 3, 0)
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_and_error_injection(self):
+        simulator = RakutenSimulator(SimulatorSettings(
+            items=1,
+            rate_limits={BULK_GET: 1},
+            error_rates={ITEMS_GET: 1.0},
+            error_status=503,
+        ))
+        transport = httpx.ASGITransport(app=create_app(simulator))
+        async with httpx.AsyncClient(transport=transport, base_url="http://simulator") as http:
+            body = {"inventories": [{"manageNumber": "item-00000", "variantId": "SKU-00000-00"}]}
+            first = await http.post("/es/2.0/inventories/bulk-get", json=body, headers=AUTH)
+            second = await http.post("/es/2.0/inventories/bulk-get", json=body, headers=AUTH)
+            item = await http.get("/es/2.0/items/manage-numbers/item-00000", headers=AUTH)
+            unauthorized = await http.get("/es/2.0/items/manage-numbers/item-00000")
+
+        assert first.status_code == 200
+        assert first.json()["inventories"][0]["variantId"] == "SKU-00000-00"
+        assert second.status_code == 429
+        assert item.status_code == 503
+        assert unauthorized.status_code == 401
+        assert simulator.stats()["rate_limited"] == {BULK_GET: 1}
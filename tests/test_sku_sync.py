@@ -14,6 +14,7 @@ class TestSkuSyncService:
         session = AsyncMock()
         session.execute = AsyncMock()
         session.add = MagicMock()
+        session.sync_session = MagicMock()
         session.flush = AsyncMock()
         session.commit = AsyncMock()
         return session
@@ -372,6 +373,23 @@ class TestSkuSyncService:
         assert original_data["category"] == "Electronics"
         assert original_data["customField"] == "Custom Value"
 
+    @pytest.mark.asyncio
+    async def test_item_details_memo_stays_bounded(self, mock_session):
+        from app.services.sku_sync import ITEM_DETAILS_MEMO_SIZE
+
+        service = SkuSyncService(mock_session)
+        client = MagicMock()
+        client.get_item_details = AsyncMock(return_value={})
+
+        for i in range(ITEM_DETAILS_MEMO_SIZE * 3):
+            # 同一商品的两个 SKU 相邻处理，只请求一次
+            for variant in ("a", "b"):
+                await service._get_item_with_details(client, "store", f"item-{i}", f"sku-{i}-{variant}")
+
+        assert client.get_item_details.await_count == ITEM_DETAILS_MEMO_SIZE * 3
+        assert len(service._item_details) == ITEM_DETAILS_MEMO_SIZE
+        assert next(reversed(service._item_details)) == f"item-{ITEM_DETAILS_MEMO_SIZE * 3 - 1}"
+
     def test_sku_normalization_in_sync(self):
         from app.utils.helpers import normalize_sku
         